@@ -0,0 +1,128 @@
+"""
+Benchmark of host-spec normalization (see normalize_topology in src/topology_generator.py).
+
+Expands a template topology into one host entry per host, as uploaded or composed topologies
+often are, normalizes it, and compares both versions on file size and on the time OpenDC
+spends parsing the topology and setting up its hosts.
+
+That time is measured as the wall time of an OpenDC run on a minimal workload (the tasks
+submitted in the first --hours of the trace) minus the wall time of a baseline run of the same
+workload on a one-host topology. The baseline covers JVM startup, workload parsing and the
+simulation of the few tasks, so the difference is dominated by topology parsing and host
+setup. Every run is repeated --runs times and the median is reported. The truncated workload
+and all outputs are written to a temporary folder that is deleted afterwards.
+
+Requires Java and the OpenDC runner. No timings have been recorded yet, which is why
+normalize_hosts stays off by default in update_topology_values. Run from the
+reproducibility_experiment1 folder:
+
+    python -m benchmarks.host_normalization --scale 1000 --workload surf_month --hours 0.25
+"""
+
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+
+from src.topology_generator import normalize_topology, report_normalization
+from src.runner import run_experiment
+from src.successive_halving import truncate_workload, WORKLOAD_DIR
+
+RUNNER_PATH = "OpenDCExperimentRunner/bin/OpenDCExperimentRunner"
+
+
+def expand_topology(topology, scale):
+    """
+    One host entry per host, with the host count of every entry multiplied by scale.
+    """
+
+    expanded = dict(topology)
+    expanded["clusters"] = []
+    for cluster in topology.get("clusters", []):
+        hosts = []
+        for host in cluster.get("hosts", []):
+            entry = {key: value for key, value in host.items() if key != "count"}
+            for index in range(host.get("count", 1) * scale):
+                hosts.append(dict(entry, name=f"{host.get('name', 'H')}-{index}"))
+        expanded["clusters"].append(dict(cluster, hosts=hosts))
+    return expanded
+
+
+def baseline_topology(topology):
+    """
+    The first host of the first cluster of a topology, once: the smallest topology that runs the workload.
+    """
+
+    cluster = topology["clusters"][0]
+    host = dict(cluster["hosts"][0], count=1)
+    return dict(topology, clusters=[dict(cluster, hosts=[host])])
+
+
+def count_host_entries(topology):
+    return sum(len(cluster.get("hosts", [])) for cluster in topology.get("clusters", []))
+
+
+def time_simulation(topology_path, workload_path, folder):
+    experiment = {
+        "name": os.path.splitext(os.path.basename(topology_path))[0],
+        "outputFolder": os.path.join(folder, "output"),
+        "topologies": [{"pathToFile": os.path.abspath(topology_path)}],
+        "workloads": [{"pathToFile": os.path.abspath(workload_path), "type": "ComputeWorkload"}],
+    }
+    experiment_path = os.path.join(folder, f"{experiment['name']}_experiment.json")
+    with open(experiment_path, "w") as f:
+        json.dump(experiment, f)
+
+    start = time.perf_counter()
+    run_experiment(experiment_path)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--template", default="templates/topologies/large_topology.json")
+    parser.add_argument("--scale", type=int, default=1000, help="Multiplier of every host count.")
+    parser.add_argument("--merge-clusters", action="store_true", help="Also merge identical clusters.")
+    parser.add_argument("--workload", default="surf_month", help="Workload under workload_traces/ to run.")
+    parser.add_argument("--hours", type=float, default=0.25, help="Window of the minimal workload.")
+    parser.add_argument("--runs", type=int, default=3, help="Repetitions of every OpenDC run.")
+    args = parser.parse_args()
+
+    with open(args.template, "r") as f:
+        template = json.load(f)
+    expanded = expand_topology(template, args.scale)
+    normalized, report = normalize_topology(expanded, args.merge_clusters)
+    report_normalization(report, os.path.basename(args.template))
+
+    if not os.path.exists(RUNNER_PATH) or not (shutil.which("java") or os.environ.get("JAVA_HOME")):
+        print(f"OpenDC runner ({RUNNER_PATH}) or Java not found; only file sizes are reported.")
+        for label, topology in (("expanded", expanded), ("normalized", normalized)):
+            print(f"{label:12}{count_host_entries(topology):>8} host entries{len(json.dumps(topology, indent=4)) / 1024:>12.1f} KB")
+        return
+
+    folder = tempfile.mkdtemp(prefix="host_normalization_")
+    try:
+        workload = truncate_workload(args.workload, args.hours, cache_dir=folder)
+        workload_path = os.path.join(WORKLOAD_DIR, workload)
+
+        times = {}
+        print(f"{'':12}{'entries':>10}{'size (KB)':>12}{'run (s)':>10}{'setup (s)':>12}")
+        for label, topology in (("baseline", baseline_topology(template)), ("expanded", expanded), ("normalized", normalized)):
+            path = os.path.join(folder, f"{label}.json")
+            with open(path, "w") as f:
+                json.dump(topology, f, indent=4)
+            times[label] = statistics.median(time_simulation(path, workload_path, folder) for _ in range(args.runs))
+            setup = times[label] - times["baseline"]
+            print(
+                f"{label:12}{count_host_entries(topology):>10}{os.path.getsize(path) / 1024:>12.1f}"
+                f"{times[label]:>10.2f}{setup:>12.2f}"
+            )
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+def write_json_atomic(path, document):
+    """
+    Writes a JSON document so that readers never see a partially written file.
+
+    The document is written to a temporary file next to the target (unique per process and
+    thread, created with the usual permissions) and then renamed over the target, which is
+    atomic on the same file system.
+    """
+
+    partial = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    try:
+        with open(partial, "w", encoding="utf-8") as f:
+            json.dump(document, f, indent=4)
+        os.replace(partial, path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+
+
+class BatchWriter:
+    """
+    Writes many small JSON files in batches, for the topology and experiment generators.
+
+    Documents are buffered and written batch by batch: the folders of a batch are created
+    once, the documents are serialized and written in a thread pool, and every file is
+    written atomically (see write_json_atomic). Instead of one line per file, a single
+    summary is printed when the writer is closed.
+    """
+
+    def __init__(self, root, label="files", batch_size=500, workers=None):
+        self.root = root
+        self.label = label
+        self.batch_size = batch_size
+        self.pool = ThreadPoolExecutor(max_workers=workers or min(32, (os.cpu_count() or 1) * 4))
+        self.pending = []
+        self.folders = set()
+        self.written = 0
+        self.errors = []
+        self.start = time.time()
+
+    def add(self, document, rel_path):
+        """
+        Queues a document to be saved under root/rel_path.
+        """
+
+        self.pending.append((document, rel_path))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def write(self, item):
+        document, rel_path = item
+        try:
+            write_json_atomic(os.path.join(self.root, rel_path), document)
+            return None
+        except Exception as e:
+            return f"Error saving {rel_path}: {e}"
+
+    def flush(self):
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+
+        folders = {os.path.dirname(os.path.join(self.root, rel_path)) for _, rel_path in batch} - self.folders
+        for folder in folders:
+            os.makedirs(folder, exist_ok=True)
+        self.folders |= folders
+
+        for error in self.pool.map(self.write, batch):
+            if error:
+                self.errors.append(error)
+            else:
+                self.written += 1
+
+    def close(self):
+        """
+        Writes the remaining documents and prints the summary.
+
+        Returns:
+            Dictionary with "written" and "errors" (list of messages).
+        """
+
+        self.flush()
+        self.pool.shutdown()
+        print(f"Wrote {self.written} {self.label} to {self.root}/ in {time.time() - self.start:.2f} s")
+        for error in self.errors:
+            print(error)
+        return {"written": self.written, "errors": self.errors}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
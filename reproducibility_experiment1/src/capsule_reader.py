@@ -0,0 +1,330 @@
+import os
+import json
+import time
+import shutil
+import struct
+import hashlib
+import tempfile
+import zipfile
+
+import pyarrow as pa
+
+from src.exporter import INDEX_FILE, MANIFEST_FILE, METADATA_FILES, BLOB_DIR, safe_join, experiment_output_dir
+from src.runner import run_experiment
+from src.validator import compare_output_pair, resolve_verification_profile
+from src.virtual_topology import split_reference, resolve_variant
+from src.experiment_matrix import is_matrix_file, load_matrix, iter_cells, load_experiment, experiment_file_name
+from src.batch_writer import write_json_atomic
+
+LIB_DIR = "OpenDCExperimentRunner/lib"
+JAR_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "opendc-capsules", "jars")
+
+# Size of the fixed part of a zip local file header, followed by the file name and extra field.
+LOCAL_HEADER_SIZE = 30
+
+
+class CapsuleReader:
+    """
+    Random-access view of a zip capsule that extracts members only when they are needed.
+
+    Inputs are extracted on demand into a scratch directory that mirrors the capsule layout,
+    so the relative paths in experiments and topologies keep working. Stored (uncompressed)
+    members such as parquet files are read straight from a memory map of the archive.
+    Deduplicated capsules are resolved through their index.
+    """
+
+    def __init__(self, capsule_path, scratch_dir=None):
+        if not zipfile.is_zipfile(capsule_path):
+            raise ValueError(f"{capsule_path} is not a zip capsule; extract tar.zst capsules with extract_capsule")
+
+        self.path = capsule_path
+        self.zip = zipfile.ZipFile(capsule_path)
+        self.scratch = scratch_dir or tempfile.mkdtemp(prefix="capsule_")
+        self.archive_map = None
+
+        names = set(self.zip.namelist())
+        self.index = None
+        if INDEX_FILE in names:
+            self.index = json.loads(self.zip.read(INDEX_FILE))["files"]
+        self.manifest = {}
+        if MANIFEST_FILE in names:
+            self.manifest = json.loads(self.zip.read(MANIFEST_FILE))["files"]
+
+    def close(self):
+        self.zip.close()
+        if self.archive_map is not None:
+            self.archive_map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def names(self):
+        """
+        Logical file names of the capsule (without its manifest and index).
+        """
+
+        if self.index is not None:
+            return sorted(self.index)
+        return [name for name in self.zip.namelist() if not name.endswith("/") and name not in METADATA_FILES]
+
+    def member(self, arcname):
+        """
+        ZipInfo of the member holding the content of a logical file.
+        """
+
+        arcname = arcname.replace(os.sep, "/")
+        if self.index is not None:
+            return self.zip.getinfo(f"{BLOB_DIR}/{self.index[arcname]}")
+        return self.zip.getinfo(arcname)
+
+    def sha256(self, arcname):
+        """
+        Content hash of a logical file, from the capsule manifest or index if available.
+        """
+
+        arcname = arcname.replace(os.sep, "/")
+        if arcname in self.manifest:
+            return self.manifest[arcname]["sha256"]
+        if self.index is not None:
+            return self.index[arcname]
+
+        digest = hashlib.sha256()
+        with self.zip.open(self.member(arcname)) as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def materialize(self, arcname):
+        """
+        Extract one logical file into the scratch directory unless it is already there.
+
+        Returns:
+            Path of the extracted file.
+        """
+
+        target = safe_join(self.scratch, arcname)
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with self.zip.open(self.member(arcname)) as source, open(target, "wb") as f:
+                shutil.copyfileobj(source, f)
+        return target
+
+    def materialize_tree(self, prefix):
+        """
+        Extract every logical file below a folder (e.g. a workload trace directory).
+
+        Returns:
+            Number of files in the folder.
+        """
+
+        prefix = prefix.replace(os.sep, "/").rstrip("/") + "/"
+        names = [name for name in self.names() if name.startswith(prefix)]
+        for name in names:
+            self.materialize(name)
+        return len(names)
+
+    def materialize_experiment(self, rel):
+        """
+        Extract an experiment and only the inputs it references.
+
+        Args:
+            rel: Experiment file path (or matrix cell reference) relative to experiments/.
+
+        Returns:
+            Path of the extracted experiment file (the cell experiment for matrix cells).
+        """
+
+        file_path, cell = split_reference(rel)
+        experiment_path = self.materialize(f"experiments/{file_path}")
+        if cell is not None:
+            data = load_experiment(f"{experiment_path}#{cell}")
+            experiment_path = safe_join(self.scratch, f"experiments/{experiment_file_name(rel)}")
+            write_json_atomic(experiment_path, data)
+        else:
+            with open(experiment_path, "r") as f:
+                data = json.load(f)
+
+        for topology in data.get("topologies", []):
+            file_path, variant = split_reference(topology["pathToFile"])
+            with open(self.materialize(file_path), "r") as f:
+                document = json.load(f)
+            if variant is not None:
+                document = resolve_variant(document, variant)
+            for cluster in document.get("clusters", []):
+                trace = cluster.get("powerSource", {}).get("carbonTracePath")
+                if trace:
+                    self.materialize(trace)
+
+        for workload in data.get("workloads", []):
+            self.materialize_tree(workload["pathToFile"])
+
+        for failure in data.get("failureModels", []):
+            if failure.get("pathToFile"):
+                self.materialize(failure["pathToFile"])
+
+        return experiment_path
+
+    def read_buffer(self, arcname):
+        """
+        Read a logical file as a pyarrow buffer.
+
+        Stored members are sliced out of a memory map of the archive without copying;
+        compressed members are decompressed into memory.
+        """
+
+        zinfo = self.member(arcname)
+        if zinfo.compress_type != zipfile.ZIP_STORED or zinfo.flag_bits & 0x1:
+            return pa.py_buffer(self.zip.read(zinfo))
+
+        if self.archive_map is None:
+            self.archive_map = pa.memory_map(self.path)
+        header = self.archive_map.read_at(LOCAL_HEADER_SIZE, zinfo.header_offset)
+        name_length, extra_length = struct.unpack("<HH", header[26:30])
+        self.archive_map.seek(zinfo.header_offset + LOCAL_HEADER_SIZE + name_length + extra_length)
+        return self.archive_map.read_buffer(zinfo.file_size)
+
+    def parquet_files(self, folder):
+        """
+        Parquet files below a folder of the capsule, read without extracting them.
+
+        Returns:
+            Dictionary mapping relative paths to pyarrow buffers (see resolve_parquet_files).
+        """
+
+        prefix = folder.replace(os.sep, "/").rstrip("/") + "/"
+        return {
+            os.path.relpath(name, prefix): self.read_buffer(name)
+            for name in self.names()
+            if name.startswith(prefix) and name.endswith(".parquet")
+        }
+
+    def cached_jars(self, cache_dir=JAR_CACHE_DIR):
+        """
+        Resolve the capsule's OpenDC jars to a content-addressed cache shared by all capsules.
+
+        Java cannot load jars nested in another archive, so each jar is extracted once to
+        <cache_dir>/<sha256>.jar. Capsules built with the same OpenDC version reuse the cached
+        jars without extracting anything. A jar only enters the cache if its content matches
+        the hash it is cached under.
+
+        Returns:
+            List of jar paths for the classpath.
+
+        Raises:
+            ValueError: If an extracted jar does not match its recorded hash.
+        """
+
+        os.makedirs(cache_dir, exist_ok=True)
+        jars = []
+        extracted = 0
+        for name in self.names():
+            if not (name.startswith(f"{LIB_DIR}/") and name.endswith(".jar")):
+                continue
+            expected = self.sha256(name)
+            target = os.path.join(cache_dir, f"{expected}.jar")
+            if not os.path.exists(target):
+                fd, partial = tempfile.mkstemp(dir=cache_dir, suffix=".part")
+                try:
+                    digest = hashlib.sha256()
+                    with os.fdopen(fd, "wb") as f, self.zip.open(self.member(name)) as source:
+                        for chunk in iter(lambda: source.read(1024 * 1024), b""):
+                            digest.update(chunk)
+                            f.write(chunk)
+                    if digest.hexdigest() != expected:
+                        raise ValueError(f"{name} does not match its recorded sha256 {expected}")
+                    os.replace(partial, target)
+                finally:
+                    if os.path.exists(partial):
+                        os.remove(partial)
+                extracted += 1
+            jars.append(target)
+
+        print(f"Using {len(jars)} jars from {cache_dir} ({extracted} newly extracted)")
+        return jars
+
+
+def list_capsule_experiments(reader):
+    """
+    Experiments of a capsule, relative to experiments/, without reproduction copies.
+    Experiment matrices are expanded into one "<path>#<cell id>" reference per cell.
+    """
+
+    experiments = []
+    for name in reader.names():
+        if not name.startswith("experiments/") or not name.endswith(".json") or os.path.basename(name).startswith("repr_"):
+            continue
+        rel = name[len("experiments/"):]
+        if is_matrix_file(rel):
+            manifest = load_matrix(reader.materialize(name))["manifest"]
+            experiments += [f"{rel}#{cell}" for cell, _ in iter_cells(manifest)]
+        else:
+            experiments.append(rel)
+    return experiments
+
+
+def run_capsule_in_place(capsule_path, experiments=None, scratch_dir=None, compare=True, order_sensitive=True,
+                         profile=None, strategy="exact", threshold=0.05, confidence=0.95):
+    """
+    Reproduces the experiments of a zip capsule without extracting the whole archive.
+
+    Only the referenced inputs of each experiment are extracted into the scratch directory,
+    the jars come from a shared cache (see CapsuleReader.cached_jars), and the new outputs are
+    compared to the reference outputs read directly from the archive.
+
+    Args:
+        capsule_path: Path to the capsule zip.
+        experiments: Experiment paths relative to experiments/ (defaults to all of them).
+        scratch_dir: Working directory for inputs and new outputs (defaults to a new temp dir).
+        compare: Whether to compare the new outputs to the capsule's outputs.
+        order_sensitive, profile, strategy, threshold, confidence: See compare_all_experiments_outputs.
+
+    Returns:
+        Dictionary mapping each experiment to True/False (match) or None if not compared.
+    """
+
+    start = time.time()
+    try:
+        profile = resolve_verification_profile(profile)
+    except Exception as e:
+        print(f"Failed to load verification profile: {e}")
+        return None
+
+    results = {}
+    with CapsuleReader(capsule_path, scratch_dir) as reader:
+        experiments = experiments or list_capsule_experiments(reader)
+        if not experiments:
+            print(f"No experiments found in {capsule_path}")
+            return results
+
+        jars = reader.cached_jars()
+        print(f"Running {len(experiments)} experiment(s) from {capsule_path} in {reader.scratch}")
+
+        for index, rel in enumerate(experiments):
+            experiment_path = reader.materialize_experiment(rel)
+            if index == 0:
+                print(f"Time to first simulation: {time.time() - start:.2f} s")
+            print(f"Running: {rel}")
+            run_experiment(experiment_path, jars=jars, cwd=reader.scratch)
+
+            if not compare:
+                results[rel] = None
+                continue
+
+            output_dir = experiment_output_dir(experiment_path)
+            reference = reader.parquet_files(output_dir)
+            if not reference:
+                print(f"No reference outputs for {rel} in the capsule")
+                results[rel] = None
+                continue
+
+            match = compare_output_pair(
+                reference, os.path.join(reader.scratch, output_dir),
+                order_sensitive, profile, strategy, threshold, confidence, rel
+            )
+            print(f"{rel}: {'match' if match else 'MISMATCH'}")
+            results[rel] = match
+
+    return results
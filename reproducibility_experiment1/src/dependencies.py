@@ -0,0 +1,208 @@
+import os
+import json
+
+from src.utils import file_hash
+from src.virtual_topology import split_reference, is_sweep_file, resolve_variant
+from src.experiment_matrix import load_experiment, expand_queue
+
+# Reference kind of each list in an experiment file.
+EXPERIMENT_KINDS = {
+    "topologies": "topology",
+    "workloads": "workload",
+    "failureModels": "failure",
+}
+
+# Kind of the nested references found inside documents, by key. Any other key named
+# pathToFile or ending in "Path" is still collected, with kind "file".
+REFERENCE_KINDS = {
+    "carbonTracePath": "carbon",
+}
+
+# Keys the notebook's queue entries use for the inputs picked in the UI, relative to their folder.
+SELECTION_KINDS = {
+    "topology": ("topology", "topologies"),
+    "workload": ("workload", "workload_traces"),
+    "failures": ("failure", "failure_traces"),
+}
+
+# Parsed references of JSON documents by content hash, shared by every resolve_dependencies call.
+DOCUMENT_CACHE = {"hashes": {}, "documents": {}}
+
+
+def is_reference_key(key):
+    return key == "pathToFile" or key.endswith("Path")
+
+
+def find_references(document):
+    """
+    Collects every file reference nested anywhere in a JSON document.
+
+    Args:
+        document: Parsed JSON (dicts and lists).
+
+    Returns:
+        List of (kind, path) tuples in document order.
+    """
+
+    references = []
+    if isinstance(document, dict):
+        for key, value in document.items():
+            if isinstance(value, str) and value and is_reference_key(key):
+                references.append((REFERENCE_KINDS.get(key, "file"), value))
+            else:
+                references += find_references(value)
+    elif isinstance(document, list):
+        for value in document:
+            references += find_references(value)
+    return references
+
+
+def parse_document_references(path, cache=None, variant=None):
+    """
+    Returns the nested references of a JSON document, parsing it only once per content.
+
+    For a topology sweep file (see src/virtual_topology.py) the references are those of
+    the given variant, or of all variants if none is given.
+
+    Args:
+        path: Path to the JSON document (e.g. a topology).
+        cache: Document cache (defaults to the module-wide DOCUMENT_CACHE).
+        variant: Variant of a sweep file.
+
+    Returns:
+        List of (kind, path) tuples (see find_references).
+    """
+
+    cache = DOCUMENT_CACHE if cache is None else cache
+    key = file_hash(path, cache)
+    if key not in cache["documents"]:
+        with open(path, "r") as f:
+            document = json.load(f)
+        if is_sweep_file(path):
+            cache["documents"][key] = {
+                name: find_references(resolve_variant(document, name)) for name in document.get("variants", {})
+            }
+        else:
+            cache["documents"][key] = find_references(document)
+
+    references = cache["documents"][key]
+    if isinstance(references, list):
+        return references
+    if variant is None:
+        return list(dict.fromkeys(reference for refs in references.values() for reference in refs))
+    if variant not in references:
+        raise KeyError(f"unknown topology variant '{variant}'")
+    return references[variant]
+
+
+def add_reference(graph, refs, kind, path, name):
+    if path not in refs.setdefault(kind, []):
+        refs[kind].append(path)
+    entry = graph["files"].setdefault(split_reference(path)[0], {"kind": kind, "used_by": []})
+    if name not in entry["used_by"]:
+        entry["used_by"].append(name)
+
+
+def resolve_dependencies(experiment_queue, experiments_dir="experiments", cache=None):
+    """
+    Builds the deduplicated reference graph of the queued experiments in a single pass.
+
+    Every experiment file (or experiment matrix) is read once. Each distinct topology (or other referenced JSON
+    document) is parsed at most once per content hash, and its nested references such as
+    carbon traces are attributed to every experiment using it.
+
+    Args:
+        experiment_queue: List of experiment metadata dicts with 'name' field; queued matrix
+            manifests are expanded into their cells (see expand_queue).
+        experiments_dir: Directory where experiment files are stored.
+        cache: Document cache (defaults to the module-wide DOCUMENT_CACHE).
+
+    Returns:
+        Dictionary with:
+        - "experiments": name -> {"path" (the matrix manifest for matrix cells), and per kind ("topology", "workload", "failure",
+          "carbon", "file") the list of referenced paths; virtual topologies keep their
+          "#<variant>" suffix}
+        - "files": path -> {"kind", "used_by": [experiment names]}, every input file once
+        - "errors": problems in the documents (unreadable experiments or topologies, missing paths)
+        - "missing": referenced paths that do not exist
+        - "parsed": number of documents parsed in this pass
+    """
+
+    cache = DOCUMENT_CACHE if cache is None else cache
+    graph = {"experiments": {}, "files": {}, "errors": [], "parsed": 0}
+    documents = {}
+
+    def nested_references(reference):
+        if reference not in documents:
+            path, variant = split_reference(reference)
+            known = len(cache["documents"])
+            try:
+                documents[reference] = parse_document_references(path, cache, variant)
+            except Exception as e:
+                graph["errors"].append(f"failed to parse '{reference}': {e}")
+                documents[reference] = []
+            graph["parsed"] += len(cache["documents"]) - known
+        return documents[reference]
+
+    for exp in expand_queue(experiment_queue, experiments_dir):
+        name = exp["name"]
+        experiment_path = os.path.join(experiments_dir, name)
+        refs = {"path": split_reference(experiment_path)[0]}
+        graph["experiments"][name] = refs
+
+        try:
+            data = load_experiment(experiment_path)
+        except Exception as e:
+            graph["errors"].append(f"failed to read experiment '{name}': {e}")
+            continue
+
+        for json_key, kind in EXPERIMENT_KINDS.items():
+            for entry in data.get(json_key, []):
+                path = entry.get("pathToFile")
+                if path:
+                    add_reference(graph, refs, kind, path, name)
+                elif kind != "failure" or entry.get("type") == "trace-based":
+                    graph["errors"].append(f"missing 'pathToFile' in {json_key} entry of '{name}': {entry}")
+
+        for key, (kind, folder) in SELECTION_KINDS.items():
+            for entry in exp.get(key) or []:
+                add_reference(graph, refs, kind, os.path.normpath(f"{folder}/{entry}").replace("\\", "/"), name)
+
+        other = {key: value for key, value in data.items() if key not in EXPERIMENT_KINDS}
+        for kind, path in find_references(other):
+            add_reference(graph, refs, kind, path, name)
+
+        for topology in refs.get("topology", []):
+            if os.path.exists(split_reference(topology)[0]):
+                for kind, path in nested_references(topology):
+                    add_reference(graph, refs, kind, path, name)
+
+    graph["missing"] = [path for path in graph["files"] if not os.path.exists(path)]
+    return graph
+
+
+def dependency_problems(graph):
+    """
+    Describes the errors and missing files of a dependency graph, one message each.
+    """
+
+    problems = list(graph["errors"])
+    for path in graph["missing"]:
+        entry = graph["files"][path]
+        problems.append(f"{entry['kind']} file not found: {path} (used by {', '.join(entry['used_by'])})")
+    return problems
+
+
+def dependency_files(graph, kinds=None):
+    """
+    All distinct inputs of a dependency graph.
+
+    Args:
+        graph: Result of resolve_dependencies.
+        kinds: Optional collection of kinds to keep (e.g. {"carbon"}).
+
+    Returns:
+        Sorted list of paths.
+    """
+
+    return sorted(path for path, entry in graph["files"].items() if kinds is None or entry["kind"] in kinds)
@@ -0,0 +1,340 @@
+import os
+import re
+import math
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+SEED_FOLDER = re.compile(r"(^|/)seed=(\d+)(/|$)")
+
+
+def group_files_by_seed(parquet_files):
+    """
+    Groups output files of a multi-seed experiment by metric file, dropping the seed folder.
+
+    OpenDC writes one folder per seed (e.g. raw-output/0/seed=3/host.parquet). Files that only
+    differ in their seed folder describe the same metric and are grouped together.
+
+    Args:
+        parquet_files: Dictionary mapping relative paths to absolute paths (see get_parquet_files_recursive).
+
+    Returns:
+        Dictionary mapping the seedless relative path to {seed: absolute path}.
+    """
+
+    grouped = {}
+    for rel_path, full_path in parquet_files.items():
+        rel_path = rel_path.replace("\\", "/")
+        match = SEED_FOLDER.search(rel_path)
+        seed = int(match.group(2)) if match else 0
+        key = SEED_FOLDER.sub(lambda m: m.group(1) if m.group(3) else "", rel_path, count=1)
+        grouped.setdefault(key, {})[seed] = full_path
+    return grouped
+
+
+def merge_moments(moments, count, mean, m2):
+    """
+    Merges the moments of a new batch into running moments (Chan et al. parallel variance).
+
+    Args:
+        moments: Tuple (count, mean, m2) accumulated so far.
+        count, mean, m2: Moments of the new batch.
+
+    Returns:
+        Updated tuple (count, mean, m2).
+    """
+
+    total_count, total_mean, total_m2 = moments
+    if count == 0:
+        return moments
+    combined = total_count + count
+    delta = mean - total_mean
+    new_mean = total_mean + delta * count / combined
+    new_m2 = total_m2 + m2 + delta * delta * total_count * count / combined
+    return combined, new_mean, new_m2
+
+
+def summarize_parquet_file(path, columns=None, batch_size=65536):
+    """
+    Computes streaming count, mean and variance for every numeric column of a parquet file.
+
+    The file is read batch by batch with only the numeric columns projected, so memory use is
+    bounded by the batch size regardless of the file size.
+
+    Args:
+        path: Path to the parquet file.
+        columns: Optional list of columns to summarize (defaults to all numeric columns).
+        batch_size: Number of rows per record batch.
+
+    Returns:
+        Dictionary mapping column name to (count, mean, m2).
+    """
+
+    parquet_file = pq.ParquetFile(path)
+    schema = parquet_file.schema_arrow
+    numeric = [
+        field.name for field in schema
+        if (pa.types.is_integer(field.type) or pa.types.is_floating(field.type))
+        and (columns is None or field.name in columns)
+    ]
+
+    summaries = {column: (0, 0.0, 0.0) for column in numeric}
+    if not numeric:
+        return summaries
+
+    for batch in parquet_file.iter_batches(batch_size=batch_size, columns=numeric):
+        for column in numeric:
+            values = batch.column(column).to_numpy(zero_copy_only=False).astype("float64")
+            values = values[~np.isnan(values)]
+            if len(values) == 0:
+                continue
+            mean = values.mean()
+            m2 = ((values - mean) ** 2).sum()
+            summaries[column] = merge_moments(summaries[column], len(values), mean, m2)
+    return summaries
+
+
+def summarize_across_seeds(files_by_seed, columns=None, batch_size=65536):
+    """
+    Summarizes one metric file over all seeds of an experiment.
+
+    Args:
+        files_by_seed: Dictionary {seed: path} for one metric file.
+        columns: Optional list of columns to summarize.
+        batch_size: Number of rows per record batch.
+
+    Returns:
+        Dictionary mapping column name to {"seed_means": [...], "pooled": (count, mean, m2)}.
+    """
+
+    result = {}
+    for seed in sorted(files_by_seed):
+        for column, moments in summarize_parquet_file(files_by_seed[seed], columns, batch_size).items():
+            entry = result.setdefault(column, {"seed_means": [], "pooled": (0, 0.0, 0.0)})
+            if moments[0]:
+                entry["seed_means"].append(moments[1])
+            entry["pooled"] = merge_moments(entry["pooled"], *moments)
+    return result
+
+
+def welch_test(mean1, var1, n1, mean2, var2, n2, confidence):
+    """
+    Welch's two-sample t-test from summary statistics.
+
+    scipy is imported here rather than at module level so that the validator, the exporter and
+    the capsule reader, which import this module, work without it.
+
+    Returns:
+        Tuple (p_value, ci_low, ci_high) for the difference mean2 - mean1.
+    """
+
+    if n1 < 2 or n2 < 2:
+        return None, None, None
+
+    se2 = var1 / n1 + var2 / n2
+    diff = mean2 - mean1
+    if se2 == 0:
+        return (1.0 if diff == 0 else 0.0), diff, diff
+
+    from scipy import stats
+
+    se = math.sqrt(se2)
+    dof = se2 ** 2 / ((var1 / n1) ** 2 / (n1 - 1) + (var2 / n2) ** 2 / (n2 - 1))
+    p_value = 2 * stats.t.sf(abs(diff) / se, dof)
+    margin = stats.t.ppf(0.5 + confidence / 2, dof) * se
+    return float(p_value), diff - margin, diff + margin
+
+
+def relative_drift(reference, value):
+    """
+    Relative difference of value to reference (absolute difference if the reference is 0).
+    """
+
+    if reference == 0:
+        return abs(value)
+    return abs(value - reference) / abs(reference)
+
+
+def compare_metric(orig_entry, repr_entry, confidence):
+    """
+    Compares the distribution of one metric between original and reproduced runs.
+
+    The test is run on the per-seed means, which are independent samples, and needs at least
+    two seeds on both sides. Rows of one run are autocorrelated time series, so a test on them
+    would give meaningless p-values; with fewer seeds no test is run (test_level "none") and
+    p-value and confidence interval are None.
+
+    Returns:
+        Dictionary with means, standard deviations, drift, p-value and confidence interval.
+    """
+
+    orig_seeds = orig_entry["seed_means"]
+    repr_seeds = repr_entry["seed_means"]
+    orig_n, orig_mean, orig_m2 = orig_entry["pooled"]
+    repr_n, repr_mean, repr_m2 = repr_entry["pooled"]
+    orig_std = math.sqrt(orig_m2 / (orig_n - 1)) if orig_n > 1 else 0.0
+    repr_std = math.sqrt(repr_m2 / (repr_n - 1)) if repr_n > 1 else 0.0
+
+    if len(orig_seeds) >= 2 and len(repr_seeds) >= 2:
+        level = "seed"
+        p_value, ci_low, ci_high = welch_test(
+            np.mean(orig_seeds), np.var(orig_seeds, ddof=1), len(orig_seeds),
+            np.mean(repr_seeds), np.var(repr_seeds, ddof=1), len(repr_seeds),
+            confidence
+        )
+    else:
+        level = "none"
+        p_value, ci_low, ci_high = None, None, None
+
+    return {
+        "test_level": level,
+        "orig_mean": orig_mean,
+        "repr_mean": repr_mean,
+        "orig_std": orig_std,
+        "repr_std": repr_std,
+        "mean_drift": relative_drift(orig_mean, repr_mean),
+        "std_drift": relative_drift(orig_std, repr_std),
+        "p_value": p_value,
+        "ci_low": ci_low,
+        "ci_high": ci_high,
+    }
+
+
+def metric_status(result, threshold):
+    """
+    Verdict of a compared metric, following the two one-sided tests (TOST) procedure.
+
+    The mean is "equivalent" only if the confidence interval of the difference of per-seed
+    means lies entirely inside +-threshold * |original mean|, "drifted" if it lies entirely
+    outside, and "inconclusive" otherwise, e.g. when a few seeds give a wide interval.
+    Without a test (fewer than two seeds) equivalence cannot be shown: the metric is
+    "drifted" if the relative drift of the means exceeds threshold and "inconclusive"
+    otherwise. A standard deviation whose relative drift exceeds threshold is "drifted".
+
+    Returns:
+        "equivalent", "drifted" or "inconclusive".
+    """
+
+    if result["std_drift"] > threshold:
+        return "drifted"
+    if result["ci_low"] is None:
+        return "drifted" if result["mean_drift"] > threshold else "inconclusive"
+
+    tolerance = threshold * (abs(result["orig_mean"]) or 1)
+    if result["ci_low"] > tolerance or result["ci_high"] < -tolerance:
+        return "drifted"
+    if -tolerance <= result["ci_low"] and result["ci_high"] <= tolerance:
+        return "equivalent"
+    return "inconclusive"
+
+
+def one_sided_result(metric_file, column, status):
+    """
+    Result of a metric file or column found on one side only (status "only in original" or
+    "only in reproduction").
+    """
+
+    result = {key: None for key in ("test_level", "orig_mean", "repr_mean", "orig_std", "repr_std",
+                                    "mean_drift", "std_drift", "p_value", "ci_low", "ci_high")}
+    result.update({"file": metric_file, "column": column, "status": status})
+    return result
+
+
+def compare_experiment_distributions(orig_files, repr_files, threshold=0.05, confidence=0.95, profile=None, batch_size=65536):
+    """
+    Compares original and reproduced outputs of a stochastic experiment at distribution level.
+
+    For every metric file and numeric column, the values of all seeds are summarized in a
+    streaming fashion and compared with Welch's t-test on the per-seed means and a confidence
+    interval for the difference of means. A metric matches only if that interval shows the
+    means to be equivalent within the relative threshold and its standard deviation differs
+    by at most threshold (see metric_status); drifted and inconclusive metrics do not match.
+    Metric files and columns found on one side only do not match either.
+
+    Args:
+        orig_files: Dictionary of original parquet files (relative path -> absolute path).
+        repr_files: Dictionary of reproduced parquet files (relative path -> absolute path).
+        threshold: Maximum allowed relative drift of mean and standard deviation.
+        confidence: Confidence level of the intervals.
+        profile: Optional verification profile restricting files and columns.
+        batch_size: Number of rows per record batch.
+
+    Returns:
+        Tuple (match, results), where results is a list of per-metric dictionaries with a
+        "status" ("equivalent", "drifted", "inconclusive", "only in original" or
+        "only in reproduction").
+    """
+
+    orig_groups = group_files_by_seed(orig_files)
+    repr_groups = group_files_by_seed(repr_files)
+
+    results = []
+    for metric_file in sorted(set(orig_groups) | set(repr_groups)):
+        columns = None
+        if profile is not None:
+            file_spec = profile.get("files", {}).get(os.path.basename(metric_file))
+            if file_spec is None:
+                continue
+            columns = file_spec.get("columns")
+
+        if metric_file not in repr_groups:
+            results.append(one_sided_result(metric_file, None, "only in original"))
+            continue
+        if metric_file not in orig_groups:
+            results.append(one_sided_result(metric_file, None, "only in reproduction"))
+            continue
+
+        orig_summary = summarize_across_seeds(orig_groups[metric_file], columns, batch_size)
+        repr_summary = summarize_across_seeds(repr_groups[metric_file], columns, batch_size)
+
+        for column in sorted(set(orig_summary) | set(repr_summary)):
+            if column not in repr_summary:
+                results.append(one_sided_result(metric_file, column, "only in original"))
+                continue
+            if column not in orig_summary:
+                results.append(one_sided_result(metric_file, column, "only in reproduction"))
+                continue
+            result = compare_metric(orig_summary[column], repr_summary[column], confidence)
+            result["file"] = metric_file
+            result["column"] = column
+            result["orig_seeds"] = len(orig_groups[metric_file])
+            result["repr_seeds"] = len(repr_groups[metric_file])
+            result["status"] = metric_status(result, threshold)
+            results.append(result)
+
+    match = all(result["status"] == "equivalent" for result in results)
+    return match, results
+
+
+def format_statistic(value, spec):
+    return "-" if value is None else format(value, spec)
+
+
+def report_distribution_results(results, confidence=0.95, only_mismatches=True):
+    """
+    Prints the per-metric results of a distribution-level comparison.
+
+    Args:
+        results: Results returned by compare_experiment_distributions.
+        confidence: Confidence level used for the intervals (for the header only).
+        only_mismatches: Whether to print only the metrics that are not equivalent.
+    """
+
+    rows = [r for r in results if r["status"] != "equivalent" or not only_mismatches]
+    if not rows:
+        return
+
+    print(f"| File | Column | Status | Original mean | Reproduced mean | Mean drift | Std drift | p-value | {int(confidence * 100)}% CI of difference |")
+    print("|------|--------|--------|---------------|-----------------|------------|-----------|---------|------------------|")
+    for r in rows:
+        if r["p_value"] is not None:
+            p_value = f"{r['p_value']:.3g}"
+        else:
+            p_value = "N/A (<2 seeds)" if r["test_level"] == "none" else "-"
+        interval = "N/A" if r["ci_low"] is None else f"[{r['ci_low']:.4g}, {r['ci_high']:.4g}]"
+        print(
+            f"| {r['file']} | {r['column'] or '-'} | {r['status']} | {format_statistic(r['orig_mean'], '.6g')} | "
+            f"{format_statistic(r['repr_mean'], '.6g')} | {format_statistic(r['mean_drift'], '.2%')} | "
+            f"{format_statistic(r['std_drift'], '.2%')} | {p_value} | {interval} |"
+        )
@@ -2,6 +2,11 @@ import os
 import json
 
 from src.utils import *
+from src.batch_writer import BatchWriter, write_json_atomic
+from src.templating import set_value, apply_patch
+from src.virtual_topology import encode_patch
+
+from src.experiment_matrix import MATRIX_SUFFIX, level_tokens, count_cells
 
 
 def build_entry(folder, file, original_entry=None, default_type=None):
@@ -46,7 +51,8 @@ def update_experiment_values(
     runs=None,
     max_failures=None,
     output_folder=None,
-    group_by_topology_folder=False
+    group_by_topology_folder=False,
+    matrix=False
 ):
     
     """
@@ -55,11 +61,17 @@ def update_experiment_values(
     This function supports both flat and grouped experiment creation. If grouping is enabled,
     topologies are grouped by their folder structure (e.g. borg/800/0_1000), and one experiment
     is generated per group. Otherwise, a single configuration is created for the provided set.
+    All experiment files are written in batches by one BatchWriter, which prints a single summary.
+
+    With matrix=True, each configuration is a full cross product instead (see generate_experiment_matrix)
+    and is stored as a single manifest, queued as one selection whose cells are expanded only when
+    the queue is run or exported (see expand_queue).
 
     Args:
         Based on the names
     Returns:
-        List of experiment selections (metadata for queueing/exporting).
+        List of experiment selections (metadata for queueing/exporting); with matrix=True,
+        one selection per matrix manifest.
     """
 
     if experiment_template:
@@ -74,20 +86,43 @@ def update_experiment_values(
 
     base_name = name or base_experiment.get("name", "custom_experiment")
     all_selections = []
-
-    if group_by_topology_folder and topologies:
-        grouped = {}
-        for topo in topologies:
-            key = get_topology_group_prefix(topo)
-            grouped.setdefault(key, []).append(topo)
-
-        for group_key, group_topos in grouped.items():
-            group_name = f"{group_key}/{base_name}"
-            all_selections.extend(
-                generate_experiments(
-                    name=group_name,
+    generate = generate_experiment_matrix if matrix else generate_experiments
+    with BatchWriter("experiments", "experiments") as writer:
+        if group_by_topology_folder and topologies:
+            grouped = {}
+            for topo in topologies:
+                key = get_topology_group_prefix(topo)
+                grouped.setdefault(key, []).append(topo)
+
+            for group_key, group_topos in grouped.items():
+                group_name = f"{group_key}/{base_name}"
+                all_selections.append(
+                    generate(
+                        name=group_name,
+                        base=base_experiment,
+                        topologies=group_topos,
+                        workloads=workloads,
+                        failures=failures,
+                        prefab_types=prefab_types,
+                        checkpoint_interval=checkpoint_interval,
+                        checkpoint_duration=checkpoint_duration,
+                        checkpoint_scaling=checkpoint_scaling,
+                        export_intervals=export_intervals,
+                        print_frequencies=print_frequencies,
+                        files_to_export=files_to_export,
+                        seeds=seeds,
+                        runs=runs,
+                        max_failures=max_failures,
+                        output_folder=output_folder,
+                        writer=writer
+                    )
+                )
+        else:
+            all_selections.append(
+                generate(
+                    name=base_name,
                     base=base_experiment,
-                    topologies=group_topos,
+                    topologies=topologies,
                     workloads=workloads,
                     failures=failures,
                     prefab_types=prefab_types,
@@ -100,32 +135,12 @@ def update_experiment_values(
                     seeds=seeds,
                     runs=runs,
                     max_failures=max_failures,
-                    output_folder=output_folder
+                    output_folder=output_folder,
+                    writer=writer
                 )
             )
-    else:
-        all_selections.extend(
-            generate_experiments(
-                name=base_name,
-                base=base_experiment,
-                topologies=topologies,
-                workloads=workloads,
-                failures=failures,
-                prefab_types=prefab_types,
-                checkpoint_interval=checkpoint_interval,
-                checkpoint_duration=checkpoint_duration,
-                checkpoint_scaling=checkpoint_scaling,
-                export_intervals=export_intervals,
-                print_frequencies=print_frequencies,
-                files_to_export=files_to_export,
-                seeds=seeds,
-                runs=runs,
-                max_failures=max_failures,
-                output_folder=output_folder
-            )
-        )
 
-    return all_selections
+    return [selection for selections in all_selections for selection in selections]
     
 
 def generate_experiments(
@@ -144,7 +159,8 @@ def generate_experiments(
     seeds,
     runs,
     max_failures,
-    output_folder
+    output_folder,
+    writer=None
 ):
     """
     Generate experiment JSON files for a specific group or flat configuration.
@@ -155,12 +171,14 @@ def generate_experiments(
 
     Args:
         Based on the names
+        writer: BatchWriter to queue the files on (each file is saved directly if None).
 
     Returns:
         List of selections (experiment metadata for tracking/queueing).
     """
     selections_list = []
-    base_experiment = json.loads(json.dumps(base))
+    # Only top-level keys are replaced below, so a shallow copy keeps the template intact.
+    base_experiment = dict(base)
 
     # Topologies: no default type  
     if topologies is not None:
@@ -195,7 +213,7 @@ def generate_experiments(
     )
 
     for i in range(max_length):
-        experiment = json.loads(json.dumps(base_experiment))
+        patch = {}
 
         seed = get_val(seeds, i)
         run = get_val(runs, i)
@@ -203,12 +221,12 @@ def generate_experiments(
         full_name = f"{name}"
         if seed is not None:
             full_name += f"_s{seed}"
-            experiment["initialSeed"] = int(seed)
+            set_value(patch, ("initialSeed",), int(seed))
         if run is not None:
             full_name += f"_r{run}"
-            experiment["runs"] = int(run)
+            set_value(patch, ("runs",), int(run))
 
-        experiment["name"] = full_name
+        set_value(patch, ("name",), full_name)
 
         policies = []
 
@@ -224,29 +242,29 @@ def generate_experiments(
             policies.append(policy)
         
         if policies:
-            experiment["allocationPolicies"] = policies
+            set_value(patch, ("allocationPolicies",), policies)
 
     
         if checkpoint_interval is not None and checkpoint_duration is not None and checkpoint_scaling is not None:
-            experiment["checkpointModels"] = [{
+            set_value(patch, ("checkpointModels",), [{
                 "checkpointInterval": int(checkpoint_interval),
                 "checkpointDuration": int(checkpoint_duration),
                 "checkpointIntervalScaling": float(checkpoint_scaling)
-            }]
+            }])
 
         if max_failures:
-            experiment["maxNumFailures"] = [int(mf) for mf in max_failures]
+            set_value(patch, ("maxNumFailures",), [int(mf) for mf in max_failures])
 
         interval = get_val(export_intervals, i)
         freq = get_val(print_frequencies, i)
 
-        if "exportModels" in experiment and experiment["exportModels"]:
+        if base_experiment.get("exportModels"):
             if interval is not None:
-                experiment["exportModels"][0]["exportInterval"] = int(interval)
+                set_value(patch, ("exportModels", 0, "exportInterval"), int(interval))
             if freq is not None:
-                experiment["exportModels"][0]["printFrequency"] = int(freq)
+                set_value(patch, ("exportModels", 0, "printFrequency"), int(freq))
             if files_to_export:
-                experiment["exportModels"][0]["filesToExport"] = files_to_export
+                set_value(patch, ("exportModels", 0, "filesToExport"), files_to_export)
        
         else:
             export_entry = {}
@@ -257,14 +275,19 @@ def generate_experiments(
             if files_to_export:
                 export_entry["filesToExport"] = files_to_export
             if export_entry:
-                experiment["exportModels"] = [export_entry]
+                set_value(patch, ("exportModels",), [export_entry])
         
         if output_folder is not None:
-            experiment["outputFolder"] = output_folder
+            set_value(patch, ("outputFolder",), output_folder)
+
+        experiment = apply_patch(base_experiment, patch)
 
         filename = f"{full_name}.json" if not full_name.endswith(".json") else full_name
 
-        save_experiment(experiment, filename)
+        if writer is not None:
+            writer.add(experiment, filename)
+        else:
+            save_experiment(experiment, filename)
 
         selections_list.append({
             "name": filename,
@@ -276,6 +299,113 @@ def generate_experiments(
     return selections_list
 
 
+def generate_experiment_matrix(
+    name,
+    base,
+    topologies,
+    workloads,
+    failures,
+    prefab_types,
+    checkpoint_interval,
+    checkpoint_duration,
+    checkpoint_scaling,
+    export_intervals,
+    print_frequencies,
+    files_to_export,
+    seeds,
+    runs,
+    max_failures,
+    output_folder,
+    writer=None
+):
+    """
+    Generate the full cross product of a configuration as one experiment matrix.
+
+    Every topology, workload, failure model, seed, run count, export interval and print frequency
+    is a level of its own dimension, and each combination is one experiment (a cell) with one
+    topology, workload and failure model. Instead of a JSON file per cell, a single manifest
+    experiments/<name>.matrix.json holds the base experiment and the patch of each level; the cell
+    experiments are built from it when they are run (see src/experiment_matrix.py).
+
+    Args:
+        Same as generate_experiments.
+
+    Returns:
+        List with the selection of the manifest, named "<name>.matrix.json".
+    """
+    fixed = {}
+
+    policies = [{"type": "prefab", "policyName": policy_type} for policy_type in prefab_types or [] if policy_type]
+    if policies:
+        set_value(fixed, ("allocationPolicies",), policies)
+
+    if checkpoint_interval is not None and checkpoint_duration is not None and checkpoint_scaling is not None:
+        set_value(fixed, ("checkpointModels",), [{
+            "checkpointInterval": int(checkpoint_interval),
+            "checkpointDuration": int(checkpoint_duration),
+            "checkpointIntervalScaling": float(checkpoint_scaling)
+        }])
+
+    if max_failures:
+        set_value(fixed, ("maxNumFailures",), [int(mf) for mf in max_failures])
+
+    # Export settings vary per cell, so the first export model must exist in the base experiment.
+    if export_intervals or print_frequencies or files_to_export:
+        if not base.get("exportModels"):
+            set_value(fixed, ("exportModels",), [{}])
+        if files_to_export:
+            set_value(fixed, ("exportModels", 0, "filesToExport"), files_to_export)
+
+    if output_folder is not None:
+        set_value(fixed, ("outputFolder",), output_folder)
+
+    base_experiment = apply_patch(base, fixed)
+
+    def entry_levels(key, folder, files, default_type=None):
+        original_entries = base_experiment.get(key, [])
+        original = original_entries[0] if original_entries else None
+        return {
+            file: encode_patch({(key,): [build_entry(folder, file, original, default_type)]})
+            for file in files
+        }
+
+    def value_levels(path, values, convert):
+        return {str(value): encode_patch({path: convert(value)}) for value in values}
+
+    dimensions = {}
+    if topologies:
+        dimensions["topology"] = entry_levels("topologies", "topologies", topologies)
+    if workloads:
+        dimensions["workload"] = entry_levels("workloads", "workload_traces", workloads, "ComputeWorkload")
+    if failures:
+        dimensions["failure"] = entry_levels("failureModels", "failure_traces", failures, "trace-based")
+    if seeds:
+        dimensions["seed"] = value_levels(("initialSeed",), seeds, int)
+    if runs:
+        dimensions["run"] = value_levels(("runs",), runs, int)
+    if export_intervals:
+        dimensions["export_interval"] = value_levels(("exportModels", 0, "exportInterval"), export_intervals, int)
+    if print_frequencies:
+        dimensions["print_frequency"] = value_levels(("exportModels", 0, "printFrequency"), print_frequencies, int)
+
+    manifest = {"name": name, "base": base_experiment, "dimensions": dimensions}
+    level_tokens(manifest)
+    filename = f"{name}{MATRIX_SUFFIX}"
+
+    if writer is not None:
+        writer.add(manifest, filename)
+    else:
+        save_experiment(manifest, filename)
+
+    print(f"Experiment matrix {filename}: {count_cells(manifest)} experiments")
+    return [{
+        "name": filename,
+        "topology": topologies,
+        "workload": workloads,
+        "failures": failures
+    }]
+
+
 def save_experiment(experiment, new_name):
     """
     Save a single experiment configuration to disk.
@@ -288,8 +418,7 @@ def save_experiment(experiment, new_name):
     os.makedirs(os.path.dirname(new_path), exist_ok=True)
 
     try:
-        with open(new_path, 'w') as f:
-            json.dump(experiment, f, indent=4)
+        write_json_atomic(new_path, experiment)
         print(f"Generated {new_name}")
     except Exception as e:
         print(f"Error saving {new_name}: {e}")
@@ -0,0 +1,250 @@
+import os
+import json
+
+from src.utils import canonical_json_sha256, list_files
+from src.sweep import sweep_space, iter_combinations, count_combinations
+from src.templating import apply_patch
+from src.virtual_topology import split_reference, decode_patch
+from src.batch_writer import write_json_atomic
+
+# An experiment matrix is stored as one manifest instead of one file per experiment:
+# {"name": ..., "base": {...}, "dimensions": {"<dimension>": {"<level label>": <encoded patch>}}}.
+# Every combination of one level per dimension is a cell, referenced as "<path>.matrix.json#<cell id>".
+MATRIX_SUFFIX = ".matrix.json"
+
+# Loaded manifests and their level tokens, by path, valid while the file size and mtime are unchanged.
+MATRIX_CACHE = {}
+
+# A cell ID is the token of its level in each dimension, in sorted dimension order, joined by
+# CELL_ID_SEPARATOR; a matrix without dimensions has the single cell EMPTY_CELL_ID.
+LEVEL_TOKEN_LENGTH = 8
+CELL_ID_SEPARATOR = "-"
+EMPTY_CELL_ID = "base"
+
+
+def is_matrix_file(path):
+    return path.endswith(MATRIX_SUFFIX)
+
+
+def level_token(dimension, label):
+    return canonical_json_sha256([dimension, label])[:LEVEL_TOKEN_LENGTH]
+
+
+def cell_id(labels):
+    """
+    Stable ID of a matrix cell, built from a hash of the level label chosen in each dimension.
+
+    It does not depend on the order of dimensions or levels in the manifest, and it can be
+    decoded back into the labels without enumerating the cells (see decode_cell_id).
+    """
+
+    return CELL_ID_SEPARATOR.join(level_token(dimension, labels[dimension]) for dimension in sorted(labels)) or EMPTY_CELL_ID
+
+
+def level_tokens(manifest):
+    """
+    Maps the token of every level back to its label, per dimension.
+
+    Raises:
+        ValueError: If two levels of a dimension have the same token.
+    """
+
+    tokens = {}
+    for dimension, levels in manifest["dimensions"].items():
+        tokens[dimension] = {}
+        for label in levels:
+            token = level_token(dimension, label)
+            if tokens[dimension].setdefault(token, label) != label:
+                raise ValueError(f"levels '{tokens[dimension][token]}' and '{label}' of {dimension} have the same token")
+    return tokens
+
+
+def decode_cell_id(tokens, cell):
+    """
+    The labels of a cell from its ID, or None if the ID does not belong to the matrix.
+
+    Args:
+        tokens: Level tokens of the matrix (see level_tokens).
+        cell: Cell ID.
+    """
+
+    if not tokens:
+        return {} if cell == EMPTY_CELL_ID else None
+    parts = cell.split(CELL_ID_SEPARATOR)
+    if len(parts) != len(tokens):
+        return None
+    labels = {}
+    for dimension, token in zip(sorted(tokens), parts):
+        if token not in tokens[dimension]:
+            return None
+        labels[dimension] = tokens[dimension][token]
+    return labels
+
+
+def matrix_space(manifest):
+    return sweep_space({dimension: list(levels) for dimension, levels in manifest["dimensions"].items()}, "product")
+
+
+def count_cells(manifest):
+    return count_combinations(matrix_space(manifest))
+
+
+def iter_cells(manifest, start=0, limit=None):
+    """
+    Lazily enumerates the cells of a matrix.
+
+    Yields:
+        Tuples (cell id, labels) where labels maps each dimension to its level label.
+    """
+
+    for labels in iter_combinations(matrix_space(manifest), start, limit):
+        yield cell_id(labels), labels
+
+
+def load_matrix(path):
+    """
+    Loads a matrix manifest, reusing the parsed manifest while the file is unchanged.
+
+    Returns:
+        Cache entry {"manifest", "tokens"} (see level_tokens).
+    """
+
+    stat = os.stat(path)
+    signature = (stat.st_size, stat.st_mtime_ns)
+    entry = MATRIX_CACHE.get(path)
+    if entry is None or entry["signature"] != signature:
+        with open(path, "r") as f:
+            manifest = json.load(f)
+        entry = {"signature": signature, "manifest": manifest, "tokens": level_tokens(manifest)}
+        MATRIX_CACHE[path] = entry
+    return entry
+
+
+def matrix_cell(manifest, labels):
+    """
+    Builds the experiment of one cell: the base experiment with the patch of each chosen level.
+    """
+
+    patch = {}
+    for dimension in manifest["dimensions"]:
+        label = labels[dimension]
+        patch.update(decode_patch(manifest["dimensions"][dimension][label]))
+    patch[("name",)] = f"{manifest['name']}_{cell_id(labels)}"
+    return apply_patch(manifest["base"], patch)
+
+
+def find_cell(path, cell):
+    """
+    The experiment of a cell of the matrix stored at path.
+
+    Raises:
+        KeyError: If the matrix has no such cell.
+    """
+
+    entry = load_matrix(path)
+    labels = decode_cell_id(entry["tokens"], cell)
+    if labels is None:
+        raise KeyError(f"unknown experiment matrix cell '{cell}' in {path}")
+    return matrix_cell(entry["manifest"], labels)
+
+
+def load_experiment(path):
+    """
+    Loads an experiment from a file or from a matrix cell reference ("<path>.matrix.json#<id>").
+    """
+
+    file_path, cell = split_reference(path)
+    if cell is None:
+        with open(file_path, "r") as f:
+            return json.load(f)
+    return find_cell(file_path, cell)
+
+
+def experiment_file_name(rel):
+    """
+    File name an experiment has when written out: unchanged for experiment files,
+    "<matrix name>_<cell id>.json" next to the manifest for matrix cells.
+    """
+
+    file_path, cell = split_reference(rel)
+    if cell is None:
+        return file_path
+    return f"{file_path[:-len(MATRIX_SUFFIX)]}_{cell}.json"
+
+
+def iter_matrix_selections(manifest, rel):
+    """
+    Lazily yields a queue entry for every cell of a matrix, in the same form as generated experiments.
+
+    Args:
+        manifest: Matrix manifest.
+        rel: Path of the manifest relative to experiments/.
+    """
+
+    for cell, labels in iter_cells(manifest):
+        yield {
+            "name": f"{rel}#{cell}",
+            "topology": [labels["topology"]] if "topology" in labels else None,
+            "workload": [labels["workload"]] if "workload" in labels else None,
+            "failures": [labels["failure"]] if "failure" in labels else None,
+        }
+
+
+def expand_queue(queue, experiments_dir="experiments"):
+    """
+    Lazily yields the entries of an experiment queue, with every queued matrix manifest replaced
+    by the entries of its cells (see iter_matrix_selections).
+
+    A matrix is queued as the single entry of its manifest, so its cells are only enumerated
+    when the queue is run, validated or exported.
+
+    Args:
+        queue: Queue entries, each with a "name" relative to experiments_dir.
+        experiments_dir: Directory where experiment files are stored.
+    """
+
+    for entry in queue:
+        if is_matrix_file(entry["name"]):
+            manifest = load_matrix(os.path.join(experiments_dir, entry["name"]))["manifest"]
+            yield from iter_matrix_selections(manifest, entry["name"])
+        else:
+            yield entry
+
+
+def list_experiment_references(root="experiments"):
+    """
+    Experiments under a folder: experiment files by path and one "<path>#<cell id>"
+    reference per cell of each matrix manifest.
+
+    Returns:
+        List of references relative to root.
+    """
+
+    references = []
+    for rel in list_files(root):
+        if not is_matrix_file(rel):
+            references.append(rel)
+            continue
+        try:
+            manifest = load_matrix(os.path.join(root, rel))["manifest"]
+        except Exception as e:
+            print(f"Failed to read experiment matrix {rel}: {e}")
+            continue
+        references += [f"{rel}#{cell}" for cell, _ in iter_cells(manifest)]
+    return references
+
+
+def materialize_experiment_reference(path, scratch_dir):
+    """
+    Writes the experiment of a matrix cell to the scratch folder for the simulator.
+
+    Returns:
+        Path of the experiment file to run (the original path for experiment files).
+    """
+
+    if split_reference(path)[1] is None:
+        return path
+
+    target = os.path.join(scratch_dir, os.path.basename(experiment_file_name(path)))
+    write_json_atomic(target, load_experiment(path))
+    return target
@@ -1,16 +1,119 @@
 import os
+import io
+import bz2
+import lzma
+import struct
+import stat
+import time
+import shutil
+import hashlib
+import tempfile
+import zlib
+import tarfile
 import zipfile
 import json
+import datetime as dt
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+import pyarrow.parquet as pq
 
 from src.summary_generator import *
+from src.dependencies import resolve_dependencies, dependency_problems
+from src.validator import PROFILES_FILE
+from src.utils import file_sha256, file_hash
+from src.preflight import load_cache, save_cache
+from src.experiment_matrix import load_experiment, experiment_file_name, expand_queue
+
+# Members up to this size are read and compressed in memory by worker threads; larger ones
+# are compressed while being written (see ZipWriter). The pending in-memory members of an export are limited to
+# MAX_PENDING_BYTES in total.
+LARGE_MEMBER_SIZE = 8 * 1024 * 1024
+MAX_PENDING_BYTES = 128 * 1024 * 1024
+
+INDEX_FILE = "capsule_index.json"
+MANIFEST_FILE = "capsule_manifest.json"
+EXPORT_STATS_FILE = "capsule_export_stats.json"
+# Capsule metadata members, which are not part of the capsule's files.
+METADATA_FILES = (MANIFEST_FILE, EXPORT_STATS_FILE)
+BLOB_DIR = "blobs"
+OUTPUT_SUMMARY_FILE = "output_summary.json"
+
+# How the outputs of queued experiments are included in a capsule: all raw files,
+# a summary per parquet file in place of the data, or not at all.
+OUTPUT_MODES = ("raw", "summary", "none")
+
+# "lzma" archives can be read by zipfile and 7-Zip, but not by every unzip build.
+COMPRESSION_METHODS = {
+    "store": zipfile.ZIP_STORED,
+    "deflate": zipfile.ZIP_DEFLATED,
+    "bzip2": zipfile.ZIP_BZIP2,
+    "lzma": zipfile.ZIP_LZMA,
+}
+
+# Fixed compression levels, so the same zlib/bz2 build always produces the same bytes. They
+# are the defaults zipfile uses, so archives match those written by zipfile itself.
+COMPRESSION_LEVELS = {
+    zipfile.ZIP_DEFLATED: 6,
+    zipfile.ZIP_BZIP2: 9,
+}
+
+# Raw LZMA1 filter of lzma members, with the properties zipfile writes for it (lc=3, lp=0,
+# pb=2, 8 MiB dictionary) in the header every lzma member starts with.
+LZMA_FILTER = {"id": lzma.FILTER_LZMA1, "dict_size": 1 << 23, "lc": 3, "lp": 0, "pb": 2}
+LZMA_PROPERTIES = struct.pack("<BL", (2 * 5 + 0) * 9 + 3, 1 << 23)
+
+# Zip records written by ZipWriter (see the PKWARE APPNOTE).
+LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+CENTRAL_HEADER = struct.Struct("<4s6H3L5H2L")
+END_RECORD = struct.Struct("<4s4H2LH")
+ZIP64_END = struct.Struct("<4sQ2H2L4Q")
+ZIP64_LOCATOR = struct.Struct("<4sLQL")
+# Sizes and offsets above this use zip64 records, the same limit zipfile uses.
+ZIP64_LIMIT = (1 << 31) - 1
+# Version needed to extract members of each method (20 for stored and deflated).
+MIN_VERSIONS = {zipfile.ZIP_BZIP2: 46, zipfile.ZIP_LZMA: 63}
+LZMA_EOS_FLAG = 0x02
+DATA_DESCRIPTOR_FLAG = 0x08
+UTF8_NAME_FLAG = 0x800
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+# Metadata of every member in deterministic archives: the earliest zip timestamp and
+# read/write permissions for the owner, read for everyone else.
+DETERMINISTIC_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+DETERMINISTIC_MTIME = 315532800
+DETERMINISTIC_MODE = 0o644
+
+# Compression method per file extension ("*" is the fallback). Parquet pages are already
+# snappy-compressed and jars are zip files, so deflating them costs CPU for almost no gain.
+COMPRESSION_POLICY = {
+    ".parquet": "store",
+    ".jar": "store",
+    ".zip": "store",
+    ".gz": "store",
+    ".zst": "store",
+    ".json": "deflate",
+    ".ipynb": "deflate",
+    ".py": "deflate",
+    ".md": "deflate",
+    ".txt": "deflate",
+    "*": "deflate",
+}
 
 def collect_experiment_files(selections_list, experiments_dir="experiments"):
 
     """
     Gather all necessary files based on the queued experiments.
 
-    Looks through the experiment JSONs and collects paths to all referenced
-    topology, workload, failure, and carbon trace files.
+    Uses the dependency graph of the queued experiments (see src/dependencies.py), which
+    covers topology, workload, failure and carbon trace files as well as any other file
+    referenced from inside the experiments or their topologies. Shared topologies are
+    parsed only once.
 
     Args:
         selections_list: List of queued experiment selection dictionaries.
@@ -20,130 +123,1354 @@ def collect_experiment_files(selections_list, experiments_dir="experiments"):
         A set of file paths required to reproduce the experiments.
     """
 
-    required_files = set()
+    graph = resolve_dependencies(selections_list, experiments_dir)
+    for problem in dependency_problems(graph):
+        print(f"Warning: {problem}")
 
-    for selection in selections_list:
-        experiment_path = os.path.join(experiments_dir, selection["name"])
-        required_files.add(experiment_path)
+    required_files = {refs["path"] for refs in graph["experiments"].values()}
+    required_files.update(path for path in graph["files"] if os.path.exists(path))
+    return required_files
+
+def experiment_output_dir(experiment_path):
+    """
+    Resolve the output folder OpenDC writes for an experiment file.
+
+    OpenDC writes to <outputFolder>/<name>, with outputFolder defaulting to "output"
+    and name defaulting to the experiment file name without extension.
+    Matrix cell references ("<path>.matrix.json#<cell id>") are accepted as well.
+
+    Returns:
+        Path of the experiment's output folder.
+    """
+
+    data = load_experiment(experiment_path)
+    name = data.get("name", os.path.splitext(os.path.basename(experiment_file_name(experiment_path)))[0])
+    return os.path.join(data.get("outputFolder", "output"), name)
+
+
+def json_statistic(value):
+    if isinstance(value, (dt.date, dt.datetime)):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    return value
+
+
+def summarize_parquet_footer(path):
+    """
+    Summarize a parquet file from its footer only: rows, columns and per-column min/max.
+
+    Returns:
+        Dictionary with "rows" and "columns" ({name: {"type", "min", "max", "nulls"}}).
+    """
+
+    metadata = pq.ParquetFile(path).metadata
+    schema = metadata.schema.to_arrow_schema()
+    columns = {}
+    for index, field in enumerate(schema):
+        entry = {"type": str(field.type), "min": None, "max": None, "nulls": 0}
+        for group in range(metadata.num_row_groups):
+            statistics = metadata.row_group(group).column(index).statistics
+            if statistics is None:
+                continue
+            entry["nulls"] += statistics.null_count or 0
+            if statistics.has_min_max:
+                low, high = json_statistic(statistics.min), json_statistic(statistics.max)
+                entry["min"] = low if entry["min"] is None else min(entry["min"], low)
+                entry["max"] = high if entry["max"] is None else max(entry["max"], high)
+        columns[field.name] = entry
+    return {"rows": metadata.num_rows, "columns": columns}
+
+
+def write_output_summary(output_dir, summary_path):
+    """
+    Write a summary of an experiment's outputs in place of its raw parquet files.
+
+    Every parquet file is described by its sha256, size and footer statistics, so the
+    capsule still documents what the experiment produced and reproduced outputs can be
+    checked against the hashes without shipping the data.
+
+    Args:
+        output_dir: Output folder of the experiment.
+        summary_path: Where to write the summary JSON.
+
+    Returns:
+        List of the non-parquet files in the output folder (e.g. trackr.json), which are small
+        and still included as-is.
+    """
+
+    files = {}
+    others = []
+    for root, dirs, names in os.walk(output_dir):
+        dirs.sort()
+        for file_name in sorted(names):
+            path = os.path.join(root, file_name)
+            rel = os.path.relpath(path, output_dir).replace(os.sep, "/")
+            if not file_name.endswith(".parquet"):
+                others.append(path)
+                continue
+            entry = {"sha256": file_sha256(path), "size": os.path.getsize(path)}
+            try:
+                entry.update(summarize_parquet_footer(path))
+            except Exception as e:
+                print(f"Warning: Failed to read parquet footer of {path}: {e}")
+            files[rel] = entry
+
+    with open(summary_path, "w") as f:
+        json.dump({"version": 1, "output_dir": output_dir.replace(os.sep, "/"), "files": files}, f, indent=1)
+    return others
+
+
+def collect_experiment_outputs(selections_list, experiments_dir="experiments", output_mode="raw", scratch_dir=None):
+    """
+    Gather the outputs of the queued experiments only.
+
+    Args:
+        selections_list: List of queued experiment selection dictionaries.
+        experiments_dir: Directory where experiment files are stored.
+        output_mode: One of OUTPUT_MODES. "summary" replaces the parquet files of each
+            experiment by an output_summary.json (see write_output_summary).
+        scratch_dir: Directory for the generated summaries (required for "summary").
 
+    Returns:
+        List of (file_path, arcname) tuples.
+    """
+
+    if output_mode not in OUTPUT_MODES:
+        raise ValueError(f"Unknown output mode '{output_mode}', expected one of {OUTPUT_MODES}")
+    if output_mode == "none":
+        return []
+
+    members = []
+    seen = set()
+    for selection in expand_queue(selections_list, experiments_dir):
+        experiment_path = os.path.join(experiments_dir, selection["name"])
         try:
-            with open(experiment_path) as f:
-                exp_data = json.load(f)
+            output_dir = os.path.normpath(experiment_output_dir(experiment_path))
         except Exception as e:
             print(f"Failed to load {experiment_path}: {e}")
             continue
+        if output_dir in seen:
+            continue
+        seen.add(output_dir)
+        if not os.path.isdir(output_dir):
+            print(f"Warning: No outputs found for {selection['name']} in {output_dir}")
+            continue
 
-        for key, folder, json_path in [
-            ("topology", "topologies", "topologies"),
-            ("workload", "workload_traces", "workloads"),
-            ("failures", "failure_traces", "failureModels")  
-        ]:
-            entries = selection.get(key)
-
-            if entries:  
-                for entry in entries:
-                    required_files.add(os.path.join(folder, entry))
-            else:  
-                entries = exp_data.get(json_path, [])
-                for entry in entries:
-                    path = entry.get("pathToFile")
-                    if path:
-                        required_files.add(path)
-
-        for topo_entry in exp_data.get("topologies", []):
-            topo_path = topo_entry.get("pathToFile")
-            if topo_path and os.path.exists(topo_path):
-                try:
-                    with open(topo_path, 'r') as f:
-                        topo_data = json.load(f)
-                        for cluster in topo_data.get("clusters", []):
-                            power_source = cluster.get("powerSource", {})
-                            trace = power_source.get("carbonTracePath")
-                            if trace and os.path.exists(trace):
-                                required_files.add(trace)
-                except Exception as e:
-                    print(f"Warning: Failed to parse topology {topo_path}: {e}")
+        if output_mode == "raw":
+            members += collect_zip_members([output_dir])
+        else:
+            summary_path = os.path.join(scratch_dir, f"{len(seen)}_{OUTPUT_SUMMARY_FILE}")
+            others = write_output_summary(output_dir, summary_path)
+            members += collect_zip_members(others)
+            members.append((summary_path, os.path.join(output_dir, OUTPUT_SUMMARY_FILE)))
+    return members
 
 
-    return required_files
+def collect_zip_members(paths):
+    """
+    Expand a list of files and directories into the members of a zip archive.
+
+    Directories are walked recursively. Missing paths are skipped and every file is
+    included only once, in the order it is first encountered.
+
+    Args:
+        paths: Files and directories to include (relative to the working directory).
+
+    Returns:
+        List of (file_path, arcname) tuples.
+    """
+
+    members = {}
+    for path in paths:
+        if os.path.isfile(path):
+            members.setdefault(os.path.normpath(path), path)
+        elif os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for file in files:
+                    full_path = os.path.join(root, file)
+                    members.setdefault(os.path.normpath(full_path), os.path.relpath(full_path))
+    return [(file_path, arcname) for file_path, arcname in members.items()]
+
+
+def file_type(file_path):
+    """
+    Return the file type used for compression policies and statistics (the lowercase extension).
+    """
+
+    return os.path.splitext(file_path)[1].lower() or os.path.basename(file_path)
+
+
+def resolve_compression(file_path, policy=None):
+    """
+    Pick the zip compression method for a file according to a compression policy.
+
+    Args:
+        file_path: File to be archived.
+        policy: Either a dictionary mapping extensions (and "*") to method names, or a
+            callable taking the file path and returning a method name. Method names are
+            the keys of COMPRESSION_METHODS. Defaults to COMPRESSION_POLICY.
+
+    Returns:
+        zipfile compression constant.
+    """
+
+    policy = COMPRESSION_POLICY if policy is None else policy
+    if callable(policy):
+        method = policy(file_path)
+    else:
+        method = policy.get(file_type(file_path), policy.get("*", "deflate"))
+    return COMPRESSION_METHODS[method]
+
+
+def build_zip_info(file_path, arcname, compress_type, deterministic=False):
+    """
+    Create the ZipInfo of a member, either from the file's metadata or with fixed metadata.
+
+    Args:
+        file_path: File the member is read from.
+        arcname: Name of the member inside the archive.
+        compress_type: Any zipfile compression constant (see COMPRESSION_METHODS).
+        deterministic: Use DETERMINISTIC_DATE_TIME and DETERMINISTIC_MODE instead of the
+            file's mtime and permissions, and a fixed host system.
+
+    Returns:
+        ZipInfo without size and CRC.
+    """
+
+    if deterministic:
+        zinfo = zipfile.ZipInfo(arcname.replace(os.sep, "/"), DETERMINISTIC_DATE_TIME)
+        zinfo.create_system = 3
+        zinfo.external_attr = (stat.S_IFREG | DETERMINISTIC_MODE) << 16
+    else:
+        zinfo = zipfile.ZipInfo.from_file(file_path, arcname)
+    zinfo.compress_type = compress_type
+    if compress_type == zipfile.ZIP_LZMA:
+        zinfo.flag_bits |= LZMA_EOS_FLAG
+    return zinfo
+
+
+def new_compressor(compress_type):
+    """
+    Compressor producing the member data of a zip compression method, with the level from
+    COMPRESSION_LEVELS, or None for stored members.
+
+    Raises:
+        ValueError: For compression methods zip archives are not exported with.
+    """
+
+    if compress_type == zipfile.ZIP_STORED:
+        return None
+    if compress_type == zipfile.ZIP_DEFLATED:
+        return zlib.compressobj(COMPRESSION_LEVELS[compress_type], zlib.DEFLATED, -15)
+    if compress_type == zipfile.ZIP_BZIP2:
+        return bz2.BZ2Compressor(COMPRESSION_LEVELS[compress_type])
+    if compress_type == zipfile.ZIP_LZMA:
+        return LZMAMemberCompressor()
+    raise ValueError(f"Unsupported compression method {compress_type}")
+
+
+class LZMAMemberCompressor:
+    """
+    Compressor of lzma zip members: the properties header of the member followed by a raw
+    LZMA1 stream with an end marker.
+    """
+
+    def __init__(self):
+        self.header = struct.pack("<BBH", 9, 4, len(LZMA_PROPERTIES)) + LZMA_PROPERTIES
+        self.compressor = lzma.LZMACompressor(lzma.FORMAT_RAW, filters=[LZMA_FILTER])
+
+    def compress(self, data):
+        header, self.header = self.header, b""
+        return header + self.compressor.compress(data)
+
+    def flush(self):
+        header, self.header = self.header, b""
+        return header + self.compressor.flush()
+
+
+def compress_member(file_path, arcname, compress_type=zipfile.ZIP_DEFLATED, deterministic=False):
+    """
+    Read and compress a single file into a ready-to-write zip entry.
+
+    Runs in a worker thread; zlib, bz2 and lzma release the GIL while compressing, so
+    several members are compressed concurrently on different cores.
+
+    Args:
+        file_path: File to read.
+        arcname: Name of the member inside the archive.
+        compress_type: Any of the methods of COMPRESSION_METHODS.
+        deterministic: Use fixed member metadata (see build_zip_info).
+
+    Returns:
+        Tuple (zinfo, payload, seconds) with the completed ZipInfo, the compressed bytes
+        and the time spent reading and compressing.
+    """
+
+    start = time.perf_counter()
+    zinfo = build_zip_info(file_path, arcname, compress_type, deterministic)
+    with open(file_path, "rb") as f:
+        data = f.read()
+
+    zinfo.file_size = len(data)
+    zinfo.CRC = zlib.crc32(data)
+
+    compressor = new_compressor(compress_type)
+    payload = compressor.compress(data) + compressor.flush() if compressor else data
+
+    zinfo.compress_size = len(payload)
+    return zinfo, payload, time.perf_counter() - start
+
 
-def recursive_zip(file_path, zipf):
+def record_compression(stats, file_path, size_in, size_out, seconds):
+    entry = stats.setdefault(file_type(file_path), {"files": 0, "bytes_in": 0, "bytes_out": 0, "seconds": 0.0})
+    entry["files"] += 1
+    entry["bytes_in"] += size_in
+    entry["bytes_out"] += size_out
+    entry["seconds"] += seconds
+
+
+def report_compression_stats(stats):
     """
-    Recursively add all files within a directory to the zip archive.
+    Print the compression ratio and time per file type of an export.
 
     Args:
-        file_path: The root directory to compress.
-        zipf: The zipfile handle to write into.
+        stats: Dictionary returned by write_zip_parallel or write_tar_zstd.
+    """
+
+    print("| File type | Files | Original (MB) | Archived (MB) | Ratio | Time (s) |")
+    print("|-----------|-------|---------------|---------------|-------|----------|")
+    for kind, entry in sorted(stats.items(), key=lambda item: -item[1]["bytes_in"]):
+        ratio = entry["bytes_in"] / entry["bytes_out"] if entry["bytes_out"] else 0
+        print(
+            f"| {kind} | {entry['files']} | {entry['bytes_in'] / 1e6:.2f} | "
+            f"{entry['bytes_out'] / 1e6:.2f} | {ratio:.2f} | {entry['seconds']:.2f} |"
+        )
+
+
+class ExportProgress:
     """
+    Tracks an export and periodically prints files and bytes done, throughput and ETA.
 
-    for root, _, files in os.walk(file_path):
-        for file in files:
-            full_path = os.path.join(root, file)
-            rel_path = os.path.relpath(full_path)
-            zipf.write(full_path, arcname=rel_path)
+    At the end, the slowest members and the time spent per directory are reported. The
+    times are per member (reading and compressing), so with parallel compression they
+    add up to more than the wall-clock time.
+    """
+
+    def __init__(self, members, interval=5.0, top=10):
+        self.total_files = len(members)
+        self.total_bytes = sum(os.path.getsize(file_path) for file_path, _ in members)
+        self.interval = interval
+        self.top = top
+        self.files = 0
+        self.bytes = 0
+        self.slowest = []
+        self.directories = {}
+        self.start = time.perf_counter()
+        self.last_report = self.start
+
+    def update(self, arcname, size, seconds):
+        self.files += 1
+        self.bytes += size
+        self.slowest = sorted(self.slowest + [(seconds, arcname, size)], reverse=True)[:self.top]
+
+        directory = os.path.dirname(arcname.replace(os.sep, "/")) or "."
+        entry = self.directories.setdefault(directory, {"files": 0, "bytes": 0, "seconds": 0.0})
+        entry["files"] += 1
+        entry["bytes"] += size
+        entry["seconds"] += seconds
+
+        now = time.perf_counter()
+        if now - self.last_report >= self.interval:
+            self.last_report = now
+            self.report()
+
+    def report(self):
+        elapsed = time.perf_counter() - self.start
+        throughput = self.bytes / elapsed if elapsed else 0
+        eta = (self.total_bytes - self.bytes) / throughput if throughput else 0
+        done = self.bytes / self.total_bytes if self.total_bytes else 1
+        print(
+            f"Exported {self.files}/{self.total_files} files, {self.bytes / 1e6:.1f}/{self.total_bytes / 1e6:.1f} MB "
+            f"({done:.0%}) at {throughput / 1e6:.1f} MB/s, ETA {eta:.0f} s"
+        )
+
+    def finish(self):
+        """
+        Print the final progress, the slowest members and the slowest directories.
+
+        Returns:
+            Timing summary dictionary, as stored in capsule_export_stats.json.
+        """
+
+        elapsed = time.perf_counter() - self.start
+        self.report()
+
+        print(f"Slowest {len(self.slowest)} members:")
+        print("| Member | Size (MB) | Time (s) |")
+        print("|--------|-----------|----------|")
+        for seconds, arcname, size in self.slowest:
+            print(f"| {arcname} | {size / 1e6:.2f} | {seconds:.2f} |")
+
+        directories = sorted(self.directories.items(), key=lambda item: -item[1]["seconds"])
+        print(f"Slowest {min(self.top, len(directories))} directories:")
+        print("| Directory | Files | Size (MB) | Time (s) | MB/s |")
+        print("|-----------|-------|-----------|----------|------|")
+        for directory, entry in directories[:self.top]:
+            rate = entry["bytes"] / entry["seconds"] / 1e6 if entry["seconds"] else 0
+            print(f"| {directory} | {entry['files']} | {entry['bytes'] / 1e6:.2f} | {entry['seconds']:.2f} | {rate:.1f} |")
+
+        return {
+            "files": self.files,
+            "bytes": self.bytes,
+            "seconds": round(elapsed, 3),
+            "throughput_mb_s": round(self.bytes / elapsed / 1e6, 3) if elapsed else None,
+            "slowest_members": [
+                {"member": arcname, "bytes": size, "seconds": round(seconds, 3)} for seconds, arcname, size in self.slowest
+            ],
+            "directories": {
+                directory: dict(entry, seconds=round(entry["seconds"], 3)) for directory, entry in sorted(self.directories.items())
+            },
+        }
 
-def create_reproducibility_zip(queue, readme_path="README.md", output_name="reproducibility_capsule.zip"):
+
+class ZipWriter:
+    """
+    Write-only zip archive of members whose data is produced by the caller.
+
+    Every member is a local file header followed by its data; the central directory is
+    written by close(), with zip64 records where sizes, offsets or the number of entries
+    exceed the classic limits. ZipInfo only serves as the record of a member's metadata.
+    Members streamed to non-seekable outputs get a data descriptor after their data; on
+    seekable outputs their local header is completed in place instead.
+    """
+
+    def __init__(self, output):
+        self.owned = isinstance(output, (str, os.PathLike))
+        self.fp = open(output, "wb") if self.owned else output
+        try:
+            self.seekable = self.fp.seekable()
+        except (AttributeError, OSError):
+            self.seekable = False
+        self.offset = self.fp.tell() if self.seekable else 0
+        self.entries = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.write_central_directory()
+        finally:
+            if self.owned:
+                self.fp.close()
+
+    def write(self, data):
+        self.fp.write(data)
+        self.offset += len(data)
+
+    def local_header(self, zinfo, zip64):
+        name, flags = encode_member_name(zinfo)
+        file_size, compress_size, extra = zinfo.file_size, zinfo.compress_size, b""
+        if zip64:
+            extra = struct.pack("<HHQQ", 1, 16, file_size, compress_size)
+            file_size = compress_size = 0xFFFFFFFF
+        date, time_ = dos_date_time(zinfo.date_time)
+        return LOCAL_HEADER.pack(
+            b"PK\x03\x04", member_version(zinfo, zip64), flags, zinfo.compress_type, time_, date,
+            zinfo.CRC, compress_size, file_size, len(name), len(extra),
+        ) + name + extra
+
+    def add(self, zinfo, payload):
+        """
+        Append a member whose data is already compressed.
+
+        Args:
+            zinfo: ZipInfo with sizes and CRC filled in (see compress_member).
+            payload: Compressed member data.
+        """
+
+        zip64 = zinfo.file_size > ZIP64_LIMIT or zinfo.compress_size > ZIP64_LIMIT
+        header_offset = self.offset
+        self.write(self.local_header(zinfo, zip64))
+        self.write(payload)
+        self.entries.append((zinfo, header_offset))
+
+    def stream(self, zinfo, source, compressor):
+        """
+        Append a member read from a binary file object, compressing it chunk by chunk.
+
+        Args:
+            zinfo: ZipInfo with file_size set to the expected size of the data.
+            source: File object the member data is read from.
+            compressor: Compressor of the member's method (see new_compressor).
+
+        Raises:
+            zipfile.LargeZipFile: If the data outgrows the expected size past the zip64 limit.
+        """
+
+        # The local header has a fixed size, so decide on zip64 with room for data that
+        # grows when compressed.
+        zip64 = zinfo.file_size + zinfo.file_size // 100 + 65536 > ZIP64_LIMIT
+        if not self.seekable:
+            zinfo.flag_bits |= DATA_DESCRIPTOR_FLAG
+        zinfo.CRC = zinfo.file_size = zinfo.compress_size = 0
+        header_offset = self.offset
+        self.write(self.local_header(zinfo, zip64))
+
+        crc = file_size = compress_size = 0
+        for chunk in iter(lambda: source.read(STREAM_CHUNK_SIZE), b""):
+            crc = zlib.crc32(chunk, crc)
+            file_size += len(chunk)
+            data = compressor.compress(chunk) if compressor else chunk
+            self.write(data)
+            compress_size += len(data)
+        if compressor:
+            data = compressor.flush()
+            self.write(data)
+            compress_size += len(data)
+
+        if not zip64 and max(file_size, compress_size) > ZIP64_LIMIT:
+            raise zipfile.LargeZipFile(f"{zinfo.filename} grew past the zip64 limit while being written")
+        zinfo.CRC, zinfo.file_size, zinfo.compress_size = crc, file_size, compress_size
+        if self.seekable:
+            self.fp.seek(header_offset)
+            self.fp.write(self.local_header(zinfo, zip64))
+            self.fp.seek(self.offset)
+        else:
+            size_format = "QQ" if zip64 else "LL"
+            self.write(struct.pack(f"<4sL{size_format}", b"PK\x07\x08", crc, compress_size, file_size))
+        self.entries.append((zinfo, header_offset))
+
+    def write_central_directory(self):
+        start = self.offset
+        for zinfo, header_offset in self.entries:
+            name, flags = encode_member_name(zinfo)
+            file_size, compress_size, offset = zinfo.file_size, zinfo.compress_size, header_offset
+            extra = []
+            if file_size > ZIP64_LIMIT:
+                extra.append(file_size)
+                file_size = 0xFFFFFFFF
+            if compress_size > ZIP64_LIMIT:
+                extra.append(compress_size)
+                compress_size = 0xFFFFFFFF
+            if offset > ZIP64_LIMIT:
+                extra.append(offset)
+                offset = 0xFFFFFFFF
+            extra_data = struct.pack(f"<HH{len(extra)}Q", 1, 8 * len(extra), *extra) if extra else b""
+            version = member_version(zinfo, bool(extra))
+            date, time_ = dos_date_time(zinfo.date_time)
+            self.write(CENTRAL_HEADER.pack(
+                b"PK\x01\x02", zinfo.create_system << 8 | version, version, flags, zinfo.compress_type,
+                time_, date, zinfo.CRC, compress_size, file_size, len(name), len(extra_data), 0, 0,
+                zinfo.internal_attr, zinfo.external_attr, offset,
+            ) + name + extra_data)
+
+        count, size = len(self.entries), self.offset - start
+        if count > 0xFFFF or size > ZIP64_LIMIT or start > ZIP64_LIMIT:
+            end_offset = self.offset
+            self.write(ZIP64_END.pack(b"PK\x06\x06", ZIP64_END.size - 12, 45, 45, 0, 0, count, count, size, start))
+            self.write(ZIP64_LOCATOR.pack(b"PK\x06\x07", 0, end_offset, 1))
+            count, size, start = min(count, 0xFFFF), min(size, 0xFFFFFFFF), min(start, 0xFFFFFFFF)
+        self.write(END_RECORD.pack(b"PK\x05\x06", 0, 0, count, count, size, start, 0))
+        self.fp.flush()
+
+
+def encode_member_name(zinfo):
+    """
+    The encoded name of a member and its flag bits: ASCII names as is, others as UTF-8 with
+    the language encoding flag set.
+    """
+
+    try:
+        return zinfo.filename.encode("ascii"), zinfo.flag_bits
+    except UnicodeEncodeError:
+        return zinfo.filename.encode("utf-8"), zinfo.flag_bits | UTF8_NAME_FLAG
+
+
+def member_version(zinfo, zip64):
+    """
+    The zip specification version needed to extract a member.
+    """
+
+    return max(MIN_VERSIONS.get(zinfo.compress_type, 20), 45 if zip64 else 20)
+
+
+def dos_date_time(date_time):
+    year, month, day, hour, minute, second = date_time
+    return (year - 1980) << 9 | month << 5 | day, hour << 11 | minute << 5 | second // 2
+
+
+def stream_member(zipf, file_path, arcname, compress_type, deterministic=False):
+    """
+    Write a member to a ZipWriter straight from its file, compressing it in the calling thread.
+
+    Returns:
+        Tuple (zinfo, seconds).
+    """
+
+    start = time.perf_counter()
+    zinfo = build_zip_info(file_path, arcname, compress_type, deterministic)
+    zinfo.file_size = os.path.getsize(file_path)
+    with open(file_path, "rb") as source:
+        zipf.stream(zinfo, source, new_compressor(compress_type))
+    return zinfo, time.perf_counter() - start
+
+
+def write_zip_parallel(members, output_name, policy=None, workers=None, deterministic=False, progress=None,
+                       trailer=None):
+    """
+    Write a standard zip archive, compressing its members concurrently.
+
+    Members are compressed in a thread pool and written in their original order by the
+    calling thread through a ZipWriter, so the result is a regular archive readable by
+    zipfile and unzip. At most a few members per worker, and at most MAX_PENDING_BYTES of
+    them, are held in memory at a time. Files larger than LARGE_MEMBER_SIZE are streamed
+    by the calling thread instead of being loaded into memory.
+
+    Args:
+        members: List of (file_path, arcname) tuples (see collect_zip_members).
+        output_name: Output zip filename or writable binary file object. Non-seekable
+            streams are supported (see ZipWriter).
+        policy: Compression policy (see resolve_compression).
+        workers: Number of compression threads (defaults to the number of CPUs).
+        deterministic: Use fixed member metadata (see build_zip_info).
+        progress: Optional ExportProgress updated after every member.
+        trailer: Optional callable returning (file_path, arcname) tuples to append once all
+            members are written, e.g. metadata about the export itself.
+
+    Returns:
+        Compression statistics per file type (see report_compression_stats).
+    """
+
+    workers = workers or os.cpu_count() or 1
+    window = deque()
+    pending = {"bytes": 0}
+    stats = {}
+
+    with ZipWriter(output_name) as zipf, ThreadPoolExecutor(max_workers=workers) as pool:
+
+        def drain(limit, byte_limit=MAX_PENDING_BYTES):
+            while len(window) > limit or (window and pending["bytes"] > byte_limit):
+                file_path, arcname, compress_type, size, job = window.popleft()
+                if job is None:
+                    zinfo, seconds = stream_member(zipf, file_path, arcname, compress_type, deterministic)
+                else:
+                    zinfo, payload, seconds = job.result()
+                    zipf.add(zinfo, payload)
+                    pending["bytes"] -= size
+                record_compression(stats, file_path, zinfo.file_size, zinfo.compress_size, seconds)
+                if progress is not None:
+                    progress.update(arcname, zinfo.file_size, seconds)
+
+        for file_path, arcname in members:
+            compress_type = resolve_compression(file_path, policy)
+            size = os.path.getsize(file_path)
+            if size > LARGE_MEMBER_SIZE:
+                job = None
+                size = 0
+            else:
+                # Make room first, so the pending members never exceed MAX_PENDING_BYTES
+                drain(len(window), MAX_PENDING_BYTES - size)
+                job = pool.submit(compress_member, file_path, arcname, compress_type, deterministic)
+                pending["bytes"] += size
+            window.append((file_path, arcname, compress_type, size, job))
+            drain(2 * workers)
+        drain(0)
+
+        for file_path, arcname in (trailer() if trailer else []):
+            stream_member(zipf, file_path, arcname, resolve_compression(file_path, policy), deterministic)
+
+    return stats
+
+
+class CountingWriter(io.RawIOBase):
+    """
+    Write-only file object that forwards to another one and counts the bytes written.
+    """
+
+    def __init__(self, target):
+        self.target = target
+        self.count = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.target.write(data)
+        self.count += len(data)
+        return len(data)
+
+
+class VolumeWriter(io.RawIOBase):
+    """
+    Write-only, non-seekable file object that splits its output into fixed-size volumes.
+
+    Volumes are named <base_name>.001, <base_name>.002, ... and are complete as soon as they
+    are full, so they can be uploaded while the export is still running. On close a
+    <base_name>.volumes.json manifest with the size and sha256 of every volume is written.
+    Concatenating the volumes in order gives the original archive (see join_volumes).
+    """
+
+    def __init__(self, base_name, volume_size):
+        if volume_size <= 0:
+            raise ValueError("volume_size must be positive")
+        self.base_name = base_name
+        self.volume_size = volume_size
+        self.volumes = []
+        self.total_digest = hashlib.sha256()
+        self.current = None
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def open_next_volume(self):
+        self.close_volume()
+        name = f"{self.base_name}.{len(self.volumes) + 1:03d}"
+        self.current = open(name, "wb")
+        self.volumes.append({"name": os.path.basename(name), "size": 0, "digest": hashlib.sha256()})
+
+    def close_volume(self):
+        if self.current is not None:
+            self.current.close()
+            self.current = None
+
+    def write(self, data):
+        data = memoryview(data).cast("B")
+        self.total_digest.update(data)
+        written = 0
+        while written < len(data):
+            if self.current is None or self.volumes[-1]["size"] >= self.volume_size:
+                self.open_next_volume()
+            volume = self.volumes[-1]
+            chunk = data[written:written + self.volume_size - volume["size"]]
+            self.current.write(chunk)
+            volume["digest"].update(chunk)
+            volume["size"] += len(chunk)
+            written += len(chunk)
+        return written
+
+    def close(self):
+        if self.closed:
+            return
+        self.close_volume()
+        manifest = {
+            "archive": os.path.basename(self.base_name),
+            "volume_size": self.volume_size,
+            "total_size": sum(volume["size"] for volume in self.volumes),
+            "sha256": self.total_digest.hexdigest(),
+            "volumes": [
+                {"name": volume["name"], "size": volume["size"], "sha256": volume["digest"].hexdigest()}
+                for volume in self.volumes
+            ],
+        }
+        with open(f"{self.base_name}.volumes.json", "w") as f:
+            json.dump(manifest, f, indent=4)
+        print(f"Wrote {len(self.volumes)} volume(s) of at most {self.volume_size / 1e6:g} MB for {self.base_name}")
+        super().close()
+
+
+def join_volumes(volumes_manifest, output_name=None):
+    """
+    Reassemble a split capsule from its volumes, verifying every volume hash.
+
+    Args:
+        volumes_manifest: Path to the <archive>.volumes.json written by VolumeWriter.
+        output_name: Path of the joined archive (defaults to the original archive name
+            next to the manifest).
+
+    Returns:
+        Path of the joined archive.
+
+    Raises:
+        ValueError: If a volume or the joined archive does not match the manifest.
+    """
+
+    with open(volumes_manifest, "r") as f:
+        manifest = json.load(f)
+    folder = os.path.dirname(volumes_manifest)
+    output_name = output_name or os.path.join(folder, manifest["archive"])
+
+    total_digest = hashlib.sha256()
+    with open(output_name, "wb") as target:
+        for volume in manifest["volumes"]:
+            path = os.path.join(folder, volume["name"])
+            if file_sha256(path) != volume["sha256"]:
+                raise ValueError(f"Volume {path} is corrupt or incomplete")
+            with open(path, "rb") as source:
+                for chunk in iter(lambda: source.read(1024 * 1024), b""):
+                    total_digest.update(chunk)
+                    target.write(chunk)
+
+    if total_digest.hexdigest() != manifest["sha256"]:
+        raise ValueError(f"Joined archive {output_name} does not match {volumes_manifest}")
+    return output_name
+
+
+def open_archive_output(output, volume_size=None):
+    """
+    Resolve the export target into a writable file object.
+
+    Args:
+        output: Output filename, or an open binary file object (e.g. a pipe or a network
+            stream); file objects are written sequentially and never seeked.
+        volume_size: If set, split the output into volumes of this many bytes (see VolumeWriter).
+
+    Returns:
+        Tuple (file object, whether the caller has to close it).
+    """
+
+    if volume_size:
+        if not isinstance(output, (str, os.PathLike)):
+            raise ValueError("Split volumes need an output filename, not a file object")
+        return VolumeWriter(os.fspath(output), volume_size), True
+    if isinstance(output, (str, os.PathLike)):
+        return open(output, "wb"), True
+    return output, False
+
+
+def write_tar_zstd(members, output_name, level=10, workers=None, deterministic=False, progress=None, trailer=None):
+    """
+    Write the members into a single zstd-compressed tar archive (.tar.zst).
+
+    The tar stream is compressed as a whole with multi-threaded zstd, which compresses
+    many small similar JSON files much better than per-member zip compression. The
+    compressor is flushed after every member so the archived size can be attributed
+    to each file type. Requires the optional `zstandard` package.
+
+    Args:
+        members: List of (file_path, arcname) tuples (see collect_zip_members).
+        output_name: Output archive filename or writable binary file object.
+        level: zstd compression level.
+        workers: Number of zstd threads (defaults to the number of CPUs).
+        deterministic: Use fixed member metadata (mtime, mode, owner), see DETERMINISTIC_MTIME.
+        progress, trailer: See write_zip_parallel.
+
+    Returns:
+        Compression statistics per file type (see report_compression_stats).
+    """
+
+    if zstandard is None:
+        raise ImportError("Exporting tar.zst capsules requires the 'zstandard' package (pip install zstandard)")
+
+    stats = {}
+    compressor = zstandard.ZstdCompressor(level=level, threads=workers or -1)
+    raw, owned = open_archive_output(output_name)
+    try:
+        counter = CountingWriter(raw)
+        with compressor.stream_writer(counter, closefd=False) as zstd_stream:
+            with tarfile.open(fileobj=zstd_stream, mode="w|") as tar:
+
+                def add(file_path, arcname):
+                    tarinfo = tar.gettarinfo(file_path, arcname)
+                    if deterministic:
+                        tarinfo.mtime = DETERMINISTIC_MTIME
+                        tarinfo.mode = DETERMINISTIC_MODE
+                        tarinfo.uid = tarinfo.gid = 0
+                        tarinfo.uname = tarinfo.gname = ""
+                    with open(file_path, "rb") as f:
+                        tar.addfile(tarinfo, f)
+                    zstd_stream.flush(zstandard.FLUSH_BLOCK)
+
+                for file_path, arcname in members:
+                    start = time.perf_counter()
+                    before = counter.count
+                    add(file_path, arcname)
+                    size = os.path.getsize(file_path)
+                    seconds = time.perf_counter() - start
+                    record_compression(stats, file_path, size, counter.count - before, seconds)
+                    if progress is not None:
+                        progress.update(arcname, size, seconds)
+
+                for file_path, arcname in (trailer() if trailer else []):
+                    add(file_path, arcname)
+    finally:
+        if owned:
+            raw.close()
+    return stats
+
+
+def hash_members(members, workers=None, cache=None, uncached_dirs=()):
+    """
+    Compute the sha256 of every member in parallel.
+
+    Args:
+        members: List of (file_path, arcname) tuples.
+        workers: Number of hashing threads (defaults to the number of CPUs).
+        cache: Dictionary with a "hashes" entry (see file_hash); files whose size and mtime
+            are unchanged since they were hashed are not read again.
+        uncached_dirs: Folders whose files are hashed without the cache, e.g. scratch folders
+            that are deleted after the export.
+
+    Returns:
+        List of hex digests in the order of members.
+    """
+
+    uncached = tuple(os.path.join(os.path.abspath(folder), "") for folder in uncached_dirs)
+
+    def hash_file(member):
+        if cache is None or os.path.abspath(member[0]).startswith(uncached):
+            return file_sha256(member[0])
+        return file_hash(member[0], cache)
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        return list(pool.map(hash_file, members))
+
+
+def deduplicate_members(members, hashes, index_path):
+    """
+    Replace byte-identical members by a single content-addressed blob.
+
+    Every unique content is stored once as blobs/<sha256>, and an index mapping each
+    logical path to its blob is written to index_path and added as the first member
+    (see extract_capsule).
+
+    Args:
+        members: List of (file_path, arcname) tuples.
+        hashes: sha256 of every member (see hash_members).
+        index_path: Where to write the index file before it is archived.
+
+    Returns:
+        The deduplicated list of (file_path, arcname) tuples.
+    """
+
+    files = {}
+    blobs = {}
+    saved = 0
+    for (file_path, arcname), digest in zip(members, hashes):
+        files[arcname.replace(os.sep, "/")] = digest
+        if digest in blobs:
+            saved += os.path.getsize(file_path)
+        else:
+            blobs[digest] = file_path
+
+    with open(index_path, "w") as f:
+        json.dump({"format": "deduplicated", "version": 1, "files": files}, f, indent=1, sort_keys=True)
+
+    print(f"Deduplicated {len(members)} files into {len(blobs)} unique blobs ({saved / 1e6:.2f} MB saved)")
+    return [(index_path, INDEX_FILE)] + [(file_path, f"{BLOB_DIR}/{digest}") for digest, file_path in blobs.items()]
+
+
+def capsule_content_hash(files):
+    """
+    Hash of a capsule's logical content: every path with the sha256 of its data, in sorted order.
+
+    It does not depend on the archive format, compression, member order or metadata, so
+    capsules with the same files have the same content hash.
+
+    Args:
+        files: The "files" section of a capsule manifest.
+
+    Returns:
+        Hex digest.
+    """
+
+    digest = hashlib.sha256()
+    for arcname in sorted(files):
+        digest.update(f"{arcname}\0{files[arcname]['sha256']}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def build_manifest(members, hashes):
+    """
+    Describe every logical file of a capsule by its sha256 and size.
+
+    Returns:
+        Manifest dictionary, as stored in capsule_manifest.json.
+    """
+
+    files = {
+        arcname.replace(os.sep, "/"): {"sha256": digest, "size": os.path.getsize(file_path)}
+        for (file_path, arcname), digest in sorted(zip(members, hashes), key=lambda item: item[0][1].replace(os.sep, "/"))
+    }
+    return {"version": 1, "content_sha256": capsule_content_hash(files), "files": files}
+
+
+def read_capsule_manifest(capsule_path):
+    """
+    Read the manifest of a previously exported capsule.
+
+    Args:
+        capsule_path: A capsule archive (.zip or .tar.zst) or a capsule_manifest.json file.
+
+    Returns:
+        Tuple (manifest, manifest_sha256), where the hash identifies the base capsule.
+    """
+
+    if capsule_path.endswith(".json"):
+        with open(capsule_path, "rb") as f:
+            raw = f.read()
+    else:
+        raw = None
+        for arcname, source in iter_archive_members(capsule_path):
+            if arcname == MANIFEST_FILE:
+                raw = source.read()
+                break
+        if raw is None:
+            raise ValueError(f"{capsule_path} has no {MANIFEST_FILE}; export it again to use it as a base")
+
+    return json.loads(raw), hashlib.sha256(raw).hexdigest()
+
+
+def select_delta_members(members, hashes, manifest, base_capsule):
+    """
+    Keep only the members that are new or changed compared to a base capsule.
+
+    The manifest still lists every file of the full capsule; a "delta" section records
+    the base manifest hash and the files that were changed or removed.
+
+    Returns:
+        Tuple (members, hashes) of the delta.
+    """
+
+    base_manifest, base_hash = read_capsule_manifest(base_capsule)
+    base_files = base_manifest["files"]
+
+    delta_members, delta_hashes, changed = [], [], []
+    for member, digest in zip(members, hashes):
+        arcname = member[1].replace(os.sep, "/")
+        if base_files.get(arcname, {}).get("sha256") != digest:
+            delta_members.append(member)
+            delta_hashes.append(digest)
+            changed.append(arcname)
+
+    manifest["delta"] = {
+        "base_manifest_sha256": base_hash,
+        "changed": changed,
+        "removed": sorted(set(base_files) - set(manifest["files"])),
+    }
+    print(f"Delta against {base_capsule}: {len(changed)} new or changed, {len(manifest['delta']['removed'])} removed, "
+          f"{len(members) - len(changed)} unchanged files skipped")
+    return delta_members, delta_hashes
+
+
+def write_archive(members, output_name, archive_format="zip", policy=None, workers=None, deduplicate=False,
+                  base_capsule=None, volume_size=None, deterministic=False, progress_interval=5.0, cache=None,
+                  uncached_dirs=()):
+    """
+    Write the members into a capsule archive of the given format and report compression.
+
+    Every capsule starts with a capsule_manifest.json listing the sha256 and size of each
+    file and the capsule content hash, so it can serve as the base of a later delta export.
+
+    Deterministic archives have their members sorted by name, fixed timestamps, permissions
+    and compression levels, so the same files always produce byte-identical archives (with
+    the same zlib/zstd versions) that caches and sync tools can skip.
+
+    Progress is printed while exporting (see ExportProgress). The final timing summary is
+    stored as the last member, capsule_export_stats.json, or for deterministic archives
+    next to the archive as <output_name>.export_stats.json.
+
+    Args:
+        members: List of (file_path, arcname) tuples (see collect_zip_members).
+        output_name: Output archive filename, or a writable binary file object such as a pipe.
+        archive_format: "zip" (per-member policy) or "tar.zst" (solid zstd stream).
+        policy: Compression policy for zip archives (see resolve_compression).
+        workers: Number of compression threads (defaults to the number of CPUs).
+        deduplicate: Store byte-identical files only once (see deduplicate_members).
+        base_capsule: Previous capsule (or its manifest); if given, only new or changed
+            files are written (see merge_delta_capsule).
+        volume_size: If set, split the archive into volumes of at most this many bytes,
+            written in a single pass (see VolumeWriter and join_volumes).
+        deterministic: Write a byte-for-byte reproducible archive.
+        progress_interval: Seconds between progress reports.
+        cache: Hash cache to reuse and update, e.g. the pre-flight cache (see load_cache), so
+            files hashed by an earlier export or pre-flight check are only read again if their
+            size or mtime changed. The caller saves it. None hashes every file.
+        uncached_dirs: Folders whose files are left out of the cache (see hash_members).
+
+    Returns:
+        Compression statistics per file type.
+    """
+
+    if archive_format not in ("zip", "tar.zst"):
+        raise ValueError(f"Unknown archive format '{archive_format}', expected 'zip' or 'tar.zst'")
+
+    if deterministic:
+        members = sorted(members, key=lambda member: member[1].replace(os.sep, "/"))
+    hashes = hash_members(members, workers, cache, uncached_dirs)
+    manifest = build_manifest(members, hashes)
+    if base_capsule:
+        members, hashes = select_delta_members(members, hashes, manifest, base_capsule)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        if deduplicate:
+            members = deduplicate_members(members, hashes, os.path.join(scratch, INDEX_FILE))
+
+        manifest_path = os.path.join(scratch, MANIFEST_FILE)
+        with open(manifest_path, "w") as f:
+            json.dump(manifest, f, indent=1)
+        members = [(manifest_path, MANIFEST_FILE)] + members
+
+        progress = ExportProgress(members, progress_interval)
+        print(f"Exporting {progress.total_files} files ({progress.total_bytes / 1e6:.1f} MB)")
+
+        def trailer():
+            timings = progress.finish()
+            stats_path = os.path.join(scratch, EXPORT_STATS_FILE)
+            if deterministic:
+                # Timings differ between runs, so they are kept next to the archive instead
+                if isinstance(output_name, (str, os.PathLike)):
+                    stats_path = f"{os.fspath(output_name)}.export_stats.json"
+                else:
+                    return []
+            with open(stats_path, "w") as f:
+                json.dump(timings, f, indent=1)
+            return [] if deterministic else [(stats_path, EXPORT_STATS_FILE)]
+
+        output, owned = open_archive_output(output_name, volume_size)
+        try:
+            if archive_format == "tar.zst":
+                stats = write_tar_zstd(members, output, workers=workers, deterministic=deterministic,
+                                       progress=progress, trailer=trailer)
+            else:
+                stats = write_zip_parallel(members, output, policy, workers, deterministic, progress, trailer)
+        finally:
+            if owned:
+                output.close()
+
+    report_compression_stats(stats)
+    print(f"Capsule content hash: {manifest['content_sha256']}")
+    return stats
+
+
+def link_or_copy(source, target, use_hard_links=True):
+    """
+    Recreate a duplicate file as a hard link to source, or as a copy if linking is not possible.
+    """
+
+    os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+    if os.path.lexists(target):
+        os.remove(target)
+    if use_hard_links:
+        try:
+            os.link(source, target)
+            return
+        except OSError:
+            pass
+    shutil.copyfile(source, target)
+
+
+def iter_archive_members(archive_path):
+    """
+    Iterate over the regular file members of a .zip or .tar.zst capsule in archive order.
+
+    Yields:
+        Tuples (arcname, file object opened for reading).
+    """
+
+    if archive_path.endswith(".tar.zst"):
+        if zstandard is None:
+            raise ImportError("Reading tar.zst capsules requires the 'zstandard' package (pip install zstandard)")
+        with open(archive_path, "rb") as raw, \
+                zstandard.ZstdDecompressor().stream_reader(raw) as zstd_stream, \
+                tarfile.open(fileobj=zstd_stream, mode="r|") as tar:
+            for member in tar:
+                if member.isfile():
+                    yield member.name, tar.extractfile(member)
+    else:
+        with zipfile.ZipFile(archive_path) as zipf:
+            for zinfo in zipf.infolist():
+                if not zinfo.is_dir():
+                    with zipf.open(zinfo) as f:
+                        yield zinfo.filename, f
+
+
+def safe_join(root, arcname):
+    """
+    Join an archive member name to the extraction root, refusing paths that escape it.
+    """
+
+    target = os.path.realpath(os.path.join(root, arcname))
+    if os.path.commonpath([target, os.path.realpath(root)]) != os.path.realpath(root):
+        raise ValueError(f"Refusing to extract '{arcname}' outside of {root}")
+    return target
+
+
+def extract_capsule(archive_path, destination=".", use_hard_links=True):
+    """
+    Extract a capsule archive, restoring deduplicated capsules to their full tree.
+
+    Regular capsules are extracted as they are (without the capsule metadata files). For deduplicated capsules, every blob is
+    written once to the first path that uses it, and the other paths with the same content
+    become hard links to it (or copies where hard links are not supported). Note that editing
+    a hard-linked file changes all its duplicates.
+
+    Args:
+        archive_path: Capsule archive (.zip or .tar.zst).
+        destination: Directory to extract into.
+        use_hard_links: Whether duplicates may be restored as hard links.
+
+    Returns:
+        Number of files restored.
+    """
+
+    os.makedirs(destination, exist_ok=True)
+    blob_paths = None
+    restored = 0
+
+    for arcname, source in iter_archive_members(archive_path):
+        if arcname in METADATA_FILES:
+            continue
+        if arcname == INDEX_FILE and blob_paths is None:
+            index = json.load(source)
+            blob_paths = {}
+            for path, digest in index["files"].items():
+                blob_paths.setdefault(digest, []).append(path)
+            continue
+
+        if blob_paths is not None and arcname.startswith(f"{BLOB_DIR}/"):
+            paths = blob_paths.get(arcname[len(BLOB_DIR) + 1:], [])
+            if not paths:
+                continue
+            first = safe_join(destination, paths[0])
+            os.makedirs(os.path.dirname(first), exist_ok=True)
+            with open(first, "wb") as target:
+                shutil.copyfileobj(source, target)
+            for path in paths[1:]:
+                link_or_copy(first, safe_join(destination, path), use_hard_links)
+            restored += len(paths)
+        else:
+            target_path = safe_join(destination, arcname)
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            with open(target_path, "wb") as target:
+                shutil.copyfileobj(source, target)
+            restored += 1
+
+    print(f"Extracted {restored} files to {destination}")
+    return restored
+
+
+def merge_delta_capsule(base_path, delta_path, output_name, archive_format="zip", policy=None, workers=None,
+                        deduplicate=False, volume_size=None, deterministic=False):
+    """
+    Rebuild a full capsule from a base capsule and a delta exported against it.
+
+    The base is extracted to a scratch directory, files removed in the delta are deleted,
+    the delta is extracted on top and the result is verified against the delta manifest
+    before being written as a new, complete capsule.
+
+    Args:
+        base_path: The base capsule archive.
+        delta_path: The delta capsule archive (created with base_capsule=...).
+        output_name: Output archive filename of the merged capsule.
+        archive_format, policy, workers, deduplicate, volume_size, deterministic: See write_archive.
+
+    Returns:
+        Compression statistics per file type of the merged capsule.
+
+    Raises:
+        ValueError: If the delta was not made against this base or the merged tree does not match.
+    """
+
+    delta_manifest, _ = read_capsule_manifest(delta_path)
+    if "delta" not in delta_manifest:
+        raise ValueError(f"{delta_path} is not a delta capsule")
+    _, base_hash = read_capsule_manifest(base_path)
+    if delta_manifest["delta"]["base_manifest_sha256"] != base_hash:
+        raise ValueError(f"{delta_path} was not exported against {base_path}")
+
+    with tempfile.TemporaryDirectory() as scratch:
+        extract_capsule(base_path, scratch, use_hard_links=False)
+        for arcname in delta_manifest["delta"]["removed"]:
+            path = safe_join(scratch, arcname)
+            if os.path.exists(path):
+                os.remove(path)
+        extract_capsule(delta_path, scratch, use_hard_links=False)
+
+        members = []
+        for arcname, entry in delta_manifest["files"].items():
+            path = safe_join(scratch, arcname)
+            if not os.path.isfile(path) or file_sha256(path) != entry["sha256"]:
+                raise ValueError(f"Merged capsule does not match the delta manifest at {arcname}")
+            members.append((path, arcname))
+
+        return write_archive(members, output_name, archive_format, policy, workers, deduplicate,
+                             volume_size=volume_size, deterministic=deterministic)
+
+
+def create_reproducibility_zip(queue, readme_path="README.md", output_name="reproducibility_capsule.zip",
+                               workers=None, policy=None, archive_format="zip", deduplicate=False, base_capsule=None,
+                               volume_size=None, output_mode="raw", deterministic=False):
 
     """
     Create a reproducibility zip archive containing only required files.
 
-    Includes selected experiments, referenced inputs, code, README, and main notebook.
+    Includes selected experiments, referenced inputs, code, README, and main notebook, plus
+    the output folders of the queued experiments only (resolved from their outputFolder and name).
+    Members are compressed in parallel (see write_zip_parallel), each with the method the
+    compression policy picks for its file type.
 
     Args:
         queue: The list of experiment selections.
         readme_path: Path to the README file.
         output_name: Output zip filename.
+        workers: Number of compression threads (defaults to the number of CPUs).
+        policy: Compression policy (see resolve_compression), defaults to COMPRESSION_POLICY.
+        archive_format: "zip" or "tar.zst".
+        deduplicate: Store byte-identical files only once (restore with extract_capsule).
+        base_capsule: Previously published capsule (or its capsule_manifest.json). If given, a
+            delta archive with only new or changed files is written (see merge_delta_capsule).
+        volume_size: Split the archive into volumes of at most this many bytes (see join_volumes).
+        output_mode: Outputs of the queued experiments to include: "raw" (all files), "summary"
+            (output_summary.json per experiment instead of parquet files) or "none".
+        deterministic: Write a byte-for-byte reproducible archive (see write_archive).
+
+    Returns:
+        Compression statistics per file type.
     """
 
     files_to_zip = collect_experiment_files(queue)
-    
-
-    static_includes = ["main.ipynb", readme_path]
-    source_dirs = ["src", "OpenDCExperimentRunner", "output"]
-
-    with zipfile.ZipFile(output_name, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as zipf:
-        
-        for file_path in files_to_zip:
-            if os.path.isdir(file_path):
-                recursive_zip(file_path, zipf)
-            elif os.path.isfile(file_path):
-                zipf.write(file_path, arcname=file_path)
 
+    static_includes = ["main.ipynb", readme_path, PROFILES_FILE]
+    source_dirs = ["src", "OpenDCExperimentRunner"]
 
-        for file in static_includes:
-            if os.path.exists(file):
-                zipf.write(file, arcname=file)
-
-
-        for file_path in source_dirs:
-            recursive_zip(file_path, zipf)
+    cache = load_cache()
+    with tempfile.TemporaryDirectory() as scratch:
+        members = collect_zip_members(list(files_to_zip) + static_includes + source_dirs)
+        members += collect_experiment_outputs(queue, output_mode=output_mode, scratch_dir=scratch)
+        stats = write_archive(members, output_name, archive_format, policy, workers, deduplicate, base_capsule,
+                              volume_size, deterministic, cache=cache, uncached_dirs=[scratch])
+    save_cache(cache)
+    return stats
 
     
-def quick_export_all_zip(output_name="reproducibility_capsule.zip"):
+def quick_export_all_zip(output_name="reproducibility_capsule.zip", workers=None, policy=None, archive_format="zip",
+                         deduplicate=False, volume_size=None, deterministic=False):
 
     """
     Export a zip with all relevant directories and files for fast packaging.
 
     Includes experiments, topologies, traces, output, source code, README, and notebook.
+    The default compression policy stores already compressed files (parquet, jars), so
+    this stays fast while the JSON files still shrink.
 
     Args:
         output_name: Name of the resulting zip archive.
+        workers: Number of compression threads (defaults to the number of CPUs).
+        policy: Compression policy (see resolve_compression), defaults to COMPRESSION_POLICY.
+        archive_format: "zip" or "tar.zst".
+        deduplicate: Store byte-identical files only once (restore with extract_capsule).
+        volume_size: Split the archive into volumes of at most this many bytes (see join_volumes).
+        deterministic: Write a byte-for-byte reproducible archive (see write_archive).
+
+    Returns:
+        Compression statistics per file type.
     """
 
     roots = [
         "experiments", "README.md",
         "topologies", "workload_traces", "failure_traces", "carbon_traces",
         "output", "src", "OpenDCExperimentRunner",
-        "main.ipynb"
+        "main.ipynb", PROFILES_FILE
     ]
 
-    with zipfile.ZipFile(output_name, "w", zipfile.ZIP_STORED) as z:
-        for path in roots:
-            if os.path.isfile(path):
-                z.write(path, arcname=path)
-            elif os.path.isdir(path):
-                for root, _, files in os.walk(path):
-                    for f in files:
-                        full = os.path.join(root, f)
-                        z.write(full, arcname=full)
-
+    cache = load_cache()
+    stats = write_archive(collect_zip_members(roots), output_name, archive_format, policy, workers, deduplicate,
+                          volume_size=volume_size, deterministic=deterministic, cache=cache)
+    save_cache(cache)
+    return stats
@@ -0,0 +1,283 @@
+import os
+import math
+from itertools import product
+
+import numpy as np
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from src.sweep import sweep_space, sample_points, count_combinations
+from src.topology_generator import update_topology_values
+from src.experiment_generator import update_experiment_values
+from src.runner import run_all_experiments, clear_experiment_outputs
+from src.exporter import experiment_output_dir
+
+# Default objective: total carbon emission reported by the power sources.
+OBJECTIVE_FILE = "powerSource.parquet"
+OBJECTIVE_COLUMN = "carbon_emission"
+
+# Length scales tried when fitting the Gaussian process (inputs are scaled to [0, 1]).
+LENGTH_SCALES = (0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.0)
+GP_NOISE = 1e-4
+
+
+def read_objective(output_dir, file_name=OBJECTIVE_FILE, column=OBJECTIVE_COLUMN):
+    """
+    Reads the objective of a finished experiment from its outputs.
+
+    The column is summed per output file (one per topology and seed) and the sums are
+    averaged, so repeated seeds give the expected total.
+
+    Args:
+        output_dir: Output folder of the experiment (see experiment_output_dir).
+        file_name: Output file holding the objective.
+        column: Column to sum.
+
+    Returns:
+        The objective value, or None if no output file was found.
+    """
+
+    totals = []
+    for dirpath, _, filenames in os.walk(output_dir):
+        if file_name in filenames:
+            table = pq.read_table(os.path.join(dirpath, file_name), columns=[column])
+            totals.append(pc.sum(table.column(column)).as_py() or 0.0)
+    return sum(totals) / len(totals) if totals else None
+
+
+def encode_parameters(space):
+    """
+    Describes how each parameter is turned into model inputs.
+
+    Numeric parameters become one input scaled to [0, 1]; categorical parameters
+    (e.g. carbon traces) become one 0/1 input per category.
+
+    Returns:
+        List of (name, levels, numeric values or None) in parameter order.
+    """
+
+    encoding = []
+    for name, levels in space["parameters"].items():
+        try:
+            values = [float(level) for level in levels]
+        except (TypeError, ValueError):
+            values = None
+        encoding.append((name, levels, values))
+    return encoding
+
+
+def encode_point(encoding, point):
+    features = []
+    for (name, levels, values), level in zip(encoding, point):
+        if values is None:
+            features += [1.0 if index == level else 0.0 for index in range(len(levels))]
+        else:
+            low, high = min(values), max(values)
+            features.append((values[level] - low) / (high - low) if high > low else 0.0)
+    return features
+
+
+def fit_gaussian_process(X, y):
+    """
+    Fits a Gaussian process with a squared-exponential kernel to the observations.
+
+    The targets are standardized and the length scale is picked from LENGTH_SCALES by
+    maximum marginal likelihood.
+
+    Returns:
+        Model dictionary used by predict.
+    """
+
+    y_mean = y.mean()
+    y_std = y.std() or 1.0
+    target = (y - y_mean) / y_std
+    squared = ((X[:, None, :] - X[None, :, :]) ** 2).sum(axis=2)
+
+    best = None
+    for length_scale in LENGTH_SCALES:
+        K = np.exp(-0.5 * squared / length_scale ** 2) + GP_NOISE * np.eye(len(X))
+        try:
+            L = np.linalg.cholesky(K)
+        except np.linalg.LinAlgError:
+            continue
+        alpha = np.linalg.solve(L.T, np.linalg.solve(L, target))
+        likelihood = -0.5 * target @ alpha - np.log(np.diag(L)).sum()
+        if best is None or likelihood > best[0]:
+            best = (likelihood, length_scale, L, alpha)
+
+    _, length_scale, L, alpha = best
+    return {"X": X, "L": L, "alpha": alpha, "length_scale": length_scale, "y_mean": y_mean, "y_std": y_std}
+
+
+def predict(model, X):
+    """
+    Posterior mean and standard deviation of the Gaussian process at the given inputs.
+    """
+
+    squared = ((X[:, None, :] - model["X"][None, :, :]) ** 2).sum(axis=2)
+    K_star = np.exp(-0.5 * squared / model["length_scale"] ** 2)
+    mean = K_star @ model["alpha"]
+    v = np.linalg.solve(model["L"], K_star.T)
+    variance = np.clip(1.0 - (v ** 2).sum(axis=0), 1e-12, None)
+    return mean * model["y_std"] + model["y_mean"], np.sqrt(variance) * model["y_std"]
+
+
+def expected_improvement(mean, std, best, xi=0.01):
+    """
+    Expected improvement below the best objective found so far (minimization).
+    """
+
+    # Imported here so that importing the module (e.g. with the notebook's other imports)
+    # does not need scipy.
+    from scipy.stats import norm
+
+    improvement = best - mean - xi * abs(best)
+    z = improvement / std
+    return improvement * norm.cdf(z) + std * norm.pdf(z)
+
+
+def candidate_points(space, evaluated, limit, seed):
+    """
+    Combinations the acquisition function is evaluated on: all of them if there are at most
+    `limit`, otherwise a random sample of `limit`. Combinations already evaluated are skipped.
+    """
+
+    levels = [len(values) for values in space["parameters"].values()]
+    if math.prod(levels) <= limit:
+        points = list(product(*(range(count) for count in levels)))
+    else:
+        points = sample_points("random", levels, limit, seed)
+    return [point for point in points if point not in evaluated]
+
+
+def optimize_parameters(parameters, evaluate, budget=20, initial_samples=None, seed=0, candidates=2000, xi=0.01):
+    """
+    Minimizes an expensive objective over a parameter space with Bayesian optimization.
+
+    A Latin hypercube design of `initial_samples` configurations is evaluated first. Then a
+    Gaussian process is fitted to all results and the configuration with the highest
+    expected improvement is evaluated next, until `budget` evaluations were made.
+
+    Args:
+        parameters: Dictionary mapping parameter name to its list of levels, as for sweeps.
+        evaluate: Callable taking a configuration (name -> value) and returning the
+            objective, or None if the evaluation failed.
+        budget: Total number of evaluations.
+        initial_samples: Size of the initial design (defaults to max(3, budget // 4)).
+        seed: Random seed.
+        candidates: Maximum number of configurations scored per iteration.
+        xi: Exploration margin of the expected improvement, relative to the best value.
+
+    Returns:
+        Dictionary with "best" (configuration), "objective" (its value) and "history"
+        (list of {"configuration", "objective"} in evaluation order).
+    """
+
+    space = sweep_space(parameters, "product")
+    total = count_combinations(space)
+    budget = min(budget, total)
+    initial_samples = min(initial_samples or max(3, budget // 4), budget)
+    encoding = encode_parameters(space)
+    names = list(space["parameters"])
+
+    history = []
+    evaluated = {}
+
+    def run(point):
+        configuration = {name: space["parameters"][name][level] for name, level in zip(names, point)}
+        objective = evaluate(configuration)
+        evaluated[point] = objective
+        history.append({"configuration": configuration, "objective": objective})
+        found = [value for value in evaluated.values() if value is not None]
+        best = f"{min(found):g}" if found else "none"
+        print(f"[{len(history)}/{budget}] {configuration} -> {objective} (best {best})")
+
+    for point in sample_points("lhs", [len(values) for values in space["parameters"].values()], initial_samples, seed):
+        if len(history) < budget:
+            run(point)
+
+    iteration = 0
+    while len(history) < budget:
+        iteration += 1
+        pool = candidate_points(space, evaluated, candidates, seed + iteration)
+        if not pool:
+            break
+
+        observed = [(point, value) for point, value in evaluated.items() if value is not None]
+        if len(observed) < 2:
+            run(pool[np.random.default_rng(seed + iteration).integers(len(pool))])
+            continue
+
+        X = np.array([encode_point(encoding, point) for point, _ in observed])
+        y = np.array([value for _, value in observed])
+        model = fit_gaussian_process(X, y)
+        mean, std = predict(model, np.array([encode_point(encoding, point) for point in pool]))
+        run(pool[int(np.argmax(expected_improvement(mean, std, y.min(), xi)))])
+
+    successful = [entry for entry in history if entry["objective"] is not None]
+    if not successful:
+        print("No configuration could be evaluated.")
+        return {"best": None, "objective": None, "history": history}
+
+    best = min(successful, key=lambda entry: entry["objective"])
+    print(f"Best configuration after {len(history)} of {total} possible runs: {best['configuration']} -> {best['objective']:g}")
+    return {"best": best["configuration"], "objective": best["objective"], "history": history}
+
+
+def optimize_topology(parameters, budget=20, initial_samples=None, seed=0, name="optimized",
+                      topology_options=None, experiment_options=None,
+                      objective_file=OBJECTIVE_FILE, objective_column=OBJECTIVE_COLUMN):
+    """
+    Searches topology parameters that minimize an output metric of the simulation, e.g.
+    the battery capacity and host count with the lowest carbon emission for a workload.
+
+    Each proposed configuration is generated as a topology (update_topology_values) and an
+    experiment (update_experiment_values), simulated (run_all_experiments), and scored with
+    read_objective. See optimize_parameters for the search itself.
+
+    Args:
+        parameters: Dictionary mapping topology parameters (see TOPOLOGY_PARAMETERS, e.g.
+            "battery_capacity", "NoH", "carbon") to their levels, e.g. from parse_input.
+        budget: Number of simulations to run.
+        initial_samples: Size of the initial Latin hypercube design.
+        seed: Random seed.
+        name: Name prefix of the generated topologies and experiments.
+        topology_options: Other keyword arguments for update_topology_values (template,
+            include_battery, power model, ...); parameter lists are set by the search.
+        experiment_options: Keyword arguments for update_experiment_values (template,
+            workloads, ...); topologies and name are set by the search.
+        objective_file, objective_column: Output metric to minimize (see read_objective).
+
+    Returns:
+        Result of optimize_parameters, with the experiment of each run in the history.
+    """
+
+    topology_options = dict(topology_options or {})
+    experiment_options = dict(experiment_options or {})
+    for key in ("seeds", "runs", "export_intervals", "print_frequencies"):
+        experiment_options.setdefault(key, [])
+    experiments = []
+
+    def evaluate(configuration):
+        run_name = f"{name}_{len(experiments)}"
+        lists = {f"{key}_list": [value] for key, value in configuration.items()}
+        result = update_topology_values(**topology_options, **lists, generate_combinations=True, name=run_name)
+        if not result or not result["files"]:
+            experiments.append(None)
+            return None
+
+        queue = update_experiment_values(**experiment_options, topologies=result["files"][:1], name=run_name)
+        experiments.append(queue[0]["name"] if queue else None)
+        if not queue:
+            return None
+
+        clear_experiment_outputs(queue)
+        run_all_experiments(list(queue))
+        return read_objective(
+            experiment_output_dir(os.path.join("experiments", queue[0]["name"])), objective_file, objective_column
+        )
+
+    result = optimize_parameters(parameters, evaluate, budget, initial_samples, seed)
+    for entry, experiment in zip(result["history"], experiments):
+        entry["experiment"] = experiment
+    return result
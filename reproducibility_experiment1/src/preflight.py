@@ -0,0 +1,283 @@
+import os
+import json
+import calendar
+import datetime as dt
+from concurrent.futures import ThreadPoolExecutor
+
+import pyarrow.parquet as pq
+
+from src.utils import file_hash
+from src.dependencies import resolve_dependencies
+from src.virtual_topology import is_sweep_file, resolve_variant
+
+# The cache lives in the project folder (reproducibility_experiment1), so the notebook, the
+# tests and command line tools share it whatever their working directory.
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_FILE = os.path.join(PROJECT_DIR, ".preflight_cache.json")
+CACHE_VERSION = 1
+
+# Columns OpenDC needs in each kind of input trace.
+REQUIRED_COLUMNS = {
+    "carbon": ["timestamp", "carbon_intensity"],
+    "tasks": ["id", "submission_time", "duration", "cpu_count", "cpu_capacity", "mem_capacity"],
+    "fragments": ["id", "duration", "cpu_usage"],
+    "failure": ["failure_interval", "failure_duration", "failure_intensity"],
+}
+
+# Kinds of reference (see src/dependencies.py) whose content is checked; other files only need to exist.
+CHECKED_KINDS = ("topology", "workload", "failure", "carbon")
+
+# Column holding the time range of each kind of trace, used for the overlap check.
+TIME_COLUMNS = {
+    "carbon": "timestamp",
+    "tasks": "submission_time",
+}
+
+
+def load_cache(path=CACHE_FILE):
+    """
+    Loads the pre-flight cache, or an empty one if it is missing or outdated.
+    """
+
+    if path and os.path.exists(path):
+        try:
+            with open(path, "r") as f:
+                cache = json.load(f)
+            if cache.get("version") == CACHE_VERSION:
+                return cache
+        except Exception as e:
+            print(f"Warning: Ignoring unreadable pre-flight cache {path}: {e}")
+    return {"version": CACHE_VERSION, "hashes": {}, "results": {}}
+
+
+def save_cache(cache, path=CACHE_FILE):
+    """
+    Saves the pre-flight cache, dropping the hashes of files that no longer exist and the
+    results of content no remaining file has.
+    """
+
+    cache["hashes"] = {file_path: entry for file_path, entry in cache["hashes"].items() if os.path.exists(file_path)}
+    digests = {entry["sha256"] for entry in cache["hashes"].values()}
+    cache["results"] = {key: result for key, result in cache["results"].items() if key.split(":", 1)[1] in digests}
+    try:
+        with open(path, "w") as f:
+            json.dump(cache, f)
+    except Exception as e:
+        print(f"Warning: Failed to save pre-flight cache: {e}")
+
+
+def to_epoch_ms(value):
+    """
+    Converts a parquet statistics value (int in ms or datetime) to epoch milliseconds.
+    """
+
+    if isinstance(value, dt.datetime):
+        if value.tzinfo is None:
+            return calendar.timegm(value.timetuple()) * 1000 + value.microsecond // 1000
+        return int(value.timestamp() * 1000)
+    return int(value)
+
+
+def read_parquet_footer(path, kind):
+    """
+    Checks a parquet file using only its footer: schema, required columns and time range.
+
+    The time range is taken from the row group min/max statistics, so no data pages are read.
+    Error messages do not include the path, as results are shared by files with the same content.
+
+    Args:
+        path: Path to the parquet file.
+        kind: Key into REQUIRED_COLUMNS.
+
+    Returns:
+        Dictionary with "errors" (list of messages), "rows" and "time_range" ([min, max] in ms or None).
+    """
+
+    metadata = pq.ParquetFile(path).metadata
+    schema = metadata.schema.to_arrow_schema()
+
+    missing = [column for column in REQUIRED_COLUMNS[kind] if column not in schema.names]
+    errors = [f"missing required column(s) {missing}"] if missing else []
+
+    time_range = None
+    time_column = TIME_COLUMNS.get(kind)
+    if time_column in schema.names and metadata.num_rows:
+        index = schema.get_field_index(time_column)
+        minimums, maximums = [], []
+        for group in range(metadata.num_row_groups):
+            statistics = metadata.row_group(group).column(index).statistics
+            if statistics is None or not statistics.has_min_max:
+                minimums = None
+                break
+            minimums.append(to_epoch_ms(statistics.min))
+            maximums.append(to_epoch_ms(statistics.max))
+        if minimums:
+            time_range = [min(minimums), max(maximums)]
+
+    return {"errors": errors, "rows": metadata.num_rows, "time_range": time_range}
+
+
+def check_topology(path):
+    """
+    Checks the JSON structure of a topology file, or of every variant of a topology sweep
+    file (see src/virtual_topology.py).
+
+    Returns:
+        Dictionary with "errors".
+    """
+
+    with open(path, "r") as f:
+        topology = json.load(f)
+
+    if not is_sweep_file(path):
+        return {"errors": check_topology_document(topology)}
+
+    errors = []
+    for variant in topology.get("variants", {}):
+        errors += [f"variant {variant}: {error}" for error in check_topology_document(resolve_variant(topology, variant))]
+    return {"errors": errors}
+
+
+def check_topology_document(topology):
+    """
+    Checks the structure of a parsed topology.
+
+    Returns:
+        List of error messages.
+    """
+
+    errors = []
+    clusters = topology.get("clusters")
+    if not isinstance(clusters, list) or not clusters:
+        return ["no clusters defined"]
+
+    for index, cluster in enumerate(clusters):
+        hosts = cluster.get("hosts")
+        if not isinstance(hosts, list) or not hosts:
+            errors.append(f"cluster {index} has no hosts")
+            continue
+        for host in hosts:
+            if "coreCount" not in host.get("cpu", {}) or "coreSpeed" not in host.get("cpu", {}):
+                errors.append(f"host '{host.get('name')}' is missing cpu coreCount/coreSpeed")
+            if "memorySize" not in host.get("memory", {}):
+                errors.append(f"host '{host.get('name')}' is missing memory memorySize")
+
+    return errors
+
+
+def check_reference(kind, path, cache):
+    """
+    Validates one referenced input, using the cached result if the file content is unchanged.
+
+    Args:
+        kind: "topology", "carbon", "failure" or "workload".
+        path: Referenced path as written in the experiment/topology.
+        cache: Pre-flight cache (see load_cache).
+
+    Returns:
+        Validation result dictionary (always contains "errors").
+    """
+
+    if not os.path.exists(path):
+        return {"errors": [f"{kind} file not found: {path}"]}
+
+    if kind == "workload":
+        if not os.path.isdir(path):
+            return {"errors": [f"workload {path} is not a directory"]}
+        tasks = os.path.join(path, "tasks.parquet")
+        if not os.path.exists(tasks):
+            return {"errors": [f"workload {path} has no tasks.parquet"]}
+        result = check_reference("tasks", tasks, cache)
+        fragments = os.path.join(path, "fragments.parquet")
+        if os.path.exists(fragments):
+            fragments_result = check_reference("fragments", fragments, cache)
+            result = dict(result, errors=result["errors"] + fragments_result["errors"])
+        return result
+
+    key = f"{kind}:{file_hash(path, cache)}"
+    if key not in cache["results"]:
+        try:
+            if kind == "topology":
+                result = check_topology(path)
+            else:
+                result = read_parquet_footer(path, kind)
+        except Exception as e:
+            result = {"errors": [f"unreadable: {e}"]}
+        cache["results"][key] = result
+
+    result = cache["results"][key]
+    return dict(result, errors=[f"{kind} {path}: {error}" for error in result["errors"]])
+
+
+def format_range(time_range):
+    start, end = (dt.datetime.fromtimestamp(value / 1000, dt.timezone.utc).strftime("%Y-%m-%d") for value in time_range)
+    return f"{start} - {end}"
+
+
+def preflight_validate(experiment_queue, experiments_dir="experiments", workers=None, cache_path=CACHE_FILE):
+    """
+    Validates every input referenced by the queued experiments before anything is run.
+
+    Unlike validate_experiments, which only checks that the referenced files exist, this also
+    checks topology structure, parquet schemas, required columns and that carbon traces cover
+    the workload's submission period. References come from the shared dependency graph (see
+    src/dependencies.py). Only JSON documents and parquet footers are read. Each distinct file
+    is checked once, in parallel, and results are cached by file hash so revalidating many
+    experiments that share inputs is near-instant.
+
+    Args:
+        experiment_queue: List of experiment metadata dicts with 'name' field.
+        experiments_dir: Directory where experiment files are stored.
+        workers: Number of worker threads (defaults to the number of CPUs).
+        cache_path: Path of the on-disk result cache (None disables persistence).
+
+    Returns:
+        True if every experiment passed, False otherwise.
+    """
+
+    cache = load_cache(cache_path)
+    graph = resolve_dependencies(experiment_queue, experiments_dir)
+    errors = list(graph["errors"])
+    references = graph["experiments"]
+
+    def check_all(kind_paths):
+        unique = sorted(set(kind_paths))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(lambda item: check_reference(item[0], item[1], cache), unique)
+            return dict(zip(unique, results))
+
+    results = check_all(
+        (entry["kind"], path) for path, entry in graph["files"].items() if entry["kind"] in CHECKED_KINDS
+    )
+
+    for result in results.values():
+        errors += result["errors"]
+    for path in graph["missing"]:
+        if graph["files"][path]["kind"] not in CHECKED_KINDS:
+            errors.append(f"{graph['files'][path]['kind']} file not found: {path}")
+
+    for name, refs in references.items():
+        for workload in refs.get("workload", []):
+            workload_range = results[("workload", workload)].get("time_range")
+            for trace in refs.get("carbon", []):
+                carbon_range = results[("carbon", trace)].get("time_range")
+                if workload_range and carbon_range and (
+                    carbon_range[1] < workload_range[0] or workload_range[1] < carbon_range[0]
+                ):
+                    errors.append(
+                        f"carbon trace {trace} ({format_range(carbon_range)}) does not overlap "
+                        f"workload {workload} ({format_range(workload_range)}) in '{name}'"
+                    )
+
+    if cache_path:
+        save_cache(cache, cache_path)
+
+    if errors:
+        print(f"Pre-flight validation failed with {len(errors)} error(s):")
+        for error in dict.fromkeys(errors):
+            print(f"- {error}")
+        return False
+
+    print(f"Pre-flight validation passed ({len(references)} experiments, {len(results)} inputs)")
+    return True
+
@@ -1,46 +1,95 @@
 import os
 import sys
+import json
+import shutil
+import tempfile
 import subprocess
 import time
 
-def run_experiment(path):
+from src.virtual_topology import scratch_root, materialize_virtual_topologies, split_reference, uses_virtual_topologies
+from src.experiment_matrix import load_experiment, experiment_file_name, materialize_experiment_reference, expand_queue
+from src.exporter import experiment_output_dir
+
+def run_java_experiment(jars, experiment_path, cwd=None):
+    """
+    Runs the OpenDC experiment CLI directly with java and the given jars on the classpath.
+
+    Args:
+        jars: List of jar paths.
+        experiment_path: Absolute path to the experiment JSON file.
+        cwd: Working directory the relative paths in the experiment are resolved against.
+    """
+
+    java_cmd = [
+        "java",
+        "-classpath", os.pathsep.join(jars),
+        "org.opendc.experiments.base.runner.ExperimentCli",
+        "--experiment-path", experiment_path
+    ]
+
+    try:
+        result = subprocess.run(java_cmd, capture_output=True, text=True, cwd=cwd)
+        if result.stderr:
+            print("STDERR:\n", result.stderr)
+    except Exception as e:
+        print(f"Failed to run experiment: {e}")
+
+
+def run_experiment(path, jars=None, cwd=None):
     """
     Executes a single OpenDC experiment.
 
     Detects platform (Windows or Linux) and invokes the appropriate runner.
     Prints output and any errors encountered.
 
+    Experiment matrix cells (see src/experiment_matrix.py) and virtual topologies (see
+    src/virtual_topology.py) are materialized into a scratch folder, on tmpfs when
+    available, right before the launch and deleted afterwards (also when the run is
+    interrupted). Other experiments run from their file without a scratch folder.
+
     Args:
-        path: Path to the experiment JSON file.
+        path: Path to the experiment JSON file, or a "<path>.matrix.json#<cell id>" reference.
+        jars: Optional list of jars to run with instead of OpenDCExperimentRunner
+            (e.g. from a capsule, see src/capsule_reader.py).
+        cwd: Working directory for the simulation (defaults to the current one).
     """
 
     print("Running simulation...")
 
-    if not os.path.exists(path):
+    if not os.path.exists(split_reference(path)[0]):
         print(f"ERROR: Experiment file not found at {path}")
         return
 
-    experiment_path = os.path.abspath(path)
+    scratch = None
+    try:
+        try:
+            if split_reference(path)[1] is not None or uses_virtual_topologies(load_experiment(path)):
+                scratch = tempfile.mkdtemp(prefix="opendc_topologies_", dir=scratch_root())
+                path = materialize_experiment_reference(path, scratch)
+                path = materialize_virtual_topologies(path, scratch, cwd)
+        except Exception as e:
+            print(f"ERROR: Failed to prepare experiment: {e}")
+            return
+
+        launch_experiment(os.path.abspath(path), jars, cwd)
+    finally:
+        # Also on KeyboardInterrupt, so no materialized files are left in tmpfs.
+        if scratch is not None:
+            shutil.rmtree(scratch, ignore_errors=True)
 
-    if sys.platform.startswith("win"):
-        lib_dir = os.path.abspath("OpenDCExperimentRunner/lib")
-        classpath = ";".join([
-            os.path.join(lib_dir, f) for f in os.listdir(lib_dir) if f.endswith(".jar")
-        ])
 
-        java_cmd = [
-            "java",
-            "-classpath", classpath,
-            "org.opendc.experiments.base.runner.ExperimentCli",
-            "--experiment-path", experiment_path
-        ]
+def launch_experiment(experiment_path, jars=None, cwd=None):
+    """
+    Starts the simulator for an experiment file (see run_experiment).
+    """
 
-        try:
-            result = subprocess.run(java_cmd, capture_output=True, text=True)
-            if result.stderr is not "":
-                print("STDERR:\n", result.stderr)
-        except Exception as e:
-            print(f"Failed to run experiment: {e}")
+    if jars is not None:
+        run_java_experiment(jars, experiment_path, cwd)
+
+    elif sys.platform.startswith("win"):
+        lib_dir = os.path.abspath("OpenDCExperimentRunner/lib")
+        jars = [os.path.join(lib_dir, f) for f in os.listdir(lib_dir) if f.endswith(".jar")]
+        run_java_experiment(jars, experiment_path)
 
 
     elif sys.platform.startswith("linux"):
@@ -68,7 +117,8 @@ def run_all_experiments(experiment_queue):
     Clears the queue after execution and returns timing stats.
 
     Args:
-        experiment_queue: List of queued experiments.
+        experiment_queue: List of queued experiments; the cells of queued matrix manifests
+            are run one by one (see expand_queue).
 
     Returns:
         A list of dictionaries with experiment names and execution durations.
@@ -82,7 +132,7 @@ def run_all_experiments(experiment_queue):
     
     experiment_times = []
 
-    for exp in experiment_queue:
+    for exp in expand_queue(experiment_queue):
                 
         filename = exp["name"]
         print(f"Running: {filename}")
@@ -99,4 +149,52 @@ def run_all_experiments(experiment_queue):
 
     experiment_queue.clear()
     print("All experiments completed.")
-    return experiment_times
\ No newline at end of file
+    return experiment_times
+
+
+def clear_experiment_outputs(queue):
+    """
+    Deletes the output folders of queued experiments before they run.
+
+    OpenDC writes into an existing output folder, so outputs left by an earlier run under the
+    same name (e.g. other seeds) would be read together with the new ones. The optimizer and
+    successive halving reuse experiment names such as "<name>_0" from one search to the next,
+    and result verification reruns the same reproduction copies.
+
+    Args:
+        queue: Queue entries of the experiments (see update_experiment_values).
+    """
+
+    for entry in expand_queue(queue):
+        output_dir = experiment_output_dir(os.path.join("experiments", entry["name"]))
+        if os.path.isdir(output_dir):
+            shutil.rmtree(output_dir)
+
+
+def prepare_reproduction(rel, experiments_dir="experiments"):
+    """
+    Creates the reproduction copy of an experiment for result verification.
+
+    The copy is saved next to the original as repr_<name>.json and its name is changed
+    so the outputs are written to repr_<name> instead of overwriting the original outputs.
+    A matrix cell is written out as repr_<matrix name>_<cell id>.json.
+
+    Args:
+        rel: Experiment file path (or matrix cell reference) relative to experiments_dir.
+        experiments_dir: Directory where experiment files are stored.
+
+    Returns:
+        Queue entry ({"name": ...}) for the reproduction experiment.
+    """
+
+    data = load_experiment(os.path.join(experiments_dir, rel))
+    rel_dir, file_name = os.path.split(experiment_file_name(rel).replace("\\", "/"))
+    repr_rel = "/".join(part for part in (rel_dir, f"repr_{os.path.splitext(file_name)[0]}.json") if part)
+    repr_full = os.path.join(experiments_dir, repr_rel)
+
+    os.makedirs(os.path.dirname(repr_full), exist_ok=True)
+    data["name"] = os.path.splitext(repr_rel)[0]
+    with open(repr_full, "w") as f:
+        json.dump(data, f, indent=4)
+
+    return {"name": repr_rel}
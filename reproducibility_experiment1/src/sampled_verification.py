@@ -0,0 +1,292 @@
+import os
+import re
+import random
+
+from src.utils import get_topology_group_prefix
+from src.experiment_matrix import load_experiment, list_experiment_references, experiment_file_name
+from src.runner import prepare_reproduction, run_all_experiments, clear_experiment_outputs
+from src.validator import compare_output_pair, resolve_verification_profile
+
+
+def experiment_strata(rel, experiments_dir="experiments"):
+    """
+    Describes an experiment by the inputs that define its stratum.
+
+    Args:
+        rel: Experiment file path (or matrix cell reference) relative to experiments_dir.
+        experiments_dir: Directory where experiment files are stored.
+
+    Returns:
+        Dictionary with sorted tuples of topology groups, workloads and failure models.
+    """
+
+    data = load_experiment(os.path.join(experiments_dir, rel))
+
+    return {
+        "topology_group": tuple(sorted({get_topology_group_prefix(t.get("pathToFile", "")) for t in data.get("topologies", [])})),
+        "workload": tuple(sorted(w.get("pathToFile", "") for w in data.get("workloads", []))),
+        "failure_model": tuple(sorted(f.get("pathToFile", f.get("type", "")) for f in data.get("failureModels", []))),
+    }
+
+
+def read_recorded_durations(readme_path="README.md"):
+    """
+    Reads the per-experiment execution times recorded in the capsule README.
+
+    Returns:
+        Dictionary mapping experiment file name to duration in seconds.
+    """
+
+    durations = {}
+    if not os.path.exists(readme_path):
+        return durations
+
+    with open(readme_path, "r") as f:
+        for line in f:
+            match = re.match(r"^\|\s*(.+?\.json(?:#[\w-]+)?)\s*\|\s*([0-9.]+)\s*\|", line)
+            if match:
+                durations[match.group(1)] = float(match.group(2))
+    return durations
+
+
+def group_strata(experiments, experiments_dir="experiments"):
+    """
+    Groups experiments by stratum (unique topology group/workload/failure model combination).
+
+    Returns:
+        Dictionary mapping the stratum (tuple of the values of experiment_strata) to its
+        experiments, in the order given.
+    """
+
+    strata = {}
+    for rel in experiments:
+        strata.setdefault(tuple(experiment_strata(rel, experiments_dir).values()), []).append(rel)
+    return strata
+
+
+def select_verification_sample(experiments, budget=None, time_budget=None, durations=None, seed=0, experiments_dir="experiments",
+                               strata=None):
+    """
+    Picks a stratified subset of experiments to reproduce within a compute budget.
+
+    Strata are first picked greedily so that every topology group, workload and failure
+    model in the capsule is covered at least once. The remaining budget is spread over the
+    strata (unique topology group/workload/failure model combinations) proportionally to their size.
+    Within a stratum, experiments are always taken in the order of a seeded shuffle, so the
+    experiments sampled from each stratum are a simple random sample of it.
+
+    Args:
+        experiments: Experiment file paths relative to experiments_dir.
+        budget: Maximum number of experiments to rerun (None for no limit).
+        time_budget: Maximum estimated compute time in seconds (None for no limit).
+        durations: Dictionary mapping experiment name to estimated duration in seconds,
+            e.g. from read_recorded_durations. Unknown experiments use the median duration.
+        seed: Random seed for reproducible sample selection.
+        experiments_dir: Directory where experiment files are stored.
+        strata: Strata of the experiments, if already known (see group_strata).
+
+    Returns:
+        List of selected experiment paths.
+    """
+
+    rng = random.Random(seed)
+    durations = durations or {}
+    known = sorted(durations.get(rel, durations.get(os.path.basename(rel))) for rel in experiments
+                   if durations.get(rel, durations.get(os.path.basename(rel))) is not None)
+    default_duration = known[len(known) // 2] if known else 0
+
+    def duration(rel):
+        value = durations.get(rel, durations.get(os.path.basename(rel)))
+        return default_duration if value is None else value
+
+    strata = group_strata(experiments, experiments_dir) if strata is None else strata
+    remaining = {key: rng.sample(members, len(members)) for key, members in strata.items()}
+    levels = {key: {(dimension, value) for dimension, values in enumerate(key) for value in values} for key in strata}
+
+    selected = []
+    spent = 0
+
+    def fits(rel):
+        if budget is not None and len(selected) >= budget:
+            return False
+        return time_budget is None or spent + duration(rel) <= time_budget
+
+    def take(key):
+        nonlocal spent
+        rel = remaining[key].pop(0)
+        selected.append(rel)
+        spent += duration(rel)
+
+    uncovered = set().union(*levels.values()) if levels else set()
+    while uncovered:
+        useful = [key for key, members in remaining.items() if members and levels[key] & uncovered and fits(members[0])]
+        if not useful:
+            break
+        key = max(useful, key=lambda k: (len(levels[k] & uncovered), -duration(remaining[k][0])))
+        take(key)
+        uncovered -= levels[key]
+
+    while True:
+        open_strata = [key for key, members in remaining.items() if members and fits(members[0])]
+        if not open_strata:
+            break
+        take(max(open_strata, key=lambda k: len(strata[k]) / (1 + len(strata[k]) - len(remaining[k]))))
+
+    return selected
+
+
+def capsule_confidence_bound(total, sampled, failed, confidence=0.95):
+    """
+    Upper confidence bound on the number of non-reproducible experiments in a population.
+
+    For a simple random sample without replacement the number of failures follows a
+    hypergeometric distribution, so the bound is the largest number of failing experiments
+    for which observing at most `failed` failures in the sample is still plausible at the
+    given confidence level.
+
+    Args:
+        total: Number of experiments in the population (e.g. a stratum).
+        sampled: Number of experiments reproduced.
+        failed: Number of reproduced experiments that did not match.
+        confidence: Confidence level (e.g. 0.95).
+
+    Returns:
+        Upper bound on the number of failing experiments in the population.
+    """
+
+    # Imported here so that the notebook's imports do not need scipy.
+    from scipy import stats
+
+    alpha = 1 - confidence
+    upper = failed
+    for defective in range(failed, total - (sampled - failed) + 1):
+        if stats.hypergeom.cdf(failed, total, defective, sampled) > alpha:
+            upper = defective
+        else:
+            break
+    return upper
+
+
+def stratified_confidence_bound(strata, confidence=0.95):
+    """
+    Upper confidence bound on the number of non-reproducible experiments in the capsule,
+    from a simple random sample within each stratum (see select_verification_sample).
+
+    Each sampled stratum gets its own hypergeometric bound (see capsule_confidence_bound) at
+    confidence 1 - (1 - confidence) / H for H sampled strata, so that all bounds hold together
+    with at least the requested confidence (Bonferroni) and their sum bounds the capsule.
+    Strata without a sampled experiment count with all of their experiments.
+
+    Args:
+        strata: List of (total, sampled, failed) tuples, one per stratum.
+        confidence: Confidence level of the capsule-level bound.
+
+    Returns:
+        Tuple (upper bound for the capsule, list of upper bounds per stratum).
+    """
+
+    sampled_strata = sum(1 for _, sampled, _ in strata if sampled)
+    level = 1 - (1 - confidence) / max(sampled_strata, 1)
+    bounds = [
+        capsule_confidence_bound(total, sampled, failed, level) if sampled else total
+        for total, sampled, failed in strata
+    ]
+    return sum(bounds), bounds
+
+
+def run_sampled_verification(budget=None, time_budget=None, confidence=0.95, seed=0,
+                             experiments_dir="experiments", readme_path="README.md",
+                             order_sensitive=True, profile=None, strategy="exact", threshold=0.05):
+    """
+    Reruns a stratified sample of the capsule's experiments and compares them to the originals.
+
+    Only the sampled experiments are reproduced, after deleting outputs left by earlier
+    reproductions. Afterwards the results per stratum and a confidence statement about the
+    reproducibility of the whole capsule (see stratified_confidence_bound) are printed.
+
+    Args:
+        budget: Maximum number of experiments to rerun (None for no limit).
+        time_budget: Maximum compute time in seconds, estimated from the README durations.
+        confidence: Confidence level of the capsule-level statement.
+        seed: Random seed for reproducible sample selection.
+        experiments_dir: Directory where experiment files are stored.
+        readme_path: Capsule README with recorded execution times.
+        order_sensitive, profile, strategy, threshold: See compare_all_experiments_outputs.
+
+    Returns:
+        Dictionary with the selected experiments, failures, the upper bound on failing
+        experiments and the per-stratum results.
+    """
+
+    experiments = [rel for rel in list_experiment_references(experiments_dir) if not os.path.basename(rel).startswith("repr_")]
+    if not experiments:
+        print("No experiments found.")
+        return None
+
+    try:
+        profile = resolve_verification_profile(profile)
+    except Exception as e:
+        print(f"Failed to load verification profile: {e}")
+        return None
+
+    strata = group_strata(experiments, experiments_dir)
+    selected = select_verification_sample(
+        experiments, budget, time_budget, read_recorded_durations(readme_path), seed, experiments_dir, strata
+    )
+    if not selected:
+        print("The budget does not allow rerunning any experiment.")
+        return None
+
+    print(f"Selected {len(selected)} of {len(experiments)} experiments for verification:")
+    for rel in selected:
+        print(f"- {rel}")
+
+    queue = [prepare_reproduction(rel, experiments_dir) for rel in selected]
+    clear_experiment_outputs(queue)
+    run_all_experiments(queue)
+
+    failed = []
+    for rel in selected:
+        data = load_experiment(os.path.join(experiments_dir, rel))
+        output_folder = data.get("outputFolder", "output")
+        orig_name = data.get("name", os.path.splitext(experiment_file_name(rel))[0])
+        rel_dir, file_name = os.path.split(os.path.splitext(experiment_file_name(rel))[0])
+        repr_name = os.path.join(rel_dir, f"repr_{file_name}")
+
+        orig_path = os.path.join(output_folder, orig_name)
+        repr_path = os.path.join(output_folder, repr_name)
+        if not compare_output_pair(orig_path, repr_path, order_sensitive, profile, strategy, threshold, confidence, rel):
+            print(f"Mismatch in {rel}")
+            failed.append(rel)
+
+    sampled_set, failed_set = set(selected), set(failed)
+    results = [
+        (key, len(members), len(sampled_set.intersection(members)), len(failed_set.intersection(members)))
+        for key, members in strata.items()
+    ]
+    upper, bounds = stratified_confidence_bound([(total, sampled, failures) for _, total, sampled, failures in results], confidence)
+    print("| Stratum | Experiments | Sampled | Failed | Upper bound |")
+    print("|---------|-------------|---------|--------|-------------|")
+    for (key, total, sampled, failures), bound in zip(results, bounds):
+        label = " / ".join(", ".join(values) or "-" for values in key)
+        print(f"| {label} | {total} | {sampled} | {failures} | {bound} |")
+
+    if failed:
+        print(f"{len(failed)} of {len(selected)} sampled experiments did NOT match.")
+    else:
+        print(f"All {len(selected)} sampled experiments match successfully.")
+    print(
+        f"With {confidence:.0%} confidence, at most {upper} of {len(experiments)} experiments "
+        f"({upper / len(experiments):.1%}) in this capsule would fail to reproduce."
+    )
+
+    return {
+        "selected": selected,
+        "failed": failed,
+        "upper_bound": upper,
+        "total": len(experiments),
+        "strata": [
+            {"stratum": key, "total": total, "sampled": sampled, "failed": failures, "upper_bound": bound}
+            for (key, total, sampled, failures), bound in zip(results, bounds)
+        ],
+    }
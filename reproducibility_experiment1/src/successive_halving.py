@@ -0,0 +1,209 @@
+import os
+import math
+import shutil
+import hashlib
+import tempfile
+
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from src.experiment_generator import update_experiment_values
+from src.utils import file_hash
+from src.runner import run_all_experiments, clear_experiment_outputs
+from src.exporter import experiment_output_dir
+from src.optimizer import read_objective, OBJECTIVE_FILE, OBJECTIVE_COLUMN
+
+WORKLOAD_DIR = "workload_traces"
+# Shortened workloads derived by truncate_workload, outside WORKLOAD_DIR so they are neither
+# offered as workloads in the notebook nor exported with them.
+DERIVED_WORKLOAD_DIR = os.path.join(".cache", "workloads")
+# Hashes of the trace files truncate_workload derived workloads from, by size and mtime.
+TRACE_HASHES = {"hashes": {}}
+HOUR_MS = 3600 * 1000
+
+
+def workload_span_hours(workload, traces_dir=WORKLOAD_DIR):
+    """
+    Length of a workload in hours, from the first submission to the last task end.
+    """
+
+    tasks = pq.read_table(os.path.join(traces_dir, workload, "tasks.parquet"), columns=["submission_time", "duration"])
+    start = pc.min(tasks.column("submission_time")).as_py()
+    end = pc.max(pc.add(tasks.column("submission_time"), tasks.column("duration"))).as_py()
+    return (end - start) / HOUR_MS
+
+
+def truncate_workload(workload, hours, traces_dir=WORKLOAD_DIR, cache_dir=DERIVED_WORKLOAD_DIR):
+    """
+    Derives a shorter workload holding only the tasks submitted in the first hours of a trace.
+
+    The derived workload is written to <cache_dir>/<workload>_first<hours>h_<hash>, where the
+    hash covers the content of the source trace files, and reused while they are unchanged.
+    An edited trace thus gets a new derived workload instead of a stale one. Fragments, if
+    present, are kept for the remaining tasks only.
+
+    Args:
+        workload: Workload folder name under traces_dir.
+        hours: Length of the time window, or None for the full workload.
+        traces_dir: Folder holding the workloads.
+        cache_dir: Folder holding the derived workloads.
+
+    Returns:
+        Path of the workload to use relative to traces_dir, as experiments reference
+        workloads (the original workload if the window covers all of it).
+    """
+
+    if hours is None or hours >= workload_span_hours(workload, traces_dir):
+        return workload
+
+    source = os.path.join(traces_dir, workload)
+    digest = hashlib.sha256()
+    for file_name in ("tasks.parquet", "fragments.parquet"):
+        path = os.path.join(source, file_name)
+        if os.path.exists(path):
+            digest.update(f"{file_name}:{file_hash(path, TRACE_HASHES)}\n".encode())
+
+    name = f"{workload}_first{hours:g}h_{digest.hexdigest()[:12]}"
+    target = os.path.join(cache_dir, name)
+    reference = os.path.relpath(target, traces_dir).replace(os.sep, "/")
+    if os.path.exists(os.path.join(target, "tasks.parquet")):
+        return reference
+
+    tasks = pq.read_table(os.path.join(source, "tasks.parquet"))
+    start = pc.min(tasks.column("submission_time")).as_py()
+    tasks = tasks.filter(pc.less(tasks.column("submission_time"), start + int(hours * HOUR_MS)))
+
+    # Written to a temporary folder first, so an interrupted run never leaves a partial
+    # workload that would be reused.
+    os.makedirs(cache_dir, exist_ok=True)
+    partial = tempfile.mkdtemp(dir=cache_dir, prefix=f".{name}.")
+    try:
+        fragments_path = os.path.join(source, "fragments.parquet")
+        if os.path.exists(fragments_path):
+            fragments = pq.read_table(fragments_path)
+            fragments = fragments.filter(pc.is_in(fragments.column("id"), value_set=tasks.column("id")))
+            pq.write_table(fragments, os.path.join(partial, "fragments.parquet"))
+        pq.write_table(tasks, os.path.join(partial, "tasks.parquet"))
+        if not os.path.exists(target):
+            os.replace(partial, target)
+    finally:
+        shutil.rmtree(partial, ignore_errors=True)
+
+    print(f"Derived workload {reference} ({tasks.num_rows} tasks)")
+    return reference
+
+
+def successive_halving(candidates, evaluate, windows, keep=1 / 3):
+    """
+    Ranks candidates with cheap short runs and spends long runs only on the best ones.
+
+    Every candidate is evaluated at the first window. After each round the candidates are
+    ranked by their score (lower is better) and only the best `keep` fraction (at least one)
+    is evaluated at the next, longer window. Candidates whose evaluation fails are dropped.
+
+    Args:
+        candidates: List of candidates (e.g. topology references).
+        evaluate: Callable evaluate(candidates, window) returning one score (or None) per
+            candidate, so that a round can be run as one batch.
+        windows: Increasing window lengths, the last usually None for full-length runs.
+        keep: Fraction of candidates promoted after each round.
+
+    Returns:
+        Dictionary with "ranking" (list of (candidate, score) of the last round, best first)
+        and "rounds" (list of {"window", "scores"} per round).
+    """
+
+    survivors = list(candidates)
+    rounds = []
+    ranking = []
+    for number, window in enumerate(windows):
+        scores = evaluate(survivors, window)
+        rounds.append({"window": window, "scores": dict(zip(survivors, scores))})
+        ranking = sorted(
+            ((candidate, score) for candidate, score in zip(survivors, scores) if score is not None),
+            key=lambda item: item[1]
+        )
+        label = "full length" if window is None else f"{window:g} h"
+        print(f"Round {number + 1} ({label}): {len(survivors)} candidate(s), best {ranking[0][1] if ranking else None}")
+
+        if number < len(windows) - 1:
+            survivors = [candidate for candidate, _ in ranking[:max(1, math.ceil(len(ranking) * keep))]]
+        if not survivors:
+            break
+
+    return {"ranking": ranking, "rounds": rounds}
+
+
+def successive_halving_sweep(topologies, workload, windows=(72, 168, None), keep=1 / 3, name="halving",
+                             experiment_options=None, objective_file=OBJECTIVE_FILE,
+                             objective_column=OBJECTIVE_COLUMN, traces_dir=WORKLOAD_DIR):
+    """
+    Multi-fidelity sweep: finds the best topologies without simulating all of them in full.
+
+    Each round runs the remaining topologies on the workload truncated to the round's window
+    (see truncate_workload) and promotes the best `keep` fraction by the output metric (see
+    read_objective); the finalists are run on the full workload. Output folders left by an
+    earlier sweep with the same name are deleted before each run (see clear_experiment_outputs).
+
+    Args:
+        topologies: Topology references relative to topologies/, e.g. the "files" of
+            update_topology_values or list_topology_references().
+        workload: Workload folder name under traces_dir.
+        windows: Window length in hours of each round, None for the full workload.
+        keep: Fraction of candidates promoted after each round.
+        name: Name prefix of the generated experiments.
+        experiment_options: Other keyword arguments for update_experiment_values (template,
+            failures, ...); topologies, workloads and name are set per run.
+        objective_file, objective_column: Output metric to minimize.
+        traces_dir: Folder holding the workloads.
+
+    Returns:
+        Result of successive_halving, plus "simulated_hours" and "full_sweep_hours".
+    """
+
+    experiment_options = dict(experiment_options or {})
+    for key in ("seeds", "runs", "export_intervals", "print_frequencies"):
+        experiment_options.setdefault(key, [])
+
+    full_hours = workload_span_hours(workload, traces_dir)
+    totals = {"hours": 0.0}
+
+    def evaluate(candidates, window):
+        trace = truncate_workload(workload, window, traces_dir)
+        hours = full_hours if trace == workload else window
+        label = "full" if trace == workload else f"{window:g}h"
+
+        queues = [
+            update_experiment_values(
+                **experiment_options, topologies=[topology], workloads=[trace], name=f"{name}_{label}_{index}"
+            )
+            for index, topology in enumerate(candidates)
+        ]
+        queue = [entry for entries in queues for entry in entries]
+        clear_experiment_outputs(queue)
+        run_all_experiments(list(queue))
+        totals["hours"] += hours * len(queue)
+
+        scores = []
+        for entries in queues:
+            values = [
+                read_objective(
+                    experiment_output_dir(os.path.join("experiments", entry["name"])), objective_file, objective_column
+                )
+                for entry in entries
+            ]
+            values = [value for value in values if value is not None]
+            scores.append(sum(values) / len(values) if values else None)
+        return scores
+
+    result = successive_halving(topologies, evaluate, windows, keep)
+    result["simulated_hours"] = totals["hours"]
+    result["full_sweep_hours"] = full_hours * len(topologies)
+
+    if result["ranking"]:
+        print(f"Best topology: {result['ranking'][0][0]} ({result['ranking'][0][1]:g})")
+    print(
+        f"Simulated {result['simulated_hours']:.0f} workload hours instead of {result['full_sweep_hours']:.0f} "
+        f"({result['full_sweep_hours'] / max(result['simulated_hours'], 1e-9):.1f}x less)"
+    )
+    return result
@@ -3,6 +3,8 @@ import os
 import json
 import datetime as dt
 
+from src.dependencies import resolve_dependencies
+
 
 def generate_metadata_section():
     """
@@ -45,21 +47,16 @@ def generate_readme_from_queue(experiment_queue, stats, output_path="README.md",
 
     readme_lines += generate_metadata_section()
 
-    for i, exp in enumerate(experiment_queue, start=1):
-        name = exp["name"]
-        readme_lines.append(f"### Experiment {i}: `{name}`")
+    graph = resolve_dependencies(experiment_queue, experiments_dir)
 
-        exp_path = f"{experiments_dir}/{name}"
-        try:
-            with open(exp_path) as f:
-                data = json.load(f)
-        except Exception:
-            readme_lines.append("")
-            continue
+    # The graph lists every experiment in queue order, with the cells of matrices expanded.
+    for i, (name, refs) in enumerate(graph["experiments"].items(), start=1):
+        readme_lines.append(f"### Experiment {i}: `{name}`")
 
-        topologies = [t["pathToFile"] for t in data.get("topologies", [])]
-        workloads = [w["pathToFile"] for w in data.get("workloads", [])]
-        failures = [f["pathToFile"] for f in data.get("failureModels", [])]
+        topologies = refs.get("topology", [])
+        workloads = refs.get("workload", [])
+        failures = refs.get("failure", [])
+        carbon_traces = refs.get("carbon", [])
 
         if topologies:
             readme_lines.append(f"- **Topologies**: {len(topologies)} files")
@@ -79,6 +76,12 @@ def generate_readme_from_queue(experiment_queue, stats, output_path="README.md",
             readme_lines += [f"{f}" for f in failures]
             readme_lines.append("</details>\n")
 
+        if carbon_traces:
+            readme_lines.append(f"- **Carbon traces**: {len(carbon_traces)} files")
+            readme_lines.append("<details><summary>Show Carbon Trace List</summary>\n")
+            readme_lines += [f"{c}" for c in carbon_traces]
+            readme_lines.append("</details>\n")
+
         readme_lines.append("")
 
 
@@ -112,7 +115,10 @@ def generate_readme_from_queue(experiment_queue, stats, output_path="README.md",
 
     readme_lines += [
         "## How to Run",
-        "1. Make sure to have Java 21 and Jupyter Notebooks installed",
+        "1. Make sure to have Java 21 and Jupyter Notebooks installed, and the Python packages used by the notebook:",
+        "   `pip install ipywidgets matplotlib numpy pandas pyarrow psutil scipy`.",
+        "   `scipy` is needed for sampling, optimization, sampled verification and the distribution comparison;",
+        "   `zstandard` is only needed to export or read `tar.zst` capsules (`pip install zstandard`).",
         "2. Open `main.ipynb` in a Jupyter environment.",
         "3. Click **'Run All Experiments'** to execute everything in the queue.",
         "4. Outputs will appear in the `output/` directory.",
@@ -0,0 +1,363 @@
+import os
+import json
+import math
+from itertools import islice, product
+
+import numpy as np
+
+from src.utils import get_val, canonical_json_sha256
+
+# How parameter lists are combined: every combination ("product"), aligned by index ("zip"),
+# or a sample of the combinations (see SAMPLING_MODES).
+SWEEP_MODES = ("product", "zip", "lhs", "sobol", "halton", "random")
+
+# Design-of-experiments samplers: Latin hypercube, Sobol and Halton low-discrepancy
+# sequences, and plain seeded random sampling.
+SAMPLING_MODES = ("lhs", "sobol", "halton", "random")
+
+
+def sweep_space(parameters, mode="product", samples=None, seed=0):
+    """
+    Defines a parameter sweep declaratively.
+
+    Parameters with an empty list are left out. In product and sampling modes, duplicate and
+    None values are dropped from each list up front, so every combination is unique without
+    having to remember the combinations already generated. In zip mode lists are aligned by
+    index and shorter lists yield None for the missing positions.
+
+    In a sampling mode only `samples` combinations of the full product are kept, chosen by
+    the sampler (see sample_points). Each list, numeric levels from parse_input or categories
+    such as carbon traces alike, is one dimension of the design.
+
+    Args:
+        parameters: Dictionary mapping parameter name to its list of values.
+        mode: One of SWEEP_MODES.
+        samples: Number of combinations to sample (sampling modes only).
+        seed: Random seed of the sampler.
+
+    Returns:
+        Sweep space dictionary {"mode", "parameters"} plus "points" in sampling modes.
+    """
+
+    if mode not in SWEEP_MODES:
+        raise ValueError(f"Unknown sweep mode '{mode}', expected one of {SWEEP_MODES}")
+
+    if mode == "zip":
+        values = {name: list(vals) for name, vals in parameters.items() if vals}
+        return {"mode": mode, "parameters": values}
+
+    values = {name: list(dict.fromkeys(v for v in vals if v is not None)) for name, vals in parameters.items() if vals}
+    values = {name: vals for name, vals in values.items() if vals}
+    space = {"mode": mode, "parameters": values}
+    if mode in SAMPLING_MODES:
+        if not samples or samples < 1:
+            raise ValueError(f"Sampling mode '{mode}' needs a number of samples")
+        levels = [len(vals) for vals in values.values()]
+        space["points"] = sample_points(mode, levels, samples, seed)
+        print(f"Sampled {len(space['points'])} of {samples} requested combinations ({math.prod(levels)} in total)")
+    return space
+
+
+def sample_points(mode, levels, samples, seed=0):
+    """
+    Picks combinations of a product space with a design-of-experiments sampler.
+
+    The sampler draws points in the unit hypercube, one dimension per parameter, and each
+    coordinate is mapped to one of the parameter's levels by splitting [0, 1) into equal
+    parts. A Latin hypercube thus uses every level of every parameter as evenly as the
+    budget allows, and Sobol/Halton points spread over all combinations of levels. Points
+    that map to a combination already drawn are dropped and the sampler keeps drawing, so
+    `samples` distinct combinations are returned, or all of them when the space is smaller.
+    Sobol points are drawn in powers of two, which keeps the sequence balanced.
+
+    Args:
+        mode: One of SAMPLING_MODES.
+        levels: Number of levels of each parameter.
+        samples: Number of combinations to pick.
+        seed: Random seed.
+
+    Returns:
+        List of level index tuples, in sampling order.
+    """
+
+    if not levels:
+        return [()]
+
+    # Imported here so that modules only enumerating sweeps (experiment matrices, the validator
+    # and the exporter) do not need scipy.
+    from scipy.stats import qmc
+
+    dimensions = len(levels)
+    if mode == "lhs":
+        sampler = qmc.LatinHypercube(d=dimensions, seed=seed)
+    elif mode == "sobol":
+        sampler = qmc.Sobol(d=dimensions, scramble=True, seed=seed)
+    elif mode == "halton":
+        sampler = qmc.Halton(d=dimensions, scramble=True, seed=seed)
+    else:
+        sampler = None
+
+    rng = np.random.default_rng(seed)
+    target = min(samples, math.prod(levels))
+    # Upper bound on the points drawn, only reached if a sampler keeps missing the last
+    # combinations of a small space.
+    max_points = max(64 * target, 1024)
+    batch = 2 ** math.ceil(math.log2(samples)) if mode == "sobol" else samples
+    chosen = {}
+    drawn = 0
+    while len(chosen) < target and drawn < max_points:
+        if sampler is None:
+            points = rng.random((batch, dimensions))
+        elif mode == "sobol":
+            points = sampler.random_base2(int(math.log2(batch)))
+        else:
+            points = sampler.random(batch)
+        drawn += batch
+        # Doubling keeps every Sobol draw a power of two that continues the sequence.
+        batch = drawn
+
+        indices = np.minimum((points * np.array(levels)).astype(int), np.array(levels) - 1)
+        for row in indices:
+            chosen.setdefault(tuple(int(i) for i in row), None)
+            if len(chosen) == target:
+                break
+    return list(chosen)
+
+
+def count_combinations(space):
+    """
+    Number of combinations in a sweep space, computed without enumerating them.
+    """
+
+    if "points" in space:
+        return len(space["points"])
+    lengths = [len(values) for values in space["parameters"].values()]
+    if space["mode"] == "product":
+        return math.prod(lengths)
+    return max(lengths, default=1)
+
+
+def combination_at(space, index):
+    """
+    The combination at a position of the sweep, computed directly from its index.
+
+    The order matches iter_combinations: in product mode the last parameter varies fastest.
+
+    Returns:
+        Dictionary mapping parameter name to value.
+    """
+
+    parameters = space["parameters"]
+    if space["mode"] == "zip":
+        return {name: get_val(values, index) for name, values in parameters.items()}
+    if "points" in space:
+        return {name: values[level] for (name, values), level in zip(parameters.items(), space["points"][index])}
+
+    combination = {}
+    for name in reversed(list(parameters)):
+        values = parameters[name]
+        index, position = divmod(index, len(values))
+        combination[name] = values[position]
+    return {name: combination[name] for name in parameters}
+
+
+def iter_combinations(space, start=0, limit=None):
+    """
+    Lazily enumerates the combinations of a sweep space.
+
+    Only the current combination is held in memory, so arbitrarily large sweeps can be
+    streamed, previewed or materialized in chunks.
+
+    Args:
+        space: Sweep space (see sweep_space).
+        start: Index of the first combination.
+        limit: Maximum number of combinations to yield (None for all).
+
+    Yields:
+        Dictionaries mapping parameter name to value.
+    """
+
+    names = list(space["parameters"])
+    if space["mode"] == "product":
+        combinations = (dict(zip(names, combo)) for combo in product(*space["parameters"].values()))
+    else:
+        combinations = (combination_at(space, index) for index in range(count_combinations(space)))
+    return islice(combinations, start, None if limit is None else start + limit)
+
+
+def estimate_sweep(space, build, samples=20):
+    """
+    Previews a sweep: its number of combinations and the disk space it would take.
+
+    The size is extrapolated from a few documents built for combinations spread evenly
+    over the sweep; nothing is written to disk.
+
+    Args:
+        space: Sweep space (see sweep_space).
+        build: Callable turning a combination into (relative path, JSON document).
+        samples: Number of combinations to build for the estimate.
+
+    Returns:
+        Dictionary with "combinations", "average_bytes" and "estimated_bytes".
+    """
+
+    total = count_combinations(space)
+    indices = sorted({index * total // samples for index in range(min(samples, total))})
+    sizes = [len(json.dumps(build(combination_at(space, index))[1], indent=4).encode("utf-8")) for index in indices]
+    average = sum(sizes) / len(sizes) if sizes else 0
+    return {"combinations": total, "average_bytes": average, "estimated_bytes": int(average * total)}
+
+
+def report_sweep_estimate(estimate, label="files"):
+    print(
+        f"Sweep of {estimate['combinations']} {label}, about {estimate['estimated_bytes'] / 1e6:.1f} MB on disk "
+        f"({estimate['average_bytes'] / 1e3:.1f} kB each)"
+    )
+
+
+def new_registry():
+    """
+    Empty deduplication state: canonical hash -> file path and file path -> canonical hash.
+    """
+
+    return {"hashes": {}, "paths": {}}
+
+
+def existing_digest(load_existing, path):
+    """
+    Canonical hash of the document already stored under path, "" if it cannot be read, or
+    None if there is none.
+    """
+
+    if load_existing is None:
+        return None
+    try:
+        document = load_existing(path)
+    except (OSError, ValueError):
+        return ""
+    return None if document is None else canonical_json_sha256(document)
+
+
+def register_document(registry, path, document, load_existing=None):
+    """
+    Finds the canonical file of a generated document.
+
+    A document whose content was already generated maps to the file holding that content.
+    A new document whose path is already taken by different content (a path collision),
+    generated in this sweep or, with load_existing, stored before it, is moved to the same
+    path with a short hash suffix instead of overwriting the other file.
+
+    Args:
+        registry: Deduplication state (see new_registry).
+        path: Relative path the document would be saved under.
+        document: The JSON document.
+        load_existing: Optional callable returning the document already stored under a
+            path, or None if there is none.
+
+    Returns:
+        Tuple (canonical path, status) where status is "new", "duplicate", "collision" or
+        "existing" (the same content is already stored under the path).
+    """
+
+    digest = canonical_json_sha256(document)
+    if digest in registry["hashes"]:
+        return registry["hashes"][digest], "duplicate"
+
+    status = "new"
+    stored = None if path in registry["paths"] else existing_digest(load_existing, path)
+    if path in registry["paths"] or stored not in (None, digest):
+        root, ext = os.path.splitext(path)
+        path = f"{root}_{digest[:8]}{ext}"
+        status = "collision"
+        stored = existing_digest(load_existing, path)
+    if stored == digest:
+        status = "existing"
+
+    registry["hashes"][digest] = path
+    registry["paths"][path] = digest
+    return path, status
+
+
+def materialize_sweep(space, build, save, start=0, limit=None, chunk_size=1000, deduplicate=False, registry=None,
+                      load_existing=None):
+    """
+    Builds and saves the combinations of a sweep, chunk by chunk.
+
+    With deduplicate, every document is identified by its canonical content hash and each
+    distinct document is saved once (see register_document). Combinations producing the same
+    content share its file, and path collisions, also with documents stored before the sweep
+    (given load_existing), are reported instead of overwriting files.
+
+    Args:
+        space: Sweep space (see sweep_space).
+        build: Callable turning a combination into (relative path, JSON document).
+        save: Callable saving a document, called as save(document, relative path).
+        start: Index of the first combination to materialize.
+        limit: Maximum number of combinations to materialize in this call (None for all).
+        chunk_size: Number of combinations between progress reports.
+        deduplicate: Whether to save identical documents only once.
+        registry: Deduplication state to continue from, e.g. the "registry" of a previous call.
+        load_existing: Callable returning the document already stored under a relative path,
+            or None if there is none (deduplicate only). Files already holding the same
+            content are kept as they are.
+
+    Returns:
+        Dictionary with "written", "total", "next" (the start index to resume from, or None
+        once the sweep is complete), "files" (the file of each materialized combination, in
+        order from start), "duplicates", "existing" (files kept as they are), "collisions"
+        (list of (path, renamed path)) and "registry".
+    """
+
+    total = count_combinations(space)
+    registry = registry if registry is not None else new_registry()
+    materialized = 0
+    written = 0
+    files = []
+    duplicates = 0
+    existing = 0
+    collisions = []
+    combinations = iter_combinations(space, start, limit)
+    while True:
+        chunk = list(islice(combinations, chunk_size))
+        if not chunk:
+            break
+        for combination in chunk:
+            path, document = build(combination)
+            status = "new"
+            if deduplicate:
+                original = path
+                path, status = register_document(registry, path, document, load_existing)
+                if status != "duplicate" and path != original:
+                    collisions.append((original, path))
+            if status == "duplicate":
+                duplicates += 1
+            elif status == "existing":
+                existing += 1
+            else:
+                save(document, path)
+                written += 1
+            files.append(path)
+        materialized += len(chunk)
+        if materialized < (total - start if limit is None else min(limit, total - start)):
+            print(f"Materialized {start + materialized}/{total} combinations")
+
+    end = start + materialized
+    print(f"Materialized {materialized} combinations ({end}/{total} of the sweep)")
+    if deduplicate:
+        print(
+            f"Wrote {written} unique files, skipped {duplicates} duplicate(s) and {existing} unchanged "
+            f"existing file(s), {len(collisions)} path collision(s)"
+        )
+        for original, renamed in collisions:
+            print(f"- {original} already holds different content, saved as {renamed}")
+
+    return {
+        "written": written,
+        "total": total,
+        "next": end if end < total else None,
+        "files": files,
+        "duplicates": duplicates,
+        "existing": existing,
+        "collisions": collisions,
+        "registry": registry,
+    }
@@ -0,0 +1,56 @@
+def set_value(patch, path, value):
+    """
+    Records an override in a variant's patch.
+
+    A patch is a dictionary mapping paths (tuples of dictionary keys and list indices, e.g.
+    ("clusters", 0, "hosts", 1, "cpu", "coreCount")) to the value at that path. Overrides are
+    applied in the order they are recorded.
+
+    Args:
+        patch: Patch dictionary of the variant.
+        path: Tuple of keys/indices into the document.
+        value: New value at that path.
+    """
+
+    patch[tuple(path)] = value
+
+
+def apply_patch(base, patch):
+    """
+    Builds a variant of a template document from the template and an override patch.
+
+    Only the dictionaries and lists on the path to an override are copied; every other part
+    of the variant is shared with the template. Producing N variants therefore costs
+    O(N x patch size) instead of the O(N x document size) of a deep copy per variant.
+    Since parts are shared, neither the template nor the variants may be modified in place;
+    variants are meant to be serialized (e.g. by json.dump) or patched again.
+
+    Args:
+        base: Template document (parsed JSON).
+        patch: Patch dictionary (see set_value).
+
+    Returns:
+        The variant document.
+    """
+
+    if not patch:
+        return base
+
+    owned = set()
+
+    def copy(container):
+        container = list(container) if isinstance(container, list) else dict(container)
+        owned.add(id(container))
+        return container
+
+    document = copy(base)
+    for path, value in patch.items():
+        node = document
+        for key in path[:-1]:
+            child = node[key] if isinstance(node, list) else node.get(key, {})
+            if id(child) not in owned:
+                child = copy(child)
+                node[key] = child
+            node = child
+        node[path[-1]] = value
+    return document
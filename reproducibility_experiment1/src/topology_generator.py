@@ -1,8 +1,18 @@
 from src.utils import *
-from itertools import product
+from src.sweep import sweep_space, estimate_sweep, report_sweep_estimate, materialize_sweep
+from src.batch_writer import BatchWriter
+from src.templating import set_value, apply_patch
+from src.virtual_topology import SWEEP_SUFFIX, encode_patch, open_sweep, save_sweep
 import json
 
 
+# Topology parameters that can be swept, in the order their lists are combined.
+TOPOLOGY_PARAMETERS = (
+    "carbon", "NoH", "battery_capacity", "starting_CI", "charging_speed", "expected_lifetime",
+    "core_count", "core_speed", "memory_size",
+)
+
+
 def update_topology_values(
     topo_template_path=None,
     topology_file=None,
@@ -22,7 +32,18 @@ def update_topology_values(
     power_model_max=None,
     power_model_power=None,
     add_power_model=False,
-    generate_combinations=False
+    generate_combinations=False,
+    preview=False,
+    max_topologies=None,
+    start=0,
+    chunk_size=1000,
+    registry=None,
+    virtual=False,
+    sampling=None,
+    samples=None,
+    seed=0,
+    normalize_hosts=False,
+    merge_clusters=False
 ):
     """
     Generate and save new topology files based on provided variations.
@@ -33,11 +54,50 @@ def update_topology_values(
 
     - If generate_combinations is True, creates a topology for each unique combination.
     - If False, aligns values by index across lists.
+    - If sampling is set ("lhs", "sobol", "halton" or "random"), creates `samples` topologies
+      chosen from all combinations by that design-of-experiments sampler (see sample_points).
     - Only non-empty inputs are used in combination generation.
     - Carbon traces and battery configs are added to clusters if provided.
     - Power model is added to hosts if enabled.
 
+    Combinations are enumerated lazily by the sweep engine (see src/sweep.py), so large
+    sweeps can be previewed first and materialized in parts. Identical topologies are written
+    once: combinations that produce the same content (e.g. battery values swept without
+    include_battery) share one file, and combinations whose paths collide get distinct files.
+    Files are written in batches by a BatchWriter, which prints one summary at the end.
+
+    With virtual, no topology files are written: the template and the patch of every
+    variant are stored in a single topologies/<name>.sweep.json, and experiments reference
+    the variants as "<name>.sweep.json#<variant>" (see src/virtual_topology.py). Running
+    more sweeps into the same file with the same template adds to its variants; a sweep of
+    another template is saved under a new name instead (see open_sweep).
+
+    With normalize_hosts, identical host entries of each generated topology are collapsed into
+    one entry with the summed count (see normalize_topology) and the reduction is reported.
+    Virtual sweeps normalize their template instead, unless the host count is swept and the
+    template had entries to collapse (the count override applies per entry). It is off by
+    default: the outputs name the hosts differently (see normalize_topology), and the speedup
+    has not been measured with OpenDC yet (see benchmarks/host_normalization.py).
+
+    Args:
+        preview: Only print the number of topologies and the estimated disk use; nothing is written.
+        max_topologies: Maximum number of topologies to write in this call (None for all).
+        start: Index of the first combination to write, e.g. the "next" of a previous call.
+        chunk_size: Number of topologies per progress report and write batch.
+        registry: Deduplication state of a previous call to continue (the "registry" of its result).
+        virtual: Store the sweep as template plus patches instead of one file per topology.
+        sampling: Sampler to pick combinations with (one of SAMPLING_MODES), or None.
+        samples: Number of combinations to sample (the run budget).
+        seed: Random seed of the sampler, for reproducible designs.
+        normalize_hosts: Collapse identical host entries of the generated topologies.
+        merge_clusters: With normalize_hosts, also merge clusters with identical settings.
+
     Saves each generated topology under a structured path reflecting its parameters.
+
+    Returns:
+        The sweep estimate when previewing, otherwise the materialization summary
+        (see materialize_sweep), whose "files" maps each combination to its topology file,
+        or None if the template could not be loaded.
     """
 
     if topology_file:
@@ -53,168 +113,146 @@ def update_topology_values(
             "clusters": [create_new_cluster(16, 2100, 100000, 1, 0)]
         }
 
-    
-    carbon_list = carbon_list or []
-    NoH_list = NoH_list or []
-    battery_capacity_list = battery_capacity_list or []
-    starting_CI_list = starting_CI_list or []
-    charging_speed_list = charging_speed_list or []
-    expected_lifetime_list = expected_lifetime_list or []
-    core_count_list = core_count_list or []
-    core_speed_list = core_speed_list or []
-    memory_size_list = memory_size_list or []
-
-    if generate_combinations:
-        inputs = {
-            "carbon": carbon_list,
-            "NoH": NoH_list,
-            "battery_capacity": battery_capacity_list,
-            "starting_CI": starting_CI_list,
-            "charging_speed": charging_speed_list,
-            "expected_lifetime": expected_lifetime_list,
-            "core_count": core_count_list,
-            "core_speed": core_speed_list,
-            "memory_size": memory_size_list
-        }
-
-        active = {key: value for key, value in inputs.items() if value}
-
-        keys, lists = zip(*active.items())
-
-        seen = set()
-        for combo in product(*lists):
-            if None in combo:
-                continue
-            if combo in seen:
-                continue
-            seen.add(combo)
-        
-            values = dict(zip(keys, combo))
-
-            new_topology = json.loads(json.dumps(original_topology))
-            build_one_topology(
-                new_topology=new_topology,
-                core_count=values.get("core_count"),
-                core_speed=values.get("core_speed"),
-                memory_size=values.get("memory_size"),
-                carbon=values.get("carbon"),
-                NoH=values.get("NoH"),
-                battery_capacity=values.get("battery_capacity"),
-                starting_CI=values.get("starting_CI"),
-                charging_speed=values.get("charging_speed"),
-                expected_lifetime=values.get("expected_lifetime"),
-                include_battery=include_battery,
-                name=name,
-                power_model_type=power_model_type,
-                power_model_idle=power_model_idle,
-                power_model_max=power_model_max,
-                power_model_power=power_model_power,
-                add_power_model=add_power_model
-            )
-
+    lists = {
+        "carbon": carbon_list,
+        "NoH": NoH_list,
+        "battery_capacity": battery_capacity_list,
+        "starting_CI": starting_CI_list,
+        "charging_speed": charging_speed_list,
+        "expected_lifetime": expected_lifetime_list,
+        "core_count": core_count_list,
+        "core_speed": core_speed_list,
+        "memory_size": memory_size_list
+    }
+    if sampling:
+        mode = sampling
     else:
-        max_len = max(
-            len(core_count_list), len(core_speed_list), len(memory_size_list),
-            len(carbon_list), len(NoH_list),
-            len(battery_capacity_list), len(starting_CI_list), len(charging_speed_list),
-            1
+        mode = "product" if generate_combinations else "zip"
+    try:
+        space = sweep_space(lists, mode, samples, seed)
+    except ValueError as e:
+        print(f"Invalid sweep: {e}")
+        return
+
+    reduction = new_normalization_report()
+    if normalize_hosts and virtual:
+        normalized, template_report = normalize_topology(original_topology, merge_clusters)
+        if NoH_list and template_report["host_entries"][1] < template_report["host_entries"][0]:
+            print("Host normalization skipped: the host count is swept per host entry of the template.")
+        else:
+            original_topology = normalized
+            report_normalization(template_report, "template")
+
+    def build(values):
+        path, patch = build_topology_patch(
+            original_topology,
+            **{key: values.get(key) for key in TOPOLOGY_PARAMETERS},
+            include_battery=include_battery,
+            name=name,
+            power_model_type=power_model_type,
+            power_model_idle=power_model_idle,
+            power_model_max=power_model_max,
+            power_model_power=power_model_power,
+            add_power_model=add_power_model
         )
-
-        for i in range(max_len):
-            core_count = get_val(core_count_list, i)
-            core_speed = get_val(core_speed_list, i)
-            memory_size = get_val(memory_size_list, i)
-            NoH = get_val(NoH_list, i)
-            carbon = get_val(carbon_list, i)
-            battery_capacity = get_val(battery_capacity_list, i)
-            starting_CI = get_val(starting_CI_list, i)
-            charging_speed = get_val(charging_speed_list, i)
-            expected_lifetime = get_val(expected_lifetime_list, i)
-
-            new_topology = json.loads(json.dumps(original_topology))
-            build_one_topology(
-                new_topology=new_topology,
-                core_count=core_count,
-                core_speed=core_speed,
-                memory_size=memory_size,
-                carbon=carbon,
-                NoH=NoH,
-                battery_capacity=battery_capacity,
-                starting_CI=starting_CI,
-                charging_speed=charging_speed,
-                expected_lifetime=expected_lifetime,
-                include_battery=include_battery,
-                name=name,
-                power_model_type=power_model_type,
-                power_model_idle=power_model_idle,
-                power_model_max=power_model_max,
-                power_model_power=power_model_power,
-                add_power_model=add_power_model
-            )
+        if virtual:
+            return os.path.splitext(path)[0], encode_patch(patch)
+        topology = apply_patch(original_topology, patch)
+        if normalize_hosts:
+            topology, report = normalize_topology(topology, merge_clusters)
+            add_normalization_report(reduction, report)
+        return path, topology
+
+    if preview:
+        estimate = estimate_sweep(space, build)
+        report_sweep_estimate(estimate, "topology variants" if virtual else "topologies")
+        return estimate
+
+    if virtual:
+        sweep_path, sweep = open_sweep(f"topologies/{name or 'topology'}{SWEEP_SUFFIX}", original_topology)
+        sweep_name = sweep_path[len("topologies/"):]
+
+        def add_variant(patch, variant):
+            sweep["variants"][variant] = patch
+
+        result = materialize_sweep(space, build, add_variant, start, max_topologies, chunk_size,
+                                   deduplicate=True, registry=registry, load_existing=sweep["variants"].get)
+        save_sweep(sweep_path, sweep)
+        print(f"Saved {len(sweep['variants'])} topology variants to {sweep_path}")
+        result["files"] = [f"{sweep_name}#{variant}" for variant in result["files"]]
+        return result
+
+    with BatchWriter("topologies", "topologies", chunk_size) as writer:
+        result = materialize_sweep(space, build, writer.add, start, max_topologies, chunk_size,
+                                   deduplicate=True, registry=registry, load_existing=load_saved_topology)
+    if normalize_hosts:
+        report_normalization(reduction, "generated topologies")
+    return result
 
         
-def build_one_topology(new_topology,
-                        core_count, core_speed, memory_size,
-                        carbon, NoH,
-                        battery_capacity, starting_CI, charging_speed, expected_lifetime,
-                        include_battery, name,
-                        power_model_type, power_model_idle,
-                        power_model_max, power_model_power, add_power_model):
-    
+def build_topology_patch(template,
+                         core_count, core_speed, memory_size,
+                         carbon, NoH,
+                         battery_capacity, starting_CI, charging_speed, expected_lifetime,
+                         include_battery, name,
+                         power_model_type, power_model_idle,
+                         power_model_max, power_model_power, add_power_model):
+
     """
-    Populate and save a single topology configuration based on inputs.
+    Describe a topology configuration as overrides of a template, without copying it.
 
-    Applies cluster-level and host-level settings including carbon trace, battery,
-    power model, and compute specs. Naming is handled automatically.
+    The template is only read; apply the patch with apply_patch (see src/templating.py)
+    to get the topology.
 
+    Returns:
+        Tuple of the relative file path for the topology (see build_topology_path)
+        and the patch.
     """
-    
-    if "clusters" in new_topology:
-            for cluster in new_topology["clusters"]:
-                if carbon:
-                    cluster["powerSource"] = {
-                    "carbonTracePath": f"carbon_traces/{carbon}"
-                    }
-                
-                if include_battery and battery_capacity is not None and starting_CI is not None and float(starting_CI) > 0:
-                    cluster["battery"] = {
-                        "capacity": int(battery_capacity),
-                        "chargingSpeed": int(charging_speed) * int(battery_capacity) if charging_speed else 0,
-                        "embodiedCarbon": 100 * int(battery_capacity),
-                        "expectedLifetime": int(expected_lifetime) if int(expected_lifetime) is not None else 10
-                    }
-
-                    if "batteryPolicy" not in cluster["battery"]:
-                        cluster["battery"]["batteryPolicy"] = {
-                            "type": "runningMeanPlus",
-                            "startingThreshold": float(starting_CI),
-                            "windowSize": 168
-                        }
-
-                for host in cluster.get("hosts", []):
-                    if core_count is not None:
-                        host["cpu"]["coreCount"] = int(core_count)
-                    if core_speed is not None: 
-                        host["cpu"]["coreSpeed"] = int(core_speed)
-                    if memory_size is not None:
-                        host["memory"]["memorySize"] = int(memory_size)
-                    if NoH is not None:
-                        host["count"] = int(NoH)
-
-                    if add_power_model:
-                        if power_model_type is not None:
-                            power_model = {"modelType": power_model_type}
-
-                            if power_model_power is not None:
-                                power_model["power"] = float(power_model_power)
-                            if power_model_idle is not None:
-                                power_model["idlePower"] = float(power_model_idle)
-                            if power_model_max:
-                                power_model["maxPower"] = float(power_model_max)
-                            
-                            host["powerModel"] = power_model
 
+    patch = {}
+    for c, cluster in enumerate(template.get("clusters", [])):
+        if carbon:
+            set_value(patch, ("clusters", c, "powerSource"), {
+                "carbonTracePath": f"carbon_traces/{carbon}"
+            })
         
+        if include_battery and battery_capacity is not None and starting_CI is not None and float(starting_CI) > 0:
+            set_value(patch, ("clusters", c, "battery"), {
+                "capacity": int(battery_capacity),
+                "chargingSpeed": int(charging_speed) * int(battery_capacity) if charging_speed else 0,
+                "embodiedCarbon": 100 * int(battery_capacity),
+                "expectedLifetime": int(expected_lifetime) if int(expected_lifetime) is not None else 10,
+                "batteryPolicy": {
+                    "type": "runningMeanPlus",
+                    "startingThreshold": float(starting_CI),
+                    "windowSize": 168
+                }
+            })
+
+        for h, host in enumerate(cluster.get("hosts", [])):
+            host_path = ("clusters", c, "hosts", h)
+            if core_count is not None:
+                set_value(patch, host_path + ("cpu", "coreCount"), int(core_count))
+            if core_speed is not None: 
+                set_value(patch, host_path + ("cpu", "coreSpeed"), int(core_speed))
+            if memory_size is not None:
+                set_value(patch, host_path + ("memory", "memorySize"), int(memory_size))
+            if NoH is not None:
+                set_value(patch, host_path + ("count",), int(NoH))
+
+            if add_power_model:
+                if power_model_type is not None:
+                    power_model = {"modelType": power_model_type}
+
+                    if power_model_power is not None:
+                        power_model["power"] = float(power_model_power)
+                    if power_model_idle is not None:
+                        power_model["idlePower"] = float(power_model_idle)
+                    if power_model_max:
+                        power_model["maxPower"] = float(power_model_max)
+                    
+                    set_value(patch, host_path + ("powerModel",), power_model)
+
     path = build_topology_path(carbon = carbon,
                                     NoH = NoH,
                                     battery_capacity = battery_capacity,
@@ -225,11 +263,9 @@ def build_one_topology(new_topology,
                                     memory_size = memory_size,
                                     name = name
                                 )
-                                                
 
-    save_topology(new_topology, path)
-  
-        
+    return path, patch
+
 
 def build_topology_path(
     carbon,
@@ -284,6 +320,103 @@ def build_topology_path(
 
 
 
+def host_spec_key(entry, ignored):
+    """
+    Canonical form of a host or cluster definition without its identifying fields.
+    """
+
+    return json.dumps({key: value for key, value in entry.items() if key not in ignored}, sort_keys=True)
+
+
+def normalize_topology(topology, merge_clusters=False):
+    """
+    Collapse identical host definitions of a topology into one entry per specification.
+
+    Host entries of a cluster that only differ in name and count (same CPU, memory, power
+    model, ...) become a single entry, named after the first one, whose count is the sum of
+    their counts. OpenDC then parses and instantiates one host definition per specification.
+    The hosts being simulated stay the same, but the hosts in the outputs are named after
+    the remaining entries, so host names and the number of distinct host names in host.parquet
+    (and other per-host outputs) change. compare_experiment_outputs therefore reports a mismatch
+    against reference outputs of the unnormalized topology; normalize both or neither.
+
+    With merge_clusters, clusters whose settings other than name and hosts are identical
+    (power source, battery, ...) are merged first, named after the first one, so identical
+    hosts spread over such clusters are collapsed as well. This changes the per-cluster
+    outputs (e.g. one power source instead of several), so it is off by default.
+
+    The input is not modified; unchanged parts are shared with it.
+
+    Args:
+        topology: Topology dictionary.
+        merge_clusters: Also merge clusters with identical settings.
+
+    Returns:
+        Tuple of the normalized topology and a report {"clusters": [before, after],
+        "host_entries": [before, after], "hosts": number of hosts} (see report_normalization).
+    """
+
+    report = new_normalization_report()
+    clusters = []
+    by_settings = {}
+    for cluster in topology.get("clusters", []):
+        hosts = cluster.get("hosts", [])
+        report["clusters"][0] += 1
+        report["host_entries"][0] += len(hosts)
+        report["hosts"] += sum(host.get("count", 1) for host in hosts)
+
+        key = host_spec_key(cluster, ("name", "hosts")) if merge_clusters else len(clusters)
+        if key in by_settings:
+            by_settings[key]["hosts"] += hosts
+            continue
+        merged = dict(cluster)
+        merged["hosts"] = list(hosts)
+        by_settings[key] = merged
+        clusters.append(merged)
+
+    for cluster in clusters:
+        hosts = {}
+        for host in cluster["hosts"]:
+            key = host_spec_key(host, ("name", "count"))
+            if key in hosts:
+                hosts[key]["count"] = hosts[key].get("count", 1) + host.get("count", 1)
+            else:
+                hosts[key] = dict(host)
+        cluster["hosts"] = list(hosts.values())
+        report["host_entries"][1] += len(cluster["hosts"])
+    report["clusters"][1] = len(clusters)
+
+    normalized = dict(topology)
+    if "clusters" in topology:
+        normalized["clusters"] = clusters
+    return normalized, report
+
+
+def new_normalization_report():
+    return {"topologies": 0, "clusters": [0, 0], "host_entries": [0, 0], "hosts": 0}
+
+
+def add_normalization_report(total, report):
+    total["topologies"] += 1
+    for key in ("clusters", "host_entries"):
+        total[key][0] += report[key][0]
+        total[key][1] += report[key][1]
+    total["hosts"] += report["hosts"]
+
+
+def report_normalization(report, label="topology"):
+    """
+    Print the reduction achieved by normalize_topology.
+    """
+
+    before, after = report["host_entries"]
+    reduction = 1 - after / before if before else 0.0
+    print(
+        f"Normalized {label}: {before} host entries -> {after} ({reduction:.1%} fewer) "
+        f"for {report['hosts']} hosts, {report['clusters'][0]} clusters -> {report['clusters'][1]}"
+    )
+
+
 def create_new_cluster(core_count, core_speed, memory_size, host_count, index): 
     """
     Create a default cluster with a single host entry.
@@ -310,16 +443,14 @@ def create_new_cluster(core_count, core_speed, memory_size, host_count, index):
     }
 
 
-def save_topology(topology: dict, rel_path: str):
+def load_saved_topology(rel_path: str):
 
     """
-    Save a topology dictionary to disk under the topologies/ directory.
-
-    Creates subfolders as necessary.
+    Load a topology saved under the topologies/ directory, or None if there is none.
     """
-    
+
     full_path = f"topologies/{rel_path}"
-    os.makedirs(os.path.dirname(full_path), exist_ok=True)  
-    with open(full_path, "w", encoding="utf-8") as f:
-        json.dump(topology, f, indent=4)
-    print(f"Generated {rel_path}")
\ No newline at end of file
+    if not os.path.exists(full_path):
+        return None
+    with open(full_path, "r") as f:
+        return json.load(f)
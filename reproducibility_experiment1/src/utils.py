@@ -1,4 +1,6 @@
 import os
+import json
+import hashlib
 import platform
 import psutil
 import socket
@@ -7,9 +9,11 @@ import socket
 def get_topology_group_prefix(path):
     """
     Extract the directory structure from a topology path (e.g. borg/800/0_1000/DE.json → borg/800/0_1000).
-    This is used to group similar topologies into one experiment.
+    This is used to group similar topologies into one experiment. Variants of a topology sweep
+    are grouped as if the sweep were a folder (e.g. borg.sweep.json#hosts1/DE → borg/hosts1).
     """
-    return os.path.dirname(path.replace("\\", "/").replace("topologies/", "")).strip() or "Ungrouped"
+    path = path.replace("\\", "/").replace(".sweep.json#", "/")
+    return os.path.dirname(path.replace("topologies/", "")).strip() or "Ungrouped"
 
 
 def clean_selection(selections, full_options):
@@ -168,4 +172,62 @@ def get_system_info():
 
 def filter_files_by_keyword(files, keyword):
     keyword = keyword.strip().lower()
-    return [f for f in files if keyword in f.lower()] if keyword else files
\ No newline at end of file
+    return [f for f in files if keyword in f.lower()] if keyword else files
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """
+    Compute the sha256 hex digest of a file, reading it in chunks.
+
+    Args:
+        path: File to hash.
+        chunk_size: Number of bytes read at a time.
+
+    Returns:
+        Hex digest of the file content.
+    """
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_hash(path, cache):
+    """
+    Returns the sha256 of a file, reusing the cached value while its size and mtime are unchanged.
+
+    Entries are keyed by absolute path, so a cache shared by different working directories
+    never mixes up files with the same relative path.
+
+    Args:
+        path: File to hash.
+        cache: Dictionary with a "hashes" entry, e.g. the pre-flight cache (see src/preflight.py).
+
+    Returns:
+        Hex digest of the file content.
+    """
+
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    signature = [stat.st_size, stat.st_mtime_ns]
+    known = cache["hashes"].get(path)
+    if known and known["signature"] == signature:
+        return known["sha256"]
+
+    digest = file_sha256(path)
+    cache["hashes"][path] = {"signature": signature, "sha256": digest}
+    return digest
+
+
+def canonical_json_sha256(document):
+    """
+    Returns the sha256 of a JSON document independent of key order and formatting.
+
+    Two documents have the same canonical hash exactly when they hold the same data.
+    """
+
+    canonical = json.dumps(document, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
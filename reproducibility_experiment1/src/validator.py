@@ -1,14 +1,22 @@
 import os
 import json
+import numpy as np
 import pandas as pd
+import pyarrow.parquet as pq
+
+from src.dependencies import resolve_dependencies, dependency_problems
+from src.distribution import compare_experiment_distributions, report_distribution_results
+
+PROFILES_FILE = "verification_profiles.json"
 
 
 def validate_experiments(experiment_queue):
     """
     Checks whether topologies, workloads, and failure models exist in each experiment file.
 
-    Loops over all experiments in the queue and verifies that all referenced files exist.
-    Can be extended for more robust validation in the future.
+    Resolves the dependency graph of the queue (see src/dependencies.py) and verifies that
+    all referenced files exist, including those referenced from inside topologies.
+    See src/preflight.py for a deeper check of schemas and nested references.
 
     Args:
         experiment_queue: List of experiment metadata dicts with 'name' field.
@@ -17,53 +25,17 @@ def validate_experiments(experiment_queue):
         True if all files are valid and exist, False otherwise.
     """
 
-    for exp in experiment_queue:
-        name = exp["name"]
-        exp_path = f"experiments/{name}"
-
-        try:
-            with open(exp_path, "r") as f:
-                data = json.load(f)
-        except Exception as e:
-            print(f"Failed to read '{name}': {e}")
-            continue
+    problems = dependency_problems(resolve_dependencies(experiment_queue))
+    if problems:
+        print(f"Validation failed with {len(problems)} error(s):")
+        for problem in problems:
+            print(f"- {problem}")
+        return False
 
-        try:
-            check_files("topologies", data, name)
-            check_files("workloads", data, name)
-            check_files("failureModels", data, name)
-        except Exception as e:
-            print(f"Validation failed for '{name}': {e}")
-            return False
-    
     print(f"Validation Passed")
     return True
 
 
-def check_files(json_key, data, name):
-    """
-    Helper function that checks whether a file exists at the path specified in a given key.
-
-    Args:
-        json_key: Key in the experiment file to inspect (e.g., 'topologies').
-        data: Parsed JSON contents of the experiment file.
-        name: Name of the experiment (used for error messages).
-
-    Raises:
-        ValueError: If an entry under the key is missing 'pathToFile'.
-        FileNotFoundError: If the file path specified doesn't exist.
-    """
-
-    if json_key not in data:
-        return 
-    for entry in data[json_key]:
-        file_path = entry.get("pathToFile")
-        if not file_path:
-            raise ValueError(f"Missing 'pathToFile' in {json_key} entry of '{name}': {entry}")
-        if not os.path.exists(file_path):
-            raise FileNotFoundError(f"File not found for {json_key} in '{name}': {file_path}")
-
-
 def get_parquet_files_recursive(root_dir):
     """
     Recursively traverses a directory and collects all .parquet files.
@@ -84,40 +56,388 @@ def get_parquet_files_recursive(root_dir):
     return parquet_files
 
 
-def compare_experiment_outputs(orig_path, repr_path):
+def resolve_parquet_files(source):
+    """
+    Returns the parquet files of an output folder, or the given mapping unchanged.
+
+    Args:
+        source: Output folder, or a dictionary mapping relative paths to anything
+            pd.read_parquet accepts (paths, pyarrow buffers or file objects), e.g. the
+            reference outputs read straight from a capsule (see CapsuleReader.parquet_files).
+
+    Returns:
+        Dictionary mapping relative paths to parquet sources.
+    """
+
+    if isinstance(source, dict):
+        return source
+    return get_parquet_files_recursive(source)
+
+
+def hash_dataframe_rows(df):
+    """
+    Computes one 64-bit hash per row, vectorized across all columns.
+
+    Columns are taken in sorted name order so that two dataframes with the same
+    columns in a different order still hash identically.
+
+    Args:
+        df: Dataframe to hash.
+
+    Returns:
+        Series of uint64 row hashes aligned with the rows of df.
+    """
+
+    return pd.util.hash_pandas_object(df[sorted(df.columns)], index=False)
+
+
+def select_surplus_rows(df, hashes, surplus):
+    """
+    Selects the rows of df whose hash occurs more often than on the other side.
+
+    Args:
+        df: Dataframe the hashes were computed from.
+        hashes: Row hashes of df (see hash_dataframe_rows).
+        surplus: Series mapping row hash to how many extra copies df holds.
+
+    Returns:
+        Dataframe with exactly `surplus[h]` rows for every hash h.
+    """
+
+    positional = hashes.reset_index(drop=True)
+    candidates = positional[positional.isin(surplus.index)]
+    occurrence = candidates.groupby(candidates, sort=False).cumcount()
+    keep = occurrence < candidates.map(surplus)
+    return df.iloc[candidates[keep].index]
+
+
+def compare_dataframes_unordered(df1, df2):
+    """
+    Compares two dataframes as multisets of rows, ignoring row order.
+
+    Every row is hashed and the hash counts of both sides are compared, so no
+    sort of either dataframe is needed. Duplicate rows are counted, i.e. a row
+    appearing twice on one side and once on the other is reported once.
+
+    Args:
+        df1: Original dataframe.
+        df2: Reproduced dataframe.
+
+    Returns:
+        Tuple (match, only_in_first, only_in_second), where the last two are
+        dataframes with the rows present on only one side.
+    """
+
+    if set(df1.columns) != set(df2.columns) or not df1.dtypes.sort_index().equals(df2.dtypes.sort_index()):
+        return False, df1, df2
+
+    hashes1 = hash_dataframe_rows(df1)
+    hashes2 = hash_dataframe_rows(df2)
+
+    difference = hashes1.value_counts(sort=False).sub(hashes2.value_counts(sort=False), fill_value=0)
+    if not difference.any():
+        return True, df1.iloc[0:0], df2.iloc[0:0]
+
+    only_in_first = select_surplus_rows(df1, hashes1, difference[difference > 0])
+    only_in_second = select_surplus_rows(df2, hashes2, -difference[difference < 0])
+    return False, only_in_first, only_in_second
+
+
+def report_unmatched_rows(rel_path, only_in_orig, only_in_repr, max_rows=5):
+    """
+    Prints a short summary of the rows that are present on only one side.
+
+    Args:
+        rel_path: Relative path of the compared output file.
+        only_in_orig: Rows found only in the original output.
+        only_in_repr: Rows found only in the reproduced output.
+        max_rows: Number of example rows to print per side.
+    """
+
+    print(f"{rel_path}: {len(only_in_orig)} row(s) only in original, {len(only_in_repr)} row(s) only in reproduction")
+    if len(only_in_orig):
+        print("Only in original:")
+        print(only_in_orig.head(max_rows).to_string())
+    if len(only_in_repr):
+        print("Only in reproduction:")
+        print(only_in_repr.head(max_rows).to_string())
+
+
+def load_verification_profiles(path=PROFILES_FILE):
+    """
+    Loads the named verification profiles stored with the capsule.
+
+    A profile declares which output files to verify, which of their columns to
+    compare and the tolerance for each file, e.g.:
+
+        {
+            "carbon": {
+                "files": {
+                    "powerSource.parquet": {"columns": ["carbon_emission"], "tolerance": 1e-6},
+                    "service.parquet": {"columns": ["tasks_total"], "tolerance": 0}
+                }
+            }
+        }
+
+    Files are matched by file name, so a profile applies to every topology and seed folder.
+
+    Args:
+        path: Path to the profiles JSON file.
+
+    Returns:
+        Dictionary mapping profile names to profiles (empty if the file does not exist).
+    """
+
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_verification_profile(name, files, description=None, path=PROFILES_FILE):
+    """
+    Adds or replaces a named verification profile in the capsule's profiles file.
+
+    Args:
+        name: Profile name.
+        files: Dictionary mapping output file names to {"columns": [...], "tolerance": float}.
+            "columns" may be omitted to compare all columns, "tolerance" defaults to 0 (exact).
+        description: Optional human readable description of what the profile verifies.
+        path: Path to the profiles JSON file.
+    """
+
+    profiles = load_verification_profiles(path)
+    profile = {"files": files}
+    if description:
+        profile["description"] = description
+    profiles[name] = profile
+
+    with open(path, "w") as f:
+        json.dump(profiles, f, indent=4)
+    print(f"Saved verification profile '{name}' to {path}")
+
+
+def resolve_verification_profile(profile, path=PROFILES_FILE):
+    """
+    Returns the profile dictionary for a profile name, or the profile itself if a dictionary is given.
+
+    Raises:
+        KeyError: If the named profile does not exist.
+    """
+
+    if profile is None or isinstance(profile, dict):
+        return profile
+    profiles = load_verification_profiles(path)
+    if profile not in profiles:
+        raise KeyError(f"Unknown verification profile '{profile}' in {path}")
+    return profiles[profile]
+
+
+def compare_within_tolerance(df1, df2, tolerance):
+    """
+    Compares two dataframes column by column, allowing numeric columns to differ by tolerance.
+
+    Non-numeric columns are always compared exactly.
+
+    Returns:
+        True if shapes, columns and values match within tolerance, False otherwise.
+    """
+
+    if list(df1.columns) != list(df2.columns) or len(df1) != len(df2):
+        return False
+    if not tolerance:
+        return df1.equals(df2)
+
+    for column in df1.columns:
+        values1 = df1[column].to_numpy()
+        values2 = df2[column].to_numpy()
+        if pd.api.types.is_numeric_dtype(df1[column]) and pd.api.types.is_numeric_dtype(df2[column]):
+            if not np.allclose(values1.astype("float64"), values2.astype("float64"), rtol=0, atol=tolerance, equal_nan=True):
+                return False
+        elif not df1[column].equals(df2[column]):
+            return False
+    return True
+
+
+def sort_rows(df):
+    """
+    Rows of a dataframe sorted by all columns (in name order), with a fresh index.
+    """
+
+    columns = sorted(df.columns)
+    return df[columns].sort_values(columns, kind="mergesort").reset_index(drop=True)
+
+
+def parquet_column_names(source):
+    """
+    Column names of a parquet file, read from its footer (see resolve_parquet_files for sources).
+    """
+
+    names = pq.read_schema(source).names
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return names
+
+
+def compare_experiment_outputs(orig_path, repr_path, order_sensitive=True, profile=None, name=None):
     """
     Compares whether the experiment output files from two directories match.
 
     Checks for file presence and compares data content using Pandas.
+    If order_sensitive is False, rows are compared as multisets so outputs
+    emitted in a different order (e.g. by sharded runs) still match.
+
+    If a verification profile is given, only the files and columns it declares are
+    read from disk (column projection) and numeric columns are compared within the
+    file's tolerance. A profile file found on neither side or a profile column missing
+    from a file is a mismatch. Without row order, rows are hashed when the tolerance is 0;
+    with a tolerance both sides are sorted by all columns and compared within it.
+
+    The reason of a mismatch is printed.
 
     Args:
-        orig_path: Path to original experiment output folder.
-        repr_path: Path to reproduced experiment output folder.
+        orig_path: Path to original experiment output folder (or parquet mapping, see resolve_parquet_files).
+        repr_path: Path to reproduced experiment output folder (or parquet mapping).
+        order_sensitive: Whether rows must appear in the same order (default True).
+        profile: Optional verification profile dictionary (see load_verification_profiles).
+        name: Name of the experiment in messages (defaults to the original folder under output/).
 
     Returns:
         True if files exist and dataframes match, False otherwise.
     """
 
+    if name is None:
+        name = os.path.relpath(orig_path, "output") if isinstance(orig_path, str) else "outputs"
     try:
-        orig_files = get_parquet_files_recursive(orig_path)
-        repr_files = get_parquet_files_recursive(repr_path)
-
-        missing = set(orig_files.keys()) - set(repr_files.keys())
-        extra = set(repr_files.keys()) - set(orig_files.keys())
+        orig_files = resolve_parquet_files(orig_path)
+        repr_files = resolve_parquet_files(repr_path)
+
+        if profile is not None:
+            profile_files = profile.get("files", {})
+            found = {os.path.basename(rel) for rel in list(orig_files) + list(repr_files)}
+            absent = sorted(set(profile_files) - found)
+            if absent:
+                print(f"{name}: profile file(s) not found in the outputs: {', '.join(absent)}")
+                return False
+            orig_files = {rel: path for rel, path in orig_files.items() if os.path.basename(rel) in profile_files}
+            repr_files = {rel: path for rel, path in repr_files.items() if os.path.basename(rel) in profile_files}
+
+        missing = sorted(set(orig_files.keys()) - set(repr_files.keys()))
+        extra = sorted(set(repr_files.keys()) - set(orig_files.keys()))
+        if missing:
+            print(f"{name}: missing in reproduction: {', '.join(missing)}")
+        if extra:
+            print(f"{name}: only in reproduction: {', '.join(extra)}")
         if missing or extra:
             return False
 
-        for rel_path in orig_files:
-            df1 = pd.read_parquet(orig_files[rel_path])
-            df2 = pd.read_parquet(repr_files[rel_path])
-            if not df1.equals(df2):
-                return False
+        for rel_path in sorted(orig_files):
+            columns = None
+            tolerance = 0
+            if profile is not None:
+                file_spec = profile["files"][os.path.basename(rel_path)]
+                columns = file_spec.get("columns")
+                tolerance = file_spec.get("tolerance", 0)
+
+            if columns is not None:
+                for side, source in (("original", orig_files[rel_path]), ("reproduction", repr_files[rel_path])):
+                    absent = [column for column in columns if column not in parquet_column_names(source)]
+                    if absent:
+                        print(f"{name}/{rel_path}: profile column(s) missing in the {side}: {', '.join(absent)}")
+                        return False
+
+            df1 = pd.read_parquet(orig_files[rel_path], columns=columns)
+            df2 = pd.read_parquet(repr_files[rel_path], columns=columns)
+            if order_sensitive or tolerance:
+                if not order_sensitive:
+                    if set(df1.columns) != set(df2.columns):
+                        print(f"{name}/{rel_path}: columns differ")
+                        return False
+                    df1, df2 = sort_rows(df1), sort_rows(df2)
+                if not compare_within_tolerance(df1, df2, tolerance):
+                    within = f" beyond tolerance {tolerance:g}" if tolerance else ""
+                    print(f"{name}/{rel_path}: values differ{within}")
+                    return False
+            else:
+                match, only_in_orig, only_in_repr = compare_dataframes_unordered(df1, df2)
+                if not match:
+                    report_unmatched_rows(f"{name}/{rel_path}", only_in_orig, only_in_repr)
+                    return False
         return True
     except Exception as e:
+        print(f"Failed to compare outputs of {name}: {e}")
         return False
 
 
-def compare_all_experiments_outputs():
+def compare_output_pair(orig_path, repr_path, order_sensitive=True, profile=None, strategy="exact", threshold=0.05, confidence=0.95,
+                        name=None):
+    """
+    Compares one original/reproduced output folder pair with the given strategy.
+
+    Args:
+        orig_path: Path to original experiment output folder (or parquet mapping, see resolve_parquet_files).
+        repr_path: Path to reproduced experiment output folder (or parquet mapping).
+        order_sensitive, profile, strategy, threshold, confidence: See compare_all_experiments_outputs.
+            profile has to be a resolved profile dictionary or None.
+        name: Name of the experiment in messages (defaults to the original folder under output/).
+
+    Returns:
+        True if the outputs match under the chosen strategy, False otherwise.
+    """
+
+    if name is None:
+        name = os.path.relpath(orig_path, "output") if isinstance(orig_path, str) else "outputs"
+    if strategy != "distribution":
+        return compare_experiment_outputs(orig_path, repr_path, order_sensitive=order_sensitive, profile=profile, name=name)
+
+    try:
+        match, results = compare_experiment_distributions(
+            resolve_parquet_files(orig_path),
+            resolve_parquet_files(repr_path),
+            threshold=threshold,
+            confidence=confidence,
+            profile=profile
+        )
+    except Exception as e:
+        print(f"Failed to compare distributions for {name}: {e}")
+        return False
+
+    if not match:
+        print(f"Metrics not shown to be within {threshold:.0%} in {name}:")
+        report_distribution_results(results, confidence)
+    return match
+
+
+def compare_all_experiments_outputs(order_sensitive=True, profile=None, strategy="exact", threshold=0.05, confidence=0.95):
+    """
+    Finds all original/reproduced output pairs under output/ and compares them.
+
+    Reproduced folders are recognised by their 'repr_' prefix.
+
+    Two strategies are supported:
+    - "exact": every row has to match (see compare_experiment_outputs).
+    - "distribution": for stochastic multi-seed experiments, per-metric distributions over
+      all seeds are compared statistically (see src/distribution.py).
+
+    Args:
+        order_sensitive: Whether rows must appear in the same order (default True, exact strategy only).
+        profile: Optional verification profile name (from verification_profiles.json) or dictionary.
+        strategy: "exact" or "distribution".
+        threshold: Maximum relative drift of a metric's mean or std (distribution strategy only).
+        confidence: Confidence level of the interval that has to show the means equivalent
+            within threshold (distribution strategy only).
+    """
+
+    if strategy not in ("exact", "distribution"):
+        print(f"Unknown comparison strategy '{strategy}'")
+        return
+
+    try:
+        profile = resolve_verification_profile(profile)
+    except Exception as e:
+        print(f"Failed to load verification profile: {e}")
+        return
+
     pairs = []
 
     for parent, dirs, _ in os.walk("output"):
@@ -138,7 +458,8 @@ def compare_all_experiments_outputs():
     all_ok = True
     for orig_path, repr_path in pairs:
         rel = os.path.relpath(orig_path, "output")
-        if not compare_experiment_outputs(orig_path, repr_path):
+        if not compare_output_pair(orig_path, repr_path, order_sensitive, profile, strategy, threshold, confidence, rel):
+            print(f"Mismatch in {rel}")
             all_ok = False
 
     if all_ok:
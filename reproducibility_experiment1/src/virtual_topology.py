@@ -0,0 +1,188 @@
+import os
+import json
+
+from src.utils import list_files, canonical_json_sha256
+from src.templating import apply_patch
+from src.batch_writer import write_json_atomic
+
+# A sweep file holds one template topology and the patch of each of its variants:
+# {"template": {...}, "variants": {"<variant>": [[[key, ...], value], ...]}}.
+# Experiments reference a variant as "<path>.sweep.json#<variant>".
+SWEEP_SUFFIX = ".sweep.json"
+
+# Folders tried for the scratch copies of virtual topologies, before the system temp folder.
+SCRATCH_ROOTS = ("/dev/shm",)
+
+
+def split_reference(path):
+    """
+    Splits a topology reference into its file and variant (None for a regular topology file).
+    """
+
+    file_path, separator, variant = path.partition("#")
+    return file_path, (variant if separator else None)
+
+
+def is_sweep_file(path):
+    return path.endswith(SWEEP_SUFFIX)
+
+
+def encode_patch(patch):
+    """
+    JSON form of a patch (see src/templating.py): a list of [path, value] pairs.
+    """
+
+    return [[list(path), value] for path, value in patch.items()]
+
+
+def decode_patch(entries):
+    return {tuple(path): value for path, value in entries}
+
+
+def new_sweep(template):
+    return {"template": template, "variants": {}}
+
+
+def load_sweep(path):
+    """
+    Loads a sweep file.
+
+    Returns:
+        Sweep dictionary {"template", "variants"}.
+    """
+
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def open_sweep(path, template):
+    """
+    Sweep file to add variants of a template to.
+
+    A missing file, or one without variants, starts a new sweep. An existing sweep of the same
+    template is extended. A sweep with variants of another template is never replaced, since
+    experiments may reference its variants: the new sweep goes to <name>_<template hash>.sweep.json
+    next to it instead, with a warning.
+
+    Args:
+        path: Path of the sweep file.
+        template: Template topology of the new variants.
+
+    Returns:
+        Tuple of the path to save the sweep to and the sweep dictionary.
+    """
+
+    if not os.path.exists(path):
+        return path, new_sweep(template)
+
+    sweep = load_sweep(path)
+    if sweep.get("template") == template:
+        return path, sweep
+    if not sweep.get("variants"):
+        return path, new_sweep(template)
+
+    alternative = f"{path[:-len(SWEEP_SUFFIX)]}_{canonical_json_sha256(template)[:8]}{SWEEP_SUFFIX}"
+    print(
+        f"WARNING: {path} holds {len(sweep['variants'])} variants of another template and is kept; "
+        f"the new sweep is saved as {alternative}"
+    )
+    if os.path.exists(alternative):
+        return alternative, load_sweep(alternative)
+    return alternative, new_sweep(template)
+
+
+def save_sweep(path, sweep):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    write_json_atomic(path, sweep)
+
+
+def resolve_variant(sweep, variant):
+    """
+    The concrete topology of a variant of a sweep.
+
+    Raises:
+        KeyError: If the sweep has no such variant.
+    """
+
+    if variant not in sweep.get("variants", {}):
+        raise KeyError(f"unknown topology variant '{variant}'")
+    return apply_patch(sweep["template"], decode_patch(sweep["variants"][variant]))
+
+
+def list_topology_references(root="topologies"):
+    """
+    Topologies under a folder as they can be referenced by experiments.
+
+    Regular topology files are listed by path; sweep files are expanded into one
+    "<path>#<variant>" reference per variant.
+
+    Returns:
+        List of references relative to root.
+    """
+
+    references = []
+    for rel in list_files(root):
+        if not is_sweep_file(rel):
+            references.append(rel)
+            continue
+        try:
+            variants = load_sweep(os.path.join(root, rel)).get("variants", {})
+        except Exception as e:
+            print(f"Failed to read topology sweep {rel}: {e}")
+            continue
+        references += [f"{rel}#{variant}" for variant in variants]
+    return references
+
+
+def scratch_root():
+    """
+    Folder for short-lived topology files: a tmpfs such as /dev/shm when available,
+    otherwise None (the system temp folder).
+    """
+
+    for root in SCRATCH_ROOTS:
+        if os.path.isdir(root) and os.access(root, os.W_OK):
+            return root
+    return None
+
+
+def uses_virtual_topologies(experiment):
+    return any(split_reference(t.get("pathToFile", ""))[1] is not None for t in experiment.get("topologies", []))
+
+
+def materialize_virtual_topologies(experiment_path, scratch_dir, cwd=None):
+    """
+    Prepares an experiment that references virtual topologies for the simulator.
+
+    The concrete topology of each referenced variant is written into the scratch folder,
+    together with a copy of the experiment pointing to them. Other paths in the experiment
+    are left as they are, so they still resolve against the working directory.
+
+    Args:
+        experiment_path: Path to the experiment JSON file.
+        scratch_dir: Folder for the generated files (removed by the caller after the run).
+        cwd: Working directory the experiment's relative paths are resolved against.
+
+    Returns:
+        Path of the experiment file to run (the original if it has no virtual topologies).
+    """
+
+    with open(experiment_path, "r") as f:
+        experiment = json.load(f)
+    if not uses_virtual_topologies(experiment):
+        return experiment_path
+
+    sweeps = {}
+    for index, topology in enumerate(experiment["topologies"]):
+        file_path, variant = split_reference(topology.get("pathToFile", ""))
+        if variant is None:
+            continue
+        if file_path not in sweeps:
+            sweeps[file_path] = load_sweep(os.path.join(cwd or "", file_path))
+        target = os.path.join(scratch_dir, f"topology_{index}.json")
+        write_json_atomic(target, resolve_variant(sweeps[file_path], variant))
+        topology["pathToFile"] = os.path.abspath(target)
+
+    path = os.path.join(scratch_dir, os.path.basename(experiment_path))
+    write_json_atomic(path, experiment)
+    return path
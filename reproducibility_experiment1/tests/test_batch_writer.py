@@ -0,0 +1,40 @@
+import os
+import json
+
+import pytest
+
+from src.batch_writer import BatchWriter, write_json_atomic
+
+
+def test_write_json_atomic_keeps_the_old_file_on_failure(tmp_path):
+    path = tmp_path / "t.json"
+    write_json_atomic(str(path), {"a": 1})
+
+    with pytest.raises(TypeError):
+        write_json_atomic(str(path), {"a": object()})
+
+    assert json.loads(path.read_text()) == {"a": 1}
+    assert os.listdir(tmp_path) == ["t.json"]
+
+
+def test_batch_writer_writes_every_batch(tmp_path, capsys):
+    with BatchWriter(str(tmp_path), "topologies", batch_size=3, workers=2) as writer:
+        for index in range(7):
+            writer.add({"index": index}, f"group_{index % 2}/t{index}.json")
+
+    assert writer.written == 7 and writer.errors == []
+    for index in range(7):
+        assert json.loads((tmp_path / f"group_{index % 2}" / f"t{index}.json").read_text()) == {"index": index}
+    assert f"Wrote 7 topologies to {tmp_path}/" in capsys.readouterr().out
+
+
+def test_batch_writer_collects_errors(tmp_path):
+    writer = BatchWriter(str(tmp_path), batch_size=10)
+    writer.add({"a": 1}, "good.json")
+    writer.add({"a": object()}, "bad.json")
+
+    result = writer.close()
+
+    assert result["written"] == 1
+    assert len(result["errors"]) == 1 and result["errors"][0].startswith("Error saving bad.json")
+    assert sorted(os.listdir(tmp_path)) == ["good.json"]
@@ -0,0 +1,72 @@
+import os
+import json
+import hashlib
+import zipfile
+
+import pytest
+
+from src.exporter import MANIFEST_FILE
+from src.capsule_reader import CapsuleReader, LIB_DIR, list_capsule_experiments
+
+JAR = b"PK fake jar contents" * 100
+
+
+def write_capsule(path, files, manifest=None):
+    with zipfile.ZipFile(path, "w") as zipf:
+        for name, data in files.items():
+            compress_type = zipfile.ZIP_STORED if name.endswith((".parquet", ".jar")) else zipfile.ZIP_DEFLATED
+            zipf.writestr(name, data, compress_type)
+        if manifest is not None:
+            zipf.writestr(MANIFEST_FILE, json.dumps({"files": manifest}))
+
+
+def test_cached_jars_are_extracted_once(tmp_path, capsys):
+    capsule = tmp_path / "capsule.zip"
+    write_capsule(capsule, {f"{LIB_DIR}/opendc.jar": JAR})
+    cache = tmp_path / "jars"
+
+    with CapsuleReader(str(capsule), str(tmp_path / "scratch")) as reader:
+        jars = reader.cached_jars(str(cache))
+        again = reader.cached_jars(str(cache))
+
+    assert jars == again == [str(cache / f"{hashlib.sha256(JAR).hexdigest()}.jar")]
+    assert open(jars[0], "rb").read() == JAR
+    assert "(1 newly extracted)" in capsys.readouterr().out.splitlines()[0]
+    assert os.listdir(cache) == [os.path.basename(jars[0])]
+
+
+def test_cached_jar_with_wrong_hash_is_rejected(tmp_path):
+    capsule = tmp_path / "capsule.zip"
+    name = f"{LIB_DIR}/opendc.jar"
+    write_capsule(capsule, {name: JAR}, manifest={name: {"sha256": "0" * 64}})
+    cache = tmp_path / "jars"
+
+    with CapsuleReader(str(capsule), str(tmp_path / "scratch")) as reader:
+        with pytest.raises(ValueError, match="does not match"):
+            reader.cached_jars(str(cache))
+
+    assert os.listdir(cache) == []
+
+
+def test_read_buffer_of_stored_and_compressed_members(tmp_path):
+    capsule = tmp_path / "capsule.zip"
+    files = {"output/a/host.parquet": os.urandom(5000), "output/a/log.txt": b"line\n" * 500}
+    write_capsule(capsule, files)
+
+    with CapsuleReader(str(capsule), str(tmp_path / "scratch")) as reader:
+        for name, data in files.items():
+            assert reader.read_buffer(name).to_pybytes() == data
+        assert list(reader.parquet_files("output/a")) == ["host.parquet"]
+
+
+def test_list_capsule_experiments_skips_reproductions(tmp_path):
+    capsule = tmp_path / "capsule.zip"
+    write_capsule(capsule, {
+        "experiments/a.json": b"{}",
+        "experiments/sub/b.json": b"{}",
+        "experiments/repr_a.json": b"{}",
+        "topologies/t.json": b"{}",
+    })
+
+    with CapsuleReader(str(capsule), str(tmp_path / "scratch")) as reader:
+        assert list_capsule_experiments(reader) == ["a.json", "sub/b.json"]
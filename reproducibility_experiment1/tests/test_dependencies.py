@@ -0,0 +1,89 @@
+import os
+import json
+
+import pytest
+
+from src.dependencies import resolve_dependencies, dependency_problems, dependency_files, find_references
+
+
+def write_json(path, document):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(document, f)
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    topology = {"clusters": [{"name": "C", "powerSource": {"carbonTracePath": "carbon_traces/c.parquet"}}]}
+    write_json("topologies/t.json", topology)
+    write_json("topologies/grid.sweep.json", {
+        "template": topology,
+        "variants": {"v1": [[["clusters", 0, "powerSource", "carbonTracePath"], "carbon_traces/other.parquet"]]},
+    })
+    os.makedirs("carbon_traces")
+    open("carbon_traces/c.parquet", "wb").close()
+    os.makedirs("workload_traces/w")
+    for name in ("e1", "e2"):
+        write_json(f"experiments/{name}.json", {
+            "name": name,
+            "topologies": [{"pathToFile": "topologies/t.json"}],
+            "workloads": [{"pathToFile": "workload_traces/w", "type": "ComputeWorkload"}],
+        })
+    return tmp_path
+
+
+def empty_cache():
+    return {"hashes": {}, "documents": {}}
+
+
+def test_find_references_collects_nested_paths():
+    document = {"a": [{"pathToFile": "x.json"}, {"carbonTracePath": "c.parquet"}], "outputPath": "", "name": "n"}
+
+    assert find_references(document) == [("file", "x.json"), ("carbon", "c.parquet")]
+
+
+def test_shared_inputs_are_listed_once_and_parsed_once(project):
+    cache = empty_cache()
+
+    graph = resolve_dependencies([{"name": "e1.json"}, {"name": "e2.json"}], cache=cache)
+
+    assert graph["parsed"] == 1
+    assert graph["errors"] == [] and graph["missing"] == []
+    assert graph["files"]["topologies/t.json"]["used_by"] == ["e1.json", "e2.json"]
+    assert graph["files"]["carbon_traces/c.parquet"] == {"kind": "carbon", "used_by": ["e1.json", "e2.json"]}
+    assert graph["experiments"]["e1.json"]["carbon"] == ["carbon_traces/c.parquet"]
+    assert dependency_files(graph, {"workload"}) == ["workload_traces/w"]
+
+    # The document cache is reused across passes
+    assert resolve_dependencies([{"name": "e1.json"}], cache=cache)["parsed"] == 0
+
+
+def test_missing_files_and_unreadable_experiments_are_reported(project):
+    write_json("experiments/e3.json", {"name": "e3", "topologies": [{"pathToFile": "topologies/gone.json"}]})
+
+    graph = resolve_dependencies([{"name": "e3.json"}, {"name": "nope.json"}], cache=empty_cache())
+
+    problems = dependency_problems(graph)
+    assert graph["missing"] == ["topologies/gone.json"]
+    assert "topology file not found: topologies/gone.json (used by e3.json)" in problems
+    assert any("failed to read experiment 'nope.json'" in problem for problem in problems)
+
+
+def test_virtual_topology_references_resolve_their_variant(project):
+    write_json("experiments/e4.json", {"name": "e4", "topologies": [{"pathToFile": "topologies/grid.sweep.json#v1"}]})
+
+    graph = resolve_dependencies([{"name": "e4.json"}], cache=empty_cache())
+
+    assert graph["experiments"]["e4.json"]["topology"] == ["topologies/grid.sweep.json#v1"]
+    assert "topologies/grid.sweep.json" in graph["files"]
+    assert graph["experiments"]["e4.json"]["carbon"] == ["carbon_traces/other.parquet"]
+    assert graph["missing"] == ["carbon_traces/other.parquet"]
+
+
+def test_unknown_variant_is_an_error(project):
+    write_json("experiments/e5.json", {"name": "e5", "topologies": [{"pathToFile": "topologies/grid.sweep.json#v9"}]})
+
+    graph = resolve_dependencies([{"name": "e5.json"}], cache=empty_cache())
+
+    assert any("unknown topology variant 'v9'" in error for error in graph["errors"])
@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.distribution import (
+    group_files_by_seed, merge_moments, summarize_parquet_file, compare_metric, metric_status,
+    compare_experiment_distributions
+)
+
+
+def seed_entry(seed_means, rows=100, std=1.0):
+    count = rows * len(seed_means)
+    return {"seed_means": seed_means, "pooled": (count, float(np.mean(seed_means)), std ** 2 * (count - 1))}
+
+
+def write_seeds(root, column_values, extra_columns=None):
+    files = {}
+    for seed, values in enumerate(column_values):
+        rel = f"raw-output/0/seed={seed}/host.parquet"
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        pd.DataFrame({"power": values, **(extra_columns or {})}).to_parquet(path)
+        files[rel] = str(path)
+    return files
+
+
+def test_group_files_by_seed():
+    grouped = group_files_by_seed({
+        "raw-output/0/seed=0/host.parquet": "a",
+        "raw-output/0/seed=1/host.parquet": "b",
+        "raw-output/0/seed=1/task.parquet": "c",
+    })
+
+    assert grouped == {"raw-output/0/host.parquet": {0: "a", 1: "b"}, "raw-output/0/task.parquet": {1: "c"}}
+
+
+def test_merged_moments_match_numpy():
+    values = np.random.default_rng(0).normal(size=1000)
+    moments = (0, 0.0, 0.0)
+    for batch in np.array_split(values, 7):
+        moments = merge_moments(moments, len(batch), batch.mean(), ((batch - batch.mean()) ** 2).sum())
+
+    assert moments[0] == 1000
+    assert moments[1] == pytest.approx(values.mean())
+    assert moments[2] / 999 == pytest.approx(values.var(ddof=1))
+
+
+def test_summary_skips_missing_values(tmp_path):
+    path = tmp_path / "host.parquet"
+    pd.DataFrame({"power": [1.0, np.nan, 3.0], "host": ["a", "b", "c"]}).to_parquet(path)
+
+    summary = summarize_parquet_file(str(path), batch_size=2)
+
+    assert list(summary) == ["power"]
+    assert summary["power"][:2] == (2, 2.0)
+
+
+@pytest.mark.parametrize("orig, repr_, status", [
+    ([10, 10.1, 9.9], [10.02, 10.12, 9.92], "equivalent"),
+    ([10, 10.1, 9.9], [12, 12.1, 11.9], "drifted"),
+    # Two seeds give a wide interval: a 66% drift can neither be shown nor excluded.
+    ([100, 200], [200, 300], "inconclusive"),
+    ([10], [12], "drifted"),
+    ([10], [10], "inconclusive"),
+])
+def test_metric_status(orig, repr_, status):
+    result = compare_metric(seed_entry(orig), seed_entry(repr_), 0.95)
+
+    assert metric_status(result, 0.05) == status
+
+
+def test_rows_are_not_tested_with_a_single_seed():
+    result = compare_metric(seed_entry([10]), seed_entry([10.5]), 0.95)
+
+    assert result["test_level"] == "none"
+    assert result["p_value"] is None and result["ci_low"] is None
+
+
+def test_equivalent_outputs_match(tmp_path):
+    rng = np.random.default_rng(1)
+    seeds = [rng.normal(100, 1, 200) for _ in range(4)]
+    orig = write_seeds(tmp_path / "orig", seeds)
+    repr_ = write_seeds(tmp_path / "repr", [values + 0.01 for values in seeds])
+
+    match, results = compare_experiment_distributions(orig, repr_)
+
+    assert match
+    assert [result["status"] for result in results] == ["equivalent"]
+
+
+def test_columns_on_one_side_are_flagged(tmp_path):
+    seeds = [np.full(10, 100.0), np.full(10, 100.0)]
+    orig = write_seeds(tmp_path / "orig", seeds)
+    repr_ = write_seeds(tmp_path / "repr", seeds, {"energy": np.ones(10)})
+
+    match, results = compare_experiment_distributions(orig, repr_)
+
+    assert not match
+    assert {(result["column"], result["status"]) for result in results} == {
+        ("power", "equivalent"), ("energy", "only in reproduction")
+    }
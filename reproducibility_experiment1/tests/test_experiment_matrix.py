@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+import src.runner as runner
+from src.experiment_matrix import iter_cells, find_cell, load_experiment, expand_queue
+from src.experiment_generator import update_experiment_values
+from src.virtual_topology import encode_patch
+
+
+def make_manifest(reverse=False):
+    dimensions = {
+        "topology": {label: encode_patch({("topologies", 0, "pathToFile"): label}) for label in ("t1.json", "t2.json", "t3.json")},
+        "workload": {label: encode_patch({("workloads", 0, "pathToFile"): label}) for label in ("w1", "w2")},
+    }
+    if reverse:
+        dimensions = {dimension: dict(reversed(levels.items())) for dimension, levels in reversed(dimensions.items())}
+    return {"name": "grid", "base": {"name": "grid", "topologies": [{}], "workloads": [{}]}, "dimensions": dimensions}
+
+
+def test_cell_ids_are_stable_under_reordering():
+    cells = dict(iter_cells(make_manifest()))
+    reordered = dict(iter_cells(make_manifest(reverse=True)))
+
+    assert len(cells) == 6
+    assert cells == reordered
+
+
+def test_cell_ids_resolve_to_the_same_experiment(tmp_path):
+    paths = {}
+    for reverse in (False, True):
+        paths[reverse] = tmp_path / f"grid_{reverse}.matrix.json"
+        paths[reverse].write_text(json.dumps(make_manifest(reverse)))
+
+    for cell, labels in iter_cells(make_manifest()):
+        experiment = load_experiment(f"{paths[False]}#{cell}")
+        assert experiment == find_cell(str(paths[True]), cell)
+        assert experiment["topologies"][0]["pathToFile"] == labels["topology"]
+        assert experiment["workloads"][0]["pathToFile"] == labels["workload"]
+
+
+def test_unknown_cell_id_is_rejected(tmp_path):
+    path = tmp_path / "grid.matrix.json"
+    path.write_text(json.dumps(make_manifest()))
+
+    with pytest.raises(KeyError):
+        find_cell(str(path), "00000000-00000000")
+
+
+def test_matrix_is_queued_by_its_manifest(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    options = {
+        "topologies": ["t1.json", "t2.json"], "workloads": ["w1", "w2"], "name": "grid",
+        "seeds": [], "runs": [], "export_intervals": [], "print_frequencies": [],
+    }
+
+    queue = update_experiment_values(**options, matrix=True)
+    flat = update_experiment_values(**options)
+
+    assert isinstance(queue, list) and isinstance(flat, list)
+    assert [entry["name"] for entry in queue] == ["grid.matrix.json"]
+
+    cells = list(expand_queue(queue + flat))
+    assert len(cells) == 4 + len(flat)
+    assert cells[4:] == flat
+    for entry in cells[:4]:
+        experiment = load_experiment(f"experiments/{entry['name']}")
+        assert experiment["topologies"][0]["pathToFile"] == f"topologies/{entry['topology'][0]}"
+        assert experiment["workloads"][0]["pathToFile"] == f"workload_traces/{entry['workload'][0]}"
+
+
+def test_queued_matrix_runs_every_cell(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    runs = []
+    monkeypatch.setattr(runner, "run_experiment", runs.append)
+    queue = update_experiment_values(topologies=["t1.json", "t2.json"], workloads=["w1"], name="grid", matrix=True)
+
+    times = runner.run_all_experiments(queue)
+
+    assert queue == []
+    assert [entry["name"] for entry in times] == [path[len("experiments/"):] for path in runs]
+    assert sorted(runs) == sorted(f"experiments/grid.matrix.json#{cell}" for cell, _ in iter_cells(
+        json.loads((tmp_path / "experiments" / "grid.matrix.json").read_text())
+    ))
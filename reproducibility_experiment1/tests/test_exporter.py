@@ -0,0 +1,223 @@
+import io
+import os
+import shutil
+import zipfile
+import subprocess
+
+import pytest
+
+import src.exporter as exporter
+
+
+@pytest.fixture(autouse=True)
+def in_tmp_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+
+def make_tree(root):
+    files = {
+        "experiments/a.json": b'{"name": "a"}\n' * 200,
+        "experiments/b.json": b'{"name": "b"}\n' * 200,
+        "output/a/host.parquet": os.urandom(50_000),
+        "output/a/log.txt": b"line\n" * 5000,
+        "README.md": b"# Capsule\n",
+    }
+    for rel, data in files.items():
+        path = os.path.join(root, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+    members = [(os.path.join(root, rel), rel) for rel in sorted(files)]
+    return files, members
+
+
+class PipeWriter:
+    """
+    Non-seekable binary output, like a pipe.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def seekable(self):
+        return False
+
+
+@pytest.mark.parametrize("method", ["store", "deflate", "bzip2", "lzma"])
+def test_zip_streamed_to_non_seekable_output(tmp_path, monkeypatch, method):
+    monkeypatch.setattr(exporter, "LARGE_MEMBER_SIZE", 1024)
+    files, members = make_tree(tmp_path / "tree")
+    members.append((str(tmp_path / "tree" / "experiments" / "a.json"), "experiments/é.json"))
+    output = PipeWriter()
+
+    exporter.write_zip_parallel(members, output, policy={"*": method}, workers=2)
+
+    archive = tmp_path / "capsule.zip"
+    archive.write_bytes(b"".join(output.chunks))
+    with zipfile.ZipFile(archive) as zipf:
+        assert zipf.testzip() is None
+        for rel, data in files.items():
+            assert zipf.read(rel) == data
+        assert zipf.read("experiments/é.json") == files["experiments/a.json"]
+    if shutil.which("unzip") and method != "lzma":
+        result = subprocess.run(["unzip", "-tq", str(archive)], capture_output=True, text=True)
+        assert result.returncode == 0, result.stdout + result.stderr
+
+
+def test_zip_writer_uses_zip64_records_for_many_members():
+    output = io.BytesIO()
+    count = 0x10000 + 10
+    with exporter.ZipWriter(output) as zipf:
+        for index in range(count):
+            zinfo = zipfile.ZipInfo(f"m{index}", exporter.DETERMINISTIC_DATE_TIME)
+            zinfo.CRC = zinfo.file_size = zinfo.compress_size = 0
+            zipf.add(zinfo, b"")
+
+    with zipfile.ZipFile(io.BytesIO(output.getvalue())) as zipf:
+        names = zipf.namelist()
+    assert len(names) == count
+    assert names[-1] == f"m{count - 1}"
+
+
+@pytest.mark.parametrize("method", ["store", "deflate", "bzip2", "lzma"])
+@pytest.mark.parametrize("large_member_size", [exporter.LARGE_MEMBER_SIZE, 1024])
+def test_zip_round_trip(tmp_path, monkeypatch, method, large_member_size):
+    # A small threshold sends most members through the streaming path instead of the threads.
+    monkeypatch.setattr(exporter, "LARGE_MEMBER_SIZE", large_member_size)
+    files, members = make_tree(tmp_path / "tree")
+    archive = tmp_path / "capsule.zip"
+
+    exporter.write_archive(members, str(archive), policy={"*": method}, workers=4, progress_interval=999)
+
+    with zipfile.ZipFile(archive) as zipf:
+        assert zipf.testzip() is None
+        for rel, data in files.items():
+            assert zipf.read(rel) == data
+
+    # unzip does not support lzma members
+    if shutil.which("unzip") and method != "lzma":
+        result = subprocess.run(["unzip", "-tq", str(archive)], capture_output=True, text=True)
+        assert result.returncode == 0, result.stdout + result.stderr
+
+
+def test_pending_bytes_are_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(exporter, "MAX_PENDING_BYTES", 60_000)
+    peak = {"bytes": 0, "current": 0}
+    compress_member = exporter.compress_member
+
+    def tracking_compress_member(file_path, *args):
+        result = compress_member(file_path, *args)
+        peak["current"] += os.path.getsize(file_path)
+        peak["bytes"] = max(peak["bytes"], peak["current"])
+        return result
+
+    add = exporter.ZipWriter.add
+
+    def tracking_add(zipf, zinfo, payload):
+        peak["current"] -= zinfo.file_size
+        add(zipf, zinfo, payload)
+
+    monkeypatch.setattr(exporter, "compress_member", tracking_compress_member)
+    monkeypatch.setattr(exporter.ZipWriter, "add", tracking_add)
+    files, members = make_tree(tmp_path / "tree")
+
+    exporter.write_archive(members, str(tmp_path / "capsule.zip"), workers=8, progress_interval=999)
+
+    assert 0 < peak["bytes"] <= 60_000
+
+
+
+def read_tree(root):
+    files = {}
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            with open(path, "rb") as f:
+                files[os.path.relpath(path, root).replace(os.sep, "/")] = f.read()
+    return files
+
+
+def write_tree(root, files):
+    shutil.rmtree(root, ignore_errors=True)
+    for rel, data in files.items():
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+    return [(str(root / rel), rel) for rel in sorted(files)]
+
+
+def test_delta_merge_round_trip(tmp_path):
+    files, members = make_tree(tmp_path / "tree")
+    base = tmp_path / "base.zip"
+    exporter.write_archive(members, str(base), progress_interval=999)
+
+    # Change one file, remove one and add one, then export only the difference.
+    changed = dict(files)
+    changed["README.md"] = b"# Capsule v2\n"
+    del changed["experiments/b.json"]
+    changed["output/b/log.txt"] = b"new\n" * 100
+    members = write_tree(tmp_path / "tree", changed)
+    delta = tmp_path / "delta.zip"
+    exporter.write_archive(members, str(delta), base_capsule=str(base), progress_interval=999)
+
+    manifest, _ = exporter.read_capsule_manifest(str(delta))
+    assert manifest["delta"]["removed"] == ["experiments/b.json"]
+    with zipfile.ZipFile(delta) as zipf:
+        assert sorted(set(zipf.namelist()) - set(exporter.METADATA_FILES)) == ["README.md", "output/b/log.txt"]
+
+    merged = tmp_path / "merged.zip"
+    exporter.merge_delta_capsule(str(base), str(delta), str(merged))
+    exporter.extract_capsule(str(merged), str(tmp_path / "merged"))
+    assert read_tree(tmp_path / "merged") == changed
+
+
+def test_export_cache_leaves_out_scratch_folders(tmp_path):
+    _, members = make_tree(tmp_path / "tree")
+    cache = {"hashes": {}}
+
+    exporter.write_archive(members, str(tmp_path / "capsule.zip"), cache=cache,
+                           uncached_dirs=[str(tmp_path / "tree" / "output")], progress_interval=999)
+
+    assert sorted(cache["hashes"]) == sorted(
+        os.path.abspath(path) for path, arcname in members if not arcname.startswith("output/")
+    )
+
+
+def test_deduplicated_capsule_restores_duplicates(tmp_path):
+    files, members = make_tree(tmp_path / "tree")
+    files["output/a/copy.parquet"] = files["output/a/host.parquet"]
+    members = write_tree(tmp_path / "tree", files)
+    capsule = tmp_path / "capsule.zip"
+
+    exporter.write_archive(members, str(capsule), deduplicate=True, progress_interval=999)
+
+    with zipfile.ZipFile(capsule) as zipf:
+        blobs = [name for name in zipf.namelist() if name.startswith(f"{exporter.BLOB_DIR}/")]
+    assert len(blobs) == len(files) - 1
+    exporter.extract_capsule(str(capsule), str(tmp_path / "restored"))
+    assert read_tree(tmp_path / "restored") == files
+
+
+@pytest.mark.parametrize("archive_format", ["zip", "tar.zst"])
+def test_deterministic_archives_are_byte_identical(tmp_path, archive_format):
+    if archive_format == "tar.zst":
+        pytest.importorskip("zstandard")
+    _, members = make_tree(tmp_path / "tree")
+    first = tmp_path / f"first.{archive_format}"
+    second = tmp_path / f"second.{archive_format}"
+
+    exporter.write_archive(members, str(first), archive_format, deterministic=True, progress_interval=999)
+    # Other timestamps and member order must not change the archive.
+    for file_path, _ in members:
+        os.utime(file_path, (1_000_000_000, 1_000_000_000))
+    exporter.write_archive(list(reversed(members)), str(second), archive_format, deterministic=True,
+                           progress_interval=999)
+
+    assert first.read_bytes() == second.read_bytes()
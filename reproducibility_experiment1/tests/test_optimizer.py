@@ -0,0 +1,61 @@
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.sweep import sweep_space
+from src.optimizer import (
+    read_objective, encode_parameters, encode_point, expected_improvement, fit_gaussian_process, predict,
+    optimize_parameters,
+)
+
+
+def test_read_objective_averages_the_seeds(tmp_path):
+    for seed, values in ((0, [1.0, 2.0]), (1, [3.0, 4.0])):
+        folder = tmp_path / "raw-output" / "0" / f"seed={seed}"
+        folder.mkdir(parents=True)
+        pq.write_table(pa.table({"carbon_emission": values}), folder / "powerSource.parquet")
+
+    assert read_objective(str(tmp_path)) == 5.0
+    assert read_objective(str(tmp_path / "missing")) is None
+
+
+def test_encode_point_scales_numbers_and_one_hot_encodes_categories():
+    encoding = encode_parameters(sweep_space({"cores": [8, 16, 32], "carbon": ["nl.parquet", "de.parquet"]}))
+
+    assert encode_point(encoding, (1, 1)) == [8 / 24, 0.0, 1.0]
+
+
+def test_expected_improvement_prefers_low_mean_and_high_uncertainty():
+    mean = np.array([5.0, 4.0, 5.0])
+    std = np.array([0.1, 0.1, 1.0])
+
+    ei = expected_improvement(mean, std, best=5.0, xi=0.0)
+
+    assert ei[1] > ei[0] and ei[2] > ei[0]
+    assert (ei >= 0).all()
+
+
+def test_gaussian_process_interpolates_observations():
+    X = np.array([[0.0], [0.5], [1.0]])
+    y = np.array([1.0, 3.0, 2.0])
+
+    mean, std = predict(fit_gaussian_process(X, y), X)
+
+    assert np.allclose(mean, y, atol=0.05)
+    assert (std < 0.1).all()
+
+
+def test_optimize_parameters_finds_the_minimum_within_budget():
+    calls = []
+
+    def evaluate(configuration):
+        calls.append(configuration)
+        if configuration["x"] == 0:
+            return None
+        return (configuration["x"] - 7) ** 2 + (configuration["y"] - 2) ** 2
+
+    result = optimize_parameters({"x": list(range(10)), "y": list(range(5))}, evaluate, budget=20, seed=1)
+
+    assert len(calls) == len(result["history"]) == 20
+    assert len({tuple(c.values()) for c in calls}) == 20
+    assert result["best"] == {"x": 7, "y": 2} and result["objective"] == 0
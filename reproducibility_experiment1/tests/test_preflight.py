@@ -0,0 +1,97 @@
+import os
+import json
+
+import pandas as pd
+import pytest
+
+import src.preflight as preflight
+from src.utils import file_hash
+
+DAY_MS = 24 * 3600 * 1000
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("experiments")
+    os.makedirs("topologies")
+    os.makedirs("workload_traces/w")
+    os.makedirs("carbon_traces")
+
+    host = {"name": "H", "cpu": {"coreCount": 16, "coreSpeed": 2100}, "memory": {"memorySize": 100000}}
+    topology = {"clusters": [{"name": "C", "hosts": [host], "powerSource": {"carbonTracePath": "carbon_traces/c.parquet"}}]}
+    with open("topologies/t.json", "w") as f:
+        json.dump(topology, f)
+    pd.DataFrame({
+        "id": [1, 2], "submission_time": [0, DAY_MS], "duration": [1000, 1000],
+        "cpu_count": [1, 1], "cpu_capacity": [1000.0, 1000.0], "mem_capacity": [100, 100],
+    }).to_parquet("workload_traces/w/tasks.parquet")
+    write_carbon(0)
+
+    experiment = {
+        "name": "e",
+        "topologies": [{"pathToFile": "topologies/t.json"}],
+        "workloads": [{"pathToFile": "workload_traces/w", "type": "ComputeWorkload"}],
+    }
+    with open("experiments/e.json", "w") as f:
+        json.dump(experiment, f)
+    return [{"name": "e.json"}]
+
+
+def write_carbon(start):
+    pd.DataFrame({"timestamp": [start, start + DAY_MS], "carbon_intensity": [100.0, 120.0]}).to_parquet("carbon_traces/c.parquet")
+
+
+def test_cache_file_is_anchored_to_the_project():
+    assert os.path.isabs(preflight.CACHE_FILE)
+    assert os.path.dirname(preflight.CACHE_FILE) == os.path.dirname(os.path.dirname(os.path.abspath(preflight.__file__)))
+
+
+def test_valid_inputs_pass_and_are_cached(project, tmp_path):
+    cache_path = str(tmp_path / "cache.json")
+
+    assert preflight.preflight_validate(project, cache_path=cache_path)
+
+    cache = preflight.load_cache(cache_path)
+    assert os.path.abspath("topologies/t.json") in cache["hashes"]
+    assert any(key.startswith("tasks:") for key in cache["results"])
+
+
+def test_missing_required_columns_fail(project, capsys):
+    pd.DataFrame({"id": [1], "submission_time": [0]}).to_parquet("workload_traces/w/tasks.parquet")
+
+    assert not preflight.preflight_validate(project, cache_path=None)
+    assert "missing required column(s)" in capsys.readouterr().out
+
+
+def test_carbon_trace_must_overlap_the_workload(project, capsys):
+    write_carbon(100 * DAY_MS)
+
+    assert not preflight.preflight_validate(project, cache_path=None)
+    assert "does not overlap" in capsys.readouterr().out
+
+
+def test_hashes_are_shared_across_working_directories(project, tmp_path, monkeypatch):
+    cache = {"hashes": {}}
+    file_hash("topologies/t.json", cache)
+    monkeypatch.chdir(tmp_path / "topologies")
+    file_hash("t.json", cache)
+
+    assert list(cache["hashes"]) == [str(tmp_path / "topologies" / "t.json")]
+
+
+def test_saving_drops_entries_of_deleted_files(tmp_path):
+    kept, deleted = tmp_path / "kept.json", tmp_path / "deleted.json"
+    kept.write_text("{}")
+    deleted.write_text("[]")
+    cache = preflight.load_cache(None)
+    digest = file_hash(str(kept), cache)
+    file_hash(str(deleted), cache)
+    cache["results"] = {f"topology:{digest}": {"errors": []}, "topology:gone": {"errors": []}}
+    deleted.unlink()
+
+    preflight.save_cache(cache, str(tmp_path / "cache.json"))
+
+    saved = preflight.load_cache(str(tmp_path / "cache.json"))
+    assert list(saved["hashes"]) == [str(kept)]
+    assert list(saved["results"]) == [f"topology:{digest}"]
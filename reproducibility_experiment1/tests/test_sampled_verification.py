@@ -0,0 +1,105 @@
+import os
+import json
+import shutil
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+import src.sampled_verification as sampled_verification
+from src.sampled_verification import (
+    group_strata, select_verification_sample, capsule_confidence_bound, stratified_confidence_bound,
+    run_sampled_verification,
+)
+
+# Topology group and workload of each experiment: strata a/w1 (4), b/w1 (2) and a/w2 (1).
+EXPERIMENTS = {
+    "e0": ("a", "w1"), "e1": ("a", "w1"), "e2": ("a", "w1"), "e3": ("a", "w1"),
+    "e4": ("b", "w1"), "e5": ("b", "w1"),
+    "e6": ("a", "w2"),
+}
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("experiments")
+    for name, (group, workload) in EXPERIMENTS.items():
+        with open(f"experiments/{name}.json", "w") as f:
+            json.dump({
+                "name": name,
+                "topologies": [{"pathToFile": f"topologies/{group}/t.json"}],
+                "workloads": [{"pathToFile": f"workload_traces/{workload}"}],
+            }, f)
+        os.makedirs(f"output/{name}")
+        pq.write_table(pa.table({"value": [1, 2, 3]}), f"output/{name}/host.parquet")
+    return tmp_path
+
+
+def test_capsule_confidence_bound():
+    # P(no failure among 5 of 10 | d failing) is 0.083 for d=3 and 0.024 for d=4
+    assert capsule_confidence_bound(10, 5, 0, 0.95) == 3
+    assert capsule_confidence_bound(10, 10, 2, 0.95) == 2
+
+
+def test_stratified_bound_combines_the_strata():
+    # One sampled stratum keeps the confidence level; unsampled strata count in full
+    assert stratified_confidence_bound([(10, 5, 0), (4, 0, 0)], 0.95) == (7, [3, 4])
+    # Two sampled strata are bounded at 97.5% each
+    assert stratified_confidence_bound([(10, 5, 0), (10, 5, 0)], 0.95) == (6, [3, 3])
+
+
+def test_sample_covers_every_level_within_the_budget(project):
+    experiments = [f"{name}.json" for name in EXPERIMENTS]
+
+    selected = select_verification_sample(experiments, budget=3, seed=1)
+
+    strata = {EXPERIMENTS[rel[:-5]] for rel in selected}
+    assert len(selected) == 3
+    assert {group for group, _ in strata} == {"a", "b"} and {workload for _, workload in strata} == {"w1", "w2"}
+    assert select_verification_sample(experiments, budget=3, seed=1) == selected
+
+
+def test_sample_within_a_stratum_is_random(project):
+    experiments = [f"{name}.json" for name in EXPERIMENTS]
+    strata = group_strata(experiments)
+
+    picked = set()
+    for seed in range(40):
+        selected = select_verification_sample(experiments, budget=3, seed=seed, strata=strata)
+        picked |= {rel for rel in selected if EXPERIMENTS[rel[:-5]] == ("a", "w1")}
+
+    assert picked == {"e0.json", "e1.json", "e2.json", "e3.json"}
+
+
+def test_time_budget_is_respected(project):
+    experiments = [f"{name}.json" for name in EXPERIMENTS]
+    durations = {f"{name}.json": 10.0 for name in EXPERIMENTS}
+
+    assert len(select_verification_sample(experiments, time_budget=25, durations=durations)) == 2
+
+
+def test_run_sampled_verification(project, monkeypatch):
+    def run_all_experiments(queue):
+        for entry in queue:
+            name = entry["name"][:-len(".json")]
+            os.makedirs(f"output/{name}", exist_ok=True)
+            shutil.copy(f"output/{name[len('repr_'):]}/host.parquet", f"output/{name}/host.parquet")
+            if name == "repr_e6":
+                pq.write_table(pa.table({"value": [1, 2, 4]}), f"output/{name}/host.parquet")
+        queue.clear()
+
+    monkeypatch.setattr(sampled_verification, "run_all_experiments", run_all_experiments)
+    # Left over from an earlier verification; must not count as an extra output file
+    for name in EXPERIMENTS:
+        os.makedirs(f"output/repr_{name}")
+        pq.write_table(pa.table({"value": [0]}), f"output/repr_{name}/stale.parquet")
+
+    result = run_sampled_verification(budget=None, readme_path="missing.md")
+
+    assert sorted(result["selected"]) == sorted(f"{name}.json" for name in EXPERIMENTS)
+    assert result["failed"] == ["e6.json"]
+    assert result["upper_bound"] == 1
+    assert sorted((entry["total"], entry["sampled"], entry["failed"]) for entry in result["strata"]) == [
+        (1, 1, 1), (2, 2, 0), (4, 4, 0),
+    ]
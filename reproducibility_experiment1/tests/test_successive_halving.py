@@ -0,0 +1,88 @@
+import os
+import json
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from src.runner import clear_experiment_outputs
+from src.successive_halving import truncate_workload, successive_halving, HOUR_MS
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_trace(tmp_path / "workload_traces" / "w", hours=[0, 1, 2, 5, 10])
+    return tmp_path
+
+
+def write_trace(folder, hours):
+    folder.mkdir(parents=True, exist_ok=True)
+    ids = list(range(len(hours)))
+    pq.write_table(pa.table({
+        "id": ids,
+        "submission_time": [hour * HOUR_MS for hour in hours],
+        "duration": [HOUR_MS] * len(hours),
+    }), folder / "tasks.parquet")
+    pq.write_table(pa.table({"id": ids + ids, "duration": [1] * (2 * len(ids))}), folder / "fragments.parquet")
+
+
+def read_ids(folder, file_name):
+    return sorted(pq.read_table(os.path.join(folder, file_name)).column("id").to_pylist())
+
+
+def test_truncated_workload_keeps_the_first_hours(project):
+    reference = truncate_workload("w", 3)
+
+    folder = os.path.normpath(os.path.join("workload_traces", reference))
+    assert folder.startswith(os.path.join(".cache", "workloads", "w_first3h_"))
+    assert read_ids(folder, "tasks.parquet") == [0, 1, 2]
+    assert read_ids(folder, "fragments.parquet") == [0, 0, 1, 1, 2, 2]
+    assert os.listdir(os.path.join(".cache", "workloads")) == [os.path.basename(folder)]
+
+
+def test_truncated_workload_is_reused_until_the_trace_changes(project, capsys):
+    first = truncate_workload("w", 3)
+    assert truncate_workload("w", 3) == first
+    assert capsys.readouterr().out.count("Derived workload") == 1
+
+    write_trace(project / "workload_traces" / "w", hours=[0, 0.5, 2.5, 5, 10])
+    changed = truncate_workload("w", 3)
+
+    assert changed != first
+    assert read_ids(os.path.join("workload_traces", changed), "tasks.parquet") == [0, 1, 2]
+    assert truncate_workload("w", 4) not in (first, changed)
+
+
+def test_full_window_uses_the_original_workload(project):
+    assert truncate_workload("w", None) == "w"
+    assert truncate_workload("w", 100) == "w"
+    assert not os.path.exists(".cache")
+
+
+def test_successive_halving_promotes_the_best_candidates():
+    scores = {"a": 5, "b": 1, "c": 3, "d": None, "e": 4, "f": 2}
+    calls = []
+
+    def evaluate(candidates, window):
+        calls.append((window, list(candidates)))
+        return [scores[candidate] if window != 24 else -scores[candidate] for candidate in candidates]
+
+    result = successive_halving(list(scores), evaluate, windows=(2, 8, 24), keep=1 / 2)
+
+    assert calls == [(2, ["a", "b", "c", "d", "e", "f"]), (8, ["b", "f", "c"]), (24, ["b", "f"])]
+    assert result["ranking"] == [("f", -2), ("b", -1)]
+    assert len(result["rounds"]) == 3
+
+
+def test_clear_experiment_outputs(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("experiments")
+    with open("experiments/e.json", "w") as f:
+        json.dump({"name": "e", "outputFolder": "output"}, f)
+    os.makedirs("output/e/raw-output")
+    os.makedirs("output/other")
+
+    clear_experiment_outputs([{"name": "e.json"}])
+
+    assert os.listdir("output") == ["other"]
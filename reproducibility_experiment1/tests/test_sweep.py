@@ -0,0 +1,123 @@
+import pytest
+
+from src.utils import canonical_json_sha256
+from src.sweep import (
+    sweep_space, count_combinations, combination_at, iter_combinations, materialize_sweep, new_registry,
+    register_document, sample_points, SAMPLING_MODES,
+)
+
+
+def test_combination_at_matches_enumeration_order():
+    space = sweep_space({"cores": [8, 16, 8, None], "memory": [64, 128], "empty": [], "trace": ["a", "b", "c"]})
+
+    combinations = list(iter_combinations(space))
+
+    assert space["parameters"] == {"cores": [8, 16], "memory": [64, 128], "trace": ["a", "b", "c"]}
+    assert count_combinations(space) == len(combinations) == 12
+    assert combinations[1] == {"cores": 8, "memory": 64, "trace": "b"}
+    assert [combination_at(space, index) for index in range(12)] == combinations
+
+
+def test_zip_mode_pads_shorter_lists():
+    space = sweep_space({"cores": [8, 16, 32], "memory": [64]}, mode="zip")
+
+    assert count_combinations(space) == 3
+    assert list(iter_combinations(space)) == [
+        {"cores": 8, "memory": 64},
+        {"cores": 16, "memory": None},
+        {"cores": 32, "memory": None},
+    ]
+    assert combination_at(space, 2) == {"cores": 32, "memory": None}
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError, match="Unknown sweep mode"):
+        sweep_space({"cores": [8]}, mode="grid")
+
+
+def build(combination):
+    return f"{combination['cores']}_{combination['memory']}.json", {"cores": combination["cores"]}
+
+
+def test_materialize_sweep_resumes_in_chunks():
+    space = sweep_space({"cores": [8, 16, 32], "memory": [64, 128]})
+    saved = []
+
+    first = materialize_sweep(space, build, lambda document, path: saved.append(path), limit=4, chunk_size=3)
+    second = materialize_sweep(space, build, lambda document, path: saved.append(path), start=first["next"])
+
+    assert first["next"] == 4 and second["next"] is None
+    assert first["written"] + second["written"] == 6
+    assert saved == [path for path, _ in map(build, iter_combinations(space))]
+
+
+def test_identical_documents_are_saved_once():
+    space = sweep_space({"cores": [8, 16], "memory": [64, 128]})
+    saved = {}
+
+    result = materialize_sweep(space, build, lambda document, path: saved.setdefault(path, document), deduplicate=True)
+
+    assert result["written"] == 2 and result["duplicates"] == 2
+    assert result["files"] == ["8_64.json", "8_64.json", "16_64.json", "16_64.json"]
+    assert sorted(saved) == ["16_64.json", "8_64.json"]
+
+
+def test_path_collisions_get_a_hash_suffix():
+    registry = new_registry()
+
+    assert register_document(registry, "t.json", {"a": 1}) == ("t.json", "new")
+    assert register_document(registry, "other.json", {"a": 1}) == ("t.json", "duplicate")
+    path, status = register_document(registry, "t.json", {"a": 2})
+
+    assert status == "collision"
+    assert path == f"t_{canonical_json_sha256({'a': 2})[:8]}.json"
+
+
+def test_files_stored_before_the_sweep_are_kept():
+    stored = {"8_64.json": {"cores": 8}, "16_64.json": {"cores": 99}}
+    saved = []
+
+    result = materialize_sweep(
+        sweep_space({"cores": [8, 16], "memory": [64]}), build,
+        lambda document, path: saved.append(path), deduplicate=True, load_existing=stored.get,
+    )
+
+    renamed = f"16_64_{canonical_json_sha256({'cores': 16})[:8]}.json"
+    assert result["existing"] == 1
+    assert result["collisions"] == [("16_64.json", renamed)]
+    assert saved == [renamed]
+
+
+@pytest.mark.parametrize("mode", SAMPLING_MODES)
+def test_samplers_return_distinct_combinations(mode):
+    points = sample_points(mode, [4, 3, 5], 20, seed=1)
+
+    assert len(points) == len(set(points)) == 20
+    assert all(0 <= a < 4 and 0 <= b < 3 and 0 <= c < 5 for a, b, c in points)
+    assert sample_points(mode, [4, 3, 5], 20, seed=1) == points
+
+
+@pytest.mark.parametrize("mode", SAMPLING_MODES)
+def test_samplers_cover_small_spaces(mode):
+    assert sorted(sample_points(mode, [2, 3], 10)) == [(a, b) for a in range(2) for b in range(3)]
+
+
+def test_latin_hypercube_uses_every_level():
+    points = sample_points("lhs", [4, 4], 4, seed=3)
+
+    assert sorted(a for a, _ in points) == sorted(b for _, b in points) == [0, 1, 2, 3]
+
+
+def test_sampled_space_enumerates_its_points():
+    space = sweep_space({"cores": [8, 16, 32], "memory": [64, 128]}, mode="sobol", samples=4, seed=0)
+
+    combinations = list(iter_combinations(space))
+
+    assert count_combinations(space) == len(combinations) == 4
+    assert len({tuple(c.values()) for c in combinations}) == 4
+    assert combinations[2] == combination_at(space, 2)
+
+
+def test_sampling_needs_a_number_of_samples():
+    with pytest.raises(ValueError, match="needs a number of samples"):
+        sweep_space({"cores": [8, 16]}, mode="lhs")
@@ -0,0 +1,58 @@
+import copy
+
+from src.templating import set_value, apply_patch
+
+
+def template():
+    return {
+        "clusters": [
+            {"name": "A", "hosts": [{"cpu": {"coreCount": 8}, "memory": {"memorySize": 64}}]},
+            {"name": "B", "hosts": [{"cpu": {"coreCount": 16}}]},
+        ],
+        "meta": {"owner": "x"},
+    }
+
+
+def test_apply_patch_leaves_the_template_unchanged():
+    base = template()
+    original = copy.deepcopy(base)
+    patch = {}
+    set_value(patch, ("clusters", 0, "hosts", 0, "cpu", "coreCount"), 32)
+    set_value(patch, ("clusters", 1, "powerSource"), {"carbonTracePath": "c.parquet"})
+
+    variant = apply_patch(base, patch)
+
+    assert base == original
+    assert variant["clusters"][0]["hosts"][0]["cpu"]["coreCount"] == 32
+    assert variant["clusters"][1]["powerSource"] == {"carbonTracePath": "c.parquet"}
+    assert variant["clusters"][0]["hosts"][0]["memory"] == {"memorySize": 64}
+
+
+def test_apply_patch_copies_only_the_patched_paths():
+    base = template()
+    patch = {("clusters", 0, "hosts", 0, "cpu", "coreCount"): 32}
+
+    variant = apply_patch(base, patch)
+
+    assert variant["clusters"][0] is not base["clusters"][0]
+    assert variant["clusters"][0]["hosts"][0]["cpu"] is not base["clusters"][0]["hosts"][0]["cpu"]
+    assert variant["clusters"][1] is base["clusters"][1]
+    assert variant["clusters"][0]["hosts"][0]["memory"] is base["clusters"][0]["hosts"][0]["memory"]
+    assert variant["meta"] is base["meta"]
+
+
+def test_overrides_apply_in_order_and_create_missing_keys():
+    patch = {}
+    set_value(patch, ("clusters", 0, "battery"), {"capacity": 10})
+    set_value(patch, ("clusters", 0, "battery", "capacity"), 20)
+    set_value(patch, ("clusters", 0, "battery", "startingCI"), 100)
+
+    variant = apply_patch(template(), patch)
+
+    assert variant["clusters"][0]["battery"] == {"capacity": 20, "startingCI": 100}
+
+
+def test_empty_patch_returns_the_template():
+    base = template()
+
+    assert apply_patch(base, {}) is base
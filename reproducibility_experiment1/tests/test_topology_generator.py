@@ -0,0 +1,35 @@
+import copy
+
+from src.topology_generator import normalize_topology
+
+
+def make_topology():
+    host = {"cpu": {"coreCount": 16, "coreSpeed": 2100}, "memory": {"memorySize": 100000}}
+    return {
+        "clusters": [
+            {"name": "C0", "hosts": [dict(host, name="H0", count=2), dict(host, name="H1"), dict(host, name="H2", count=3)]},
+            {"name": "C1", "hosts": [dict(host, name="H3")]},
+        ]
+    }
+
+
+def test_normalize_topology_does_not_modify_its_input():
+    topology = make_topology()
+    original = copy.deepcopy(topology)
+
+    normalize_topology(topology)
+    normalize_topology(topology, merge_clusters=True)
+
+    assert topology == original
+
+
+def test_normalize_topology_collapses_identical_hosts():
+    normalized, report = normalize_topology(make_topology())
+
+    assert [[host.get("count", 1) for host in cluster["hosts"]] for cluster in normalized["clusters"]] == [[6], [1]]
+    assert report["host_entries"] == [4, 2]
+    assert report["hosts"] == 7
+
+    merged, report = normalize_topology(make_topology(), merge_clusters=True)
+    assert [[host.get("count", 1) for host in cluster["hosts"]] for cluster in merged["clusters"]] == [[7]]
+    assert report["clusters"] == [2, 1]
@@ -0,0 +1,84 @@
+import pandas as pd
+import pytest
+
+from src.validator import compare_dataframes_unordered, compare_experiment_outputs, compare_output_pair
+
+
+def test_unordered_comparison_ignores_row_and_column_order():
+    df1 = pd.DataFrame({"host": ["a", "b", "c"], "power": [1.0, 2.0, 3.0]})
+    df2 = df1.iloc[[2, 0, 1]][["power", "host"]].reset_index(drop=True)
+
+    match, only_in_first, only_in_second = compare_dataframes_unordered(df1, df2)
+
+    assert match
+    assert only_in_first.empty and only_in_second.empty
+
+
+def test_unordered_comparison_counts_duplicate_rows():
+    df1 = pd.DataFrame({"host": ["a", "a", "b"], "power": [1.0, 1.0, 2.0]})
+    df2 = pd.DataFrame({"host": ["b", "a", "c"], "power": [2.0, 1.0, 3.0]})
+
+    match, only_in_first, only_in_second = compare_dataframes_unordered(df1, df2)
+
+    assert not match
+    assert only_in_first.to_dict("records") == [{"host": "a", "power": 1.0}]
+    assert only_in_second.to_dict("records") == [{"host": "c", "power": 3.0}]
+
+
+def test_unordered_comparison_rejects_different_dtypes():
+    df1 = pd.DataFrame({"power": [1, 2]})
+    df2 = pd.DataFrame({"power": [1.0, 2.0]})
+
+    assert not compare_dataframes_unordered(df1, df2)[0]
+
+
+def write_outputs(root, tables):
+    for rel, df in tables.items():
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        df.to_parquet(path)
+    return str(root)
+
+
+def test_missing_profile_file_is_reported(tmp_path, capsys):
+    df = pd.DataFrame({"carbon_emission": [1.0, 2.0]})
+    orig = write_outputs(tmp_path / "orig", {"seed=0/powerSource.parquet": df})
+    repr_ = write_outputs(tmp_path / "repr", {"seed=0/powerSource.parquet": df})
+    profile = {"files": {"battery.parquet": {"columns": ["charge"]}}}
+
+    assert not compare_experiment_outputs(orig, repr_, profile=profile, name="exp")
+    assert "battery.parquet" in capsys.readouterr().out
+
+
+def test_missing_profile_column_is_reported(tmp_path, capsys):
+    df = pd.DataFrame({"carbon_emission": [1.0, 2.0]})
+    orig = write_outputs(tmp_path / "orig", {"powerSource.parquet": df})
+    repr_ = write_outputs(tmp_path / "repr", {"powerSource.parquet": df})
+    profile = {"files": {"powerSource.parquet": {"columns": ["carbon_emission", "energy_usage"]}}}
+
+    assert not compare_experiment_outputs(orig, repr_, profile=profile, name="exp")
+    assert "energy_usage" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("order_sensitive", [True, False])
+def test_tolerance_applies_with_and_without_row_order(tmp_path, order_sensitive):
+    df1 = pd.DataFrame({"host": ["a", "b", "c"], "power": [1.0, 2.0, 3.0]})
+    df2 = pd.DataFrame({"host": ["a", "b", "c"], "power": [1.0 + 1e-7, 2.0, 3.0 - 1e-7]})
+    if not order_sensitive:
+        df2 = df2.iloc[[2, 0, 1]]
+    orig = write_outputs(tmp_path / "orig", {"host.parquet": df1})
+    repr_ = write_outputs(tmp_path / "repr", {"host.parquet": df2})
+
+    loose = {"files": {"host.parquet": {"tolerance": 1e-6}}}
+    strict = {"files": {"host.parquet": {"tolerance": 1e-9}}}
+    assert compare_experiment_outputs(orig, repr_, order_sensitive, loose)
+    assert not compare_experiment_outputs(orig, repr_, order_sensitive, strict)
+
+
+def test_mappings_are_named_explicitly(tmp_path, capsys):
+    orig = {"host.parquet": str(tmp_path / "a.parquet")}
+    repr_ = {}
+    pd.DataFrame({"power": [1.0]}).to_parquet(orig["host.parquet"])
+
+    assert not compare_output_pair(orig, repr_, name="experiments/a.json")
+    assert "experiments/a.json: missing in reproduction: host.parquet" in capsys.readouterr().out
@@ -0,0 +1,93 @@
+import os
+import json
+
+import pytest
+
+from src.utils import canonical_json_sha256
+from src.virtual_topology import (
+    split_reference, encode_patch, decode_patch, new_sweep, open_sweep, save_sweep, resolve_variant,
+    list_topology_references, materialize_virtual_topologies,
+)
+
+TEMPLATE = {"clusters": [{"name": "C", "hosts": [{"cpu": {"coreCount": 8}}]}]}
+PATCH = {("clusters", 0, "hosts", 0, "cpu", "coreCount"): 32}
+
+
+def sweep_with_variant():
+    sweep = new_sweep(TEMPLATE)
+    sweep["variants"]["v32"] = encode_patch(PATCH)
+    return sweep
+
+
+def test_split_reference():
+    assert split_reference("topologies/s.sweep.json#v1") == ("topologies/s.sweep.json", "v1")
+    assert split_reference("topologies/t.json") == ("topologies/t.json", None)
+
+
+def test_patches_survive_a_json_round_trip():
+    assert decode_patch(json.loads(json.dumps(encode_patch(PATCH)))) == PATCH
+
+
+def test_resolve_variant():
+    sweep = sweep_with_variant()
+
+    assert resolve_variant(sweep, "v32")["clusters"][0]["hosts"][0]["cpu"]["coreCount"] == 32
+    with pytest.raises(KeyError, match="unknown topology variant"):
+        resolve_variant(sweep, "v64")
+
+
+def test_open_sweep_extends_a_sweep_of_the_same_template(tmp_path):
+    path = str(tmp_path / "s.sweep.json")
+    save_sweep(path, sweep_with_variant())
+
+    assert open_sweep(path, TEMPLATE) == (path, sweep_with_variant())
+
+
+def test_open_sweep_keeps_a_sweep_of_another_template(tmp_path, capsys):
+    path = str(tmp_path / "s.sweep.json")
+    save_sweep(path, sweep_with_variant())
+    other = {"clusters": []}
+
+    target, sweep = open_sweep(path, other)
+
+    assert target == str(tmp_path / f"s_{canonical_json_sha256(other)[:8]}.sweep.json")
+    assert sweep == new_sweep(other)
+    assert "WARNING" in capsys.readouterr().out
+
+
+def test_list_topology_references_expands_sweeps(tmp_path):
+    root = tmp_path / "topologies"
+    save_sweep(str(root / "grid.sweep.json"), sweep_with_variant())
+    (root / "t.json").write_text(json.dumps(TEMPLATE))
+
+    assert sorted(list_topology_references(str(root))) == ["grid.sweep.json#v32", "t.json"]
+
+
+def test_materialize_virtual_topologies(tmp_path):
+    save_sweep(str(tmp_path / "topologies" / "grid.sweep.json"), sweep_with_variant())
+    experiment = {
+        "name": "e",
+        "topologies": [{"pathToFile": "topologies/grid.sweep.json#v32"}],
+        "workloads": [{"pathToFile": "workload_traces/w"}],
+    }
+    experiment_path = tmp_path / "e.json"
+    experiment_path.write_text(json.dumps(experiment))
+    scratch = tmp_path / "scratch"
+    scratch.mkdir()
+
+    path = materialize_virtual_topologies(str(experiment_path), str(scratch), cwd=str(tmp_path))
+
+    with open(path) as f:
+        prepared = json.load(f)
+    with open(prepared["topologies"][0]["pathToFile"]) as f:
+        assert json.load(f) == resolve_variant(sweep_with_variant(), "v32")
+    assert os.path.dirname(path) == str(scratch)
+    assert prepared["workloads"] == experiment["workloads"]
+    assert json.loads(experiment_path.read_text()) == experiment
+
+
+def test_regular_experiments_are_run_as_they_are(tmp_path):
+    experiment_path = tmp_path / "e.json"
+    experiment_path.write_text(json.dumps({"topologies": [{"pathToFile": "topologies/t.json"}]}))
+
+    assert materialize_virtual_topologies(str(experiment_path), str(tmp_path)) == str(experiment_path)